@@ -2,10 +2,11 @@
 RoomSense Flask Application
 Main application entry point with modular architecture
 """
-from flask import Flask, jsonify
+from flask import Flask, g, jsonify, request
 from flask_pymongo import PyMongo
 from flask_mail import Mail
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
 import logging
 import os
@@ -14,28 +15,51 @@ load_dotenv()
 
 
 from config import get_config
+from config.log_pipeline import configure_logging, init_request_ids
+from config.server import held_request_limit, mongo_client_options
 from services.auth_service import AuthService
 from services.email_service import EmailService
 from services.lecture_service import LectureService
+from services.request_identity import RequestIdentity
+from services.request_profiler import RequestProfiler, init_request_profiler
+from models.repositories import get_storage
+from services.question_clustering import QuestionClusterer
+from services.question_ingest import QuestionIngestBuffer
+from services.question_queue import QuestionPriorityQueue
+from services.rate_limiter import QuestionRateLimiter
 from routes.auth_routes import init_auth_routes
 from routes.lecture_routes import init_lecture_routes
-from services.sessions_service import SessionsService
+from routes.sessions_routes import init_sessions_routes
+from routes.admin_routes import init_admin_routes
+from services.sessions_service import DuplicateSessionIdsError, SessionsService
+from services.session_scheduler import SessionScheduler
+from services.active_sessions import ActiveSessionRegistry
+from services.stream_limiter import StreamLimiter
+from services.pool_monitor import PoolMonitor
+from services.command_monitor import CommandMonitor, init_command_monitor, parse_budgets
+from services.read_routing import ReadRouter
+from services.request_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestMetrics, init_request_metrics
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
 logger = logging.getLogger(__name__)
 
 
-def create_app(config_name='development'):
+def create_app(config_name='development', settings=None, email_service=None, mongo_client=None,
+               notifier=None):
     """
     Application factory pattern
     
     Args:
         config_name: Configuration environment (development, production, testing)
+        settings: Optional configuration values overriding the config class
+        email_service: Optional EmailService stand-in (benchmarks), defaults
+                       to SendGrid
+        mongo_client: Optional client to use instead of connecting to
+                      MONGO_URI, e.g. an in-memory stand-in; its database is
+                      the client's default database and the pool and command
+                      monitors are not attached to it; ignored unless
+                      STORAGE_BACKEND is 'mongo'
+        notifier: Optional QuestionNotifier of the lecture service; the ASGI
+                  entry point passes an AsyncQuestionNotifier
     
     Returns:
         Flask application instance
@@ -46,23 +70,194 @@ def create_app(config_name='development'):
     # Load configuration
     config = get_config(config_name)
     app.config.from_object(config)
+    app.config.update(settings or {})
+    if app.config['PROXY_TRUSTED_HOPS'] > 0:
+        # remote_addr becomes the client address reported by trusted proxies
+        hops = app.config['PROXY_TRUSTED_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    log_pipeline = configure_logging(app.config)
+    init_request_ids(app, request)
+    request_metrics = None
+    if app.config['METRICS_ENABLED']:
+        request_metrics = RequestMetrics(
+            multiprocess_dir=app.config['METRICS_MULTIPROC_DIR'],
+            flush_seconds=app.config['METRICS_FLUSH_SECONDS']
+        )
+        init_request_metrics(app, request_metrics, request, g)
+        request_metrics.start()
+    app.extensions['roomsense_metrics'] = request_metrics
     
     # Initialize extensions
-    mongo = PyMongo(app)
+    # Raises ValueError on invalid MONGO_* settings before anything connects
+    pool_monitor = PoolMonitor()
+    command_monitor = CommandMonitor(
+        slow_ms=app.config['MONGO_SLOW_COMMAND_MS'],
+        budgets=parse_budgets(app.config['MONGO_QUERY_BUDGETS'])
+    )
+    backend = app.config['STORAGE_BACKEND']
+    db = None
+    if backend != 'mongo':
+        # The memory backend keeps everything in this process, no MongoDB
+        mongo_client = None
+    elif mongo_client is None:
+        mongo = PyMongo(app, event_listeners=[pool_monitor, command_monitor], **mongo_client_options(app.config))
+        mongo_client, db = mongo.cx, mongo.db
+    else:
+        db = mongo_client.get_default_database()
+    # Raises ValueError on an unknown STORAGE_BACKEND
+    storage = get_storage(
+        backend,
+        db,
+        question_mode=app.config['QUESTION_STORAGE_MODE'],
+        log_path=app.config['STORAGE_MEMORY_LOG'] or None,
+        fsync=app.config['STORAGE_MEMORY_FSYNC']
+    )
+    app.extensions['roomsense_storage'] = storage
+    init_command_monitor(app, command_monitor, request, headers=app.config['MONGO_COMMAND_HEADERS'])
+    request_profiler = None
+    if app.config['PROFILING_ENABLED']:
+        request_profiler = RequestProfiler(
+            app.config['PROFILING_DIR'],
+            secret=app.config['PROFILING_SECRET'],
+            sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+            mode=app.config['PROFILING_MODE'],
+            max_profiles=app.config['PROFILING_MAX_PROFILES'],
+            sample_interval_ms=app.config['PROFILING_SAMPLE_INTERVAL_MS']
+        )
+        init_request_profiler(app, request_profiler, request, g)
     mail = Mail(app)
     CORS(app)
     
     # Initialize services
-    email_service = EmailService(app.config)
-    auth_service = AuthService(mongo.db, email_service)
-    sessions_service = SessionsService(mongo.db)
-    lecture_service = LectureService(mongo.db)
+    email_service = email_service or EmailService(app.config)
+    # Sessions are resolved to users once per request, whichever service asks
+    identity = RequestIdentity(storage.users, request_globals=g, strict=app.config['IDENTITY_STRICT'])
+    auth_service = AuthService(storage, email_service, identity=identity)
+    session_scheduler = None
+    if app.config['SESSION_SCHEDULER_ENABLED']:
+        session_scheduler = SessionScheduler(
+            storage,
+            lease_seconds=app.config['SESSION_SCHEDULER_LEASE_SECONDS'],
+            lookahead_seconds=app.config['SESSION_SCHEDULER_LOOKAHEAD_SECONDS'],
+            reload_seconds=app.config['SESSION_SCHEDULER_RELOAD_SECONDS'],
+            recovery_seconds=app.config['SESSION_SCHEDULER_RECOVERY_SECONDS']
+        )
+    active_sessions = ActiveSessionRegistry(
+        storage.sessions,
+        refresh_seconds=app.config['ACTIVE_SESSIONS_REFRESH_SECONDS']
+    )
+    if session_scheduler is not None:
+        session_scheduler.add_listener(lambda action, session_ids: active_sessions.invalidate())
+    sessions_service = SessionsService(
+        storage,
+        scheduler=session_scheduler,
+        active_sessions=active_sessions,
+        identity=identity
+    )
+    ingest_buffer = None
+    if app.config['QUESTION_INGEST_BUFFER_ENABLED']:
+        ingest_buffer = QuestionIngestBuffer(
+            storage.questions,
+            max_batch=app.config['QUESTION_INGEST_MAX_BATCH'],
+            max_delay_ms=app.config['QUESTION_INGEST_MAX_DELAY_MS'],
+            max_pending=app.config['QUESTION_INGEST_MAX_PENDING']
+        )
+    clusterer = None
+    if app.config['QUESTION_CLUSTERING_ENABLED']:
+        clusterer = QuestionClusterer(
+            threshold=app.config['QUESTION_CLUSTER_THRESHOLD'],
+            max_clusters=app.config['QUESTION_CLUSTER_MAX_PER_LECTURE']
+        )
+    read_router = None
+    if app.config['READ_ROUTING_ENABLED'] and mongo_client is not None:
+        read_router = ReadRouter(
+            mongo_client,
+            max_staleness_seconds=app.config['READ_MAX_STALENESS_SECONDS'],
+            causal=app.config['READ_ROUTING_CAUSAL']
+        )
+    lecture_service = LectureService(
+        storage,
+        notifier=notifier,
+        long_poll_max_seconds=app.config['LONG_POLL_MAX_SECONDS'],
+        ingest_buffer=ingest_buffer,
+        clusterer=clusterer,
+        question_queue=QuestionPriorityQueue(
+            refresh_seconds=app.config['QUESTION_QUEUE_REFRESH_SECONDS']
+        ),
+        read_router=read_router,
+        identity=identity
+    )
+
+    # Create indexes (idempotent, safe on every start). Each step runs on its
+    # own so one failure does not skip the others; duplicate sessionIds stop
+    # the start, as session creation relies on the unique index
+    index_steps = [('lecture', lecture_service.ensure_indexes), ('session', sessions_service.ensure_indexes)]
+    if session_scheduler is not None:
+        index_steps.append(('scheduler', session_scheduler.ensure_indexes))
+    for name, ensure_indexes in index_steps:
+        try:
+            ensure_indexes()
+        except DuplicateSessionIdsError:
+            raise
+        except Exception as e:
+            logger.error("Error creating %s indexes: %s", name, e)
+
+    try:
+        active_sessions.rebuild()
+    except Exception as e:
+        logger.error("Error loading active sessions: %s", e)
+
+    if session_scheduler is not None:
+        session_scheduler.start()
+
+    def shutdown():
+        """Stop background threads and flush buffered writes (worker exit)"""
+        if session_scheduler is not None:
+            session_scheduler.stop()
+        if ingest_buffer is not None:
+            ingest_buffer.close()
+        if request_metrics is not None:
+            request_metrics.stop()
+        storage.close()
+        log_pipeline.stop()
+
+    app.extensions['roomsense_shutdown'] = shutdown
     
     # Register blueprints (routes)
     auth_blueprint = init_auth_routes(auth_service)
     app.register_blueprint(auth_blueprint)
-    lecture_blueprint = init_lecture_routes(lecture_service)
+    # Long-polls and streams hold a worker thread each; keep some for the rest
+    stream_limiter = StreamLimiter(held_request_limit(app.config))
+    rate_limiter = None
+    if app.config['QUESTION_RATE_LIMIT_ENABLED']:
+        rate_limiter = QuestionRateLimiter(
+            client_rate=app.config['QUESTION_RATE_CLIENT_PER_SECOND'],
+            client_burst=app.config['QUESTION_RATE_CLIENT_BURST'],
+            lecture_rate=app.config['QUESTION_RATE_LECTURE_PER_SECOND'],
+            lecture_burst=app.config['QUESTION_RATE_LECTURE_BURST'],
+            global_rate=app.config['QUESTION_RATE_GLOBAL_PER_SECOND'],
+            global_burst=app.config['QUESTION_RATE_GLOBAL_BURST'],
+            vote_client_rate=app.config['QUESTION_VOTE_CLIENT_PER_SECOND'],
+            vote_client_burst=app.config['QUESTION_VOTE_CLIENT_BURST'],
+            vote_lecture_rate=app.config['QUESTION_VOTE_LECTURE_PER_SECOND'],
+            vote_lecture_burst=app.config['QUESTION_VOTE_LECTURE_BURST'],
+            vote_global_rate=app.config['QUESTION_VOTE_GLOBAL_PER_SECOND'],
+            vote_global_burst=app.config['QUESTION_VOTE_GLOBAL_BURST']
+        )
+    lecture_blueprint = init_lecture_routes(
+        lecture_service,
+        stream_limiter=stream_limiter,
+        heartbeat_seconds=app.config['SSE_HEARTBEAT_SECONDS'],
+        rate_limiter=rate_limiter
+    )
     app.register_blueprint(lecture_blueprint)
+    # Used by asgi.py to serve idle long-polls and streams on its event loop
+    app.extensions['roomsense_lectures'] = lecture_service
+    app.extensions['roomsense_streams'] = stream_limiter
+    sessions_blueprint = init_sessions_routes(sessions_service)
+    app.register_blueprint(sessions_blueprint)
+    if request_profiler is not None:
+        app.register_blueprint(init_admin_routes(request_profiler))
     
     # Health check endpoint
     @app.route('/health', methods=['GET'])
@@ -70,8 +265,24 @@ def create_app(config_name='development'):
         """Application health check"""
         return jsonify({
             'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': datetime.utcnow().isoformat(),
+            'streams': stream_limiter.stats(),
+            'ingest': ingest_buffer.stats() if ingest_buffer else None,
+            'questionAdmission': rate_limiter.stats() if rate_limiter else None,
+            'sessionScheduler': session_scheduler.stats() if session_scheduler else None,
+            'activeSessions': active_sessions.stats(),
+            'storage': storage.stats(),
+            'mongoPool': pool_monitor.stats(),
+            'mongoCommands': command_monitor.stats(),
+            'readRouting': read_router.stats() if read_router else None,
+            'logging': log_pipeline.stats()
         }), 200
+
+    if request_metrics is not None:
+        @app.route('/metrics', methods=['GET'])
+        def metrics():
+            """Request metrics in the Prometheus text format"""
+            return app.response_class(request_metrics.render(), content_type=METRICS_CONTENT_TYPE)
     
     # Root endpoint
     @app.route('/', methods=['GET'])
@@ -91,15 +302,26 @@ def create_app(config_name='development'):
                 'lectures': {
                     'create': 'POST /api/lectures/',
                     'getByLecturer': 'GET /api/lectures/lecturer/<lecturer_id>',
+                    'dashboard': 'GET /api/lectures/lecturer/<session_id>/dashboard',
                     'getById': 'GET /api/lectures/<lecture_id>',
                     'update': 'PUT /api/lectures/<lecture_id>',
                     'delete': 'DELETE /api/lectures/<lecture_id>',
                     'updateDay': 'PUT /api/lectures/<lecture_id>/day/<day_id>',
                     'createQuestion': 'POST /api/lectures/<lecture_id>/questions',
+                    'upvoteQuestion': 'POST /api/lectures/<lecture_key>/questions/<question_id>/upvote',
                     'getQuestions': 'GET /api/lectures/<lecture_id>/questions',
+                    'nextQuestion': 'GET /api/lectures/<session_id>/<lecture_key>/questions/next?wait=<seconds>',
+                    'questionStream': 'GET /api/lectures/<session_id>/<lecture_key>/questions/stream',
+                    'bulkAnswer': 'PUT /api/lectures/<session_id>/<lecture_key>/questions/answer',
+                    'bulkDeliver': 'PUT /api/lectures/<session_id>/<lecture_key>/questions/deliver',
                     'unansweredCount': 'GET /api/lectures/lecturer/<lecturer_id>/questions/unanswered/count'
                 },
-                'health': '/health'
+                'sessions': {
+                    'active': 'GET /api/sessions/active',
+                    'activeByUser': 'GET /api/sessions/active/<unique_number>'
+                },
+                'health': '/health',
+                'metrics': '/metrics'
             }
         }), 200
     
@@ -115,20 +337,27 @@ def create_app(config_name='development'):
     @app.errorhandler(500)
     def internal_error(error):
         """Handle 500 errors"""
-        logger.error(f"Internal error: {str(error)}")
+        logger.error("Internal error: %s", error)
         return jsonify({
             'success': False,
             'message': 'Internal server error'
         }), 500
     
-    logger.info(f"Application started in {config_name} mode")
+    logger.info("Application started in %s mode", config_name)
     
     return app
 
 
-# Create application instance
-app = create_app()
+def __getattr__(name):
+    # `gunicorn app:app` and other servers loading app:app get the worker app
+    # of wsgi.py, built on first use; importing this module builds nothing
+    if name == 'app':
+        from wsgi import app as worker_app
+        return worker_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8061, debug=True)
+    # Development server; production runs wsgi:app under gunicorn (gunicorn.conf.py)
+    app = create_app()
+    app.run(host='0.0.0.0', port=8061, debug=app.config['DEBUG'])
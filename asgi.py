@@ -0,0 +1,110 @@
+"""
+RoomSense ASGI Application
+Async serving mode: the app of app.py behind an event loop, so idle
+long-polls and event streams hold a suspended task instead of a worker thread.
+
+Run with:
+    hypercorn asgi:app --bind 0.0.0.0:8061
+"""
+from quart import Quart, g, request
+from quart_cors import cors
+from hypercorn.middleware import AsyncioWSGIMiddleware, ProxyFixMiddleware
+from urllib.parse import parse_qs
+import logging
+import re
+from dotenv import load_dotenv
+load_dotenv()
+
+
+from app import create_app
+from config.log_pipeline import init_request_ids
+from services.question_notifier import AsyncQuestionNotifier
+from services.request_metrics import init_request_metrics
+from routes.async_lecture_routes import init_async_lecture_routes
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = re.compile(r'^/api/lectures/[^/]+/[^/]+/questions/stream/?$')
+NEXT_QUESTION_PATH = re.compile(r'^/api/lectures/[^/]+/[^/]+/questions/next/?$')
+
+
+class IdleRequestDispatcher:
+    """
+    ASGI app sending idle-heavy requests to the event loop app and every
+    other request to the WSGI app.
+
+    Event streams and long-polls (questions/next with ?wait=) are served by
+    the Quart app, which waits on the event loop. Everything else is short
+    and runs the WSGI app on executor threads, with the same services,
+    request identity, read routing, profiling and command budgets as under
+    gunicorn.
+    """
+
+    def __init__(self, event_loop_app, wsgi_app):
+        self.event_loop_app = event_loop_app
+        self.wsgi_app = AsyncioWSGIMiddleware(wsgi_app)
+
+    @staticmethod
+    def is_idle(scope):
+        """Check whether a request waits for lecture changes"""
+        path = scope['path']
+        if STREAM_PATH.match(path):
+            return True
+        if NEXT_QUESTION_PATH.match(path):
+            return 'wait' in parse_qs(scope['query_string'].decode('latin-1'))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        # Lifespan events go to Quart, which starts and stops the services
+        if scope['type'] == 'http' and not self.is_idle(scope):
+            await self.wsgi_app(scope, receive, send)
+        else:
+            await self.event_loop_app(scope, receive, send)
+
+
+def create_asgi_app(config_name='development', settings=None):
+    """
+    Application factory for the async serving mode
+
+    Args:
+        config_name: Configuration environment (development, production, testing)
+        settings: Optional configuration values overriding the config class
+
+    Returns:
+        ASGI application
+    """
+    # One app, one set of services: the Quart side only drives the wait
+    # plans of the lecture service the Flask app was built with
+    flask_app = create_app(config_name, settings=settings, notifier=AsyncQuestionNotifier())
+    lecture_service = flask_app.extensions['roomsense_lectures']
+
+    app = Quart(__name__)
+    app.config.from_mapping(flask_app.config)
+    if app.config['PROXY_TRUSTED_HOPS'] > 0:
+        # remote_addr becomes the client address reported by trusted proxies
+        app.asgi_app = ProxyFixMiddleware(app.asgi_app, mode='legacy', trusted_hops=app.config['PROXY_TRUSTED_HOPS'])
+    init_request_ids(app, request, asynchronous=True)
+    request_metrics = flask_app.extensions['roomsense_metrics']
+    if request_metrics is not None:
+        init_request_metrics(app, request_metrics, request, g, asynchronous=True)
+
+    stream_limiter = flask_app.extensions['roomsense_streams']
+    # Held requests wait on the event loop here, not on worker threads
+    stream_limiter.max_streams = app.config['SSE_MAX_STREAMS']
+    app.register_blueprint(init_async_lecture_routes(
+        lecture_service,
+        stream_limiter=stream_limiter,
+        heartbeat_seconds=app.config['SSE_HEARTBEAT_SECONDS']
+    ))
+
+    @app.after_serving
+    async def stop_background():
+        flask_app.extensions['roomsense_shutdown']()
+
+    logger.info("ASGI application started in %s mode", config_name)
+
+    return IdleRequestDispatcher(cors(app), flask_app)
+
+
+# Create application instance
+app = create_asgi_app()
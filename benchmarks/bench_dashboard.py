@@ -0,0 +1,89 @@
+"""
+Lecturer dashboard benchmark
+Compares the single-aggregation dashboard with the N+1 request sequence the
+dashboard used before (lectures, questions per lecture, unanswered count).
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_dashboard --lectures 20 --questions 200
+"""
+import argparse
+import json
+import os
+import time
+
+from pymongo import MongoClient
+
+from models.lecture import Lecture, StudentQuestion
+from models.repositories import MongoStorage
+from services.lecture_service import LectureService, generate_random
+
+
+def seed(db, lectures, questions):
+    """Create one lecturer with lectures and questions"""
+    user_id = db.users.insert_one({'email': 'bench@example.com', 'activeSessionIds': ['bench-session']}).inserted_id
+
+    for _ in range(lectures):
+        key = generate_random(6)
+        db.lectures.insert_one(Lecture.create(key, user_id, 'Bench Course', '2024-01-15', '2024-05-15', [], []))
+        documents = []
+        for index in range(questions):
+            document = StudentQuestion.create(key, f'Student {index}', f'Question {index}')
+            document['isAnswered'] = index % 3 == 0
+            document['isDelivered'] = index % 2 == 0
+            documents.append(document)
+        if documents:
+            db.student_questions.insert_many(documents)
+
+
+def timed(function, repeat):
+    """Run a function repeatedly and return per-call latencies in ms"""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lectures', type=int, default=20)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    client.drop_database('roomsense_bench')
+    db = client.roomsense_bench
+
+    service = LectureService(MongoStorage(db))
+    service.ensure_indexes()
+    seed(db, args.lectures, args.questions)
+
+    def n_plus_one():
+        lectures = service.get_lectures_by_lecturer('bench-session')
+        for lecture in lectures:
+            service.get_question_changes('bench-session', lecture['key'])
+        service.get_unanswered_questions_count('bench-session')
+
+    def aggregation():
+        service.get_lecturer_dashboard('bench-session')
+
+    results = {
+        'lectures': args.lectures,
+        'questions_per_lecture': args.questions,
+        'n_plus_one': timed(n_plus_one, args.repeat),
+        'aggregation': timed(aggregation, args.repeat)
+    }
+    client.drop_database('roomsense_bench')
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+"""
+Load and regression suite
+Builds the app with create_app('testing') and a fake EmailService against a
+local mongod (or the in-memory storage backend) and drives it through the
+Flask test client with these scenarios:
+
+    live_lecture  students submitting and upvoting questions while the
+                  lecturer polls questions/next every 3 s and AR devices
+                  poll their login status
+    login_storm   many logins at once, each followed by the verify link
+    lecture_crud  create (60-day semester), read, update, update a day and
+                  delete lectures
+
+Requests are sent on a fixed schedule (open loop), so a slow response does
+not delay the next request. Reports p50/p95/p99 latency, errors and Mongo
+commands per request (mongod only) per endpoint and the throughput per
+scenario. With --baseline the results are compared with a stored run and
+the exit status is 1 on regressions, for CI:
+
+    python -m benchmarks.bench_load --output bench.json --baseline benchmarks/baseline.json
+
+Baselines depend on the machine and backend, so none is shipped. If the
+baseline file does not exist, the run is recorded there instead (exit
+status 0); commit it from the CI machine and later runs compare with it.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017/roomsense_bench python -m benchmarks.bench_load --students 300 --duration 30
+    python -m benchmarks.bench_load --backend memory --duration 10
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from pymongo import MongoClient
+
+from app import create_app
+from models.lecture import Lecture
+
+DATABASE = 'roomsense_bench'
+LECTURER_SESSION = 'bench-lecturer'
+LECTURE_KEY = 'benchlive'
+SEMESTER_DAYS = 60
+CLASS_SESSIONS = [
+    {'id': str(index), 'dayOfWeek': day, 'startTime': '14:00', 'endTime': '15:15'}
+    for index, day in enumerate(['Monday', 'Wednesday', 'Friday'], start=1)
+]
+
+
+class FakeEmailService:
+    """Records verification emails instead of calling SendGrid"""
+
+    def __init__(self, delay_seconds=0.0):
+        self.delay_seconds = delay_seconds
+        self.lock = threading.Lock()
+        self.sent = 0
+
+    def send_verification_email(self, email, session_id):
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        with self.lock:
+            self.sent += 1
+
+
+class Recorder:
+    """Latency, status and Mongo command count of every request, per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, label, milliseconds, ok, commands):
+        with self.lock:
+            entry = self.endpoints.setdefault(label, {'latencies': [], 'errors': 0, 'commands': []})
+            entry['latencies'].append(milliseconds)
+            if not ok:
+                entry['errors'] += 1
+            if commands is not None:
+                entry['commands'].append(int(commands))
+
+    def summary(self, seconds):
+        endpoints = {}
+        total = errors = 0
+        for label, entry in sorted(self.endpoints.items()):
+            latencies = sorted(entry['latencies'])
+            total += len(latencies)
+            errors += entry['errors']
+            endpoints[label] = {
+                'count': len(latencies),
+                'errors': entry['errors'],
+                'p50Ms': percentile(latencies, 50),
+                'p95Ms': percentile(latencies, 95),
+                'p99Ms': percentile(latencies, 99),
+                'dbOpsPerRequest': round(sum(entry['commands']) / len(entry['commands']), 2)
+                if entry['commands'] else None
+            }
+        return {
+            'seconds': round(seconds, 2),
+            'requests': total,
+            'errors': errors,
+            'throughputRps': round(total / seconds, 1) if seconds else 0.0,
+            'endpoints': endpoints
+        }
+
+
+def percentile(values, rank):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    index = max(int(round(rank / 100 * len(values) + 0.5)) - 1, 0)
+    return round(values[min(index, len(values) - 1)], 2)
+
+
+class Driver:
+    """Sends scheduled requests through per-thread test clients"""
+
+    def __init__(self, app, concurrency, count_commands=True):
+        self.app = app
+        self.concurrency = concurrency
+        self.count_commands = count_commands
+        self.local = threading.local()
+
+    def client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        return client
+
+    def send(self, recorder, label, method, url, body=None, address=None, expect=(200, 201)):
+        # The client address is the socket peer (no trusted proxy hops)
+        environ = {'REMOTE_ADDR': address} if address else {}
+        started = time.perf_counter()
+        response = self.client().open(url, method=method, json=body, environ_base=environ)
+        milliseconds = (time.perf_counter() - started) * 1000
+        commands = response.headers.get('X-DB-Commands') if self.count_commands else None
+        recorder.record(label, milliseconds, response.status_code in expect, commands)
+        return response
+
+    def run(self, schedule):
+        """
+        Run (offset seconds, function) pairs at their offsets
+
+        Returns:
+            Seconds from the first request until all requests finished
+        """
+        schedule = sorted(schedule, key=lambda item: item[0])
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            started = time.monotonic()
+            futures = []
+            for offset, function in schedule:
+                delay = started + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(function))
+            for future in futures:
+                future.result()
+        return time.monotonic() - started
+
+
+def semester(start, days):
+    """Lecture days of the CLASS_SESSIONS over a semester of the given length"""
+    weekdays = {session['dayOfWeek']: session for session in CLASS_SESSIONS}
+    lecture_days = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        session = weekdays.get(day.strftime('%A'))
+        if session is not None:
+            lecture_days.append({
+                'id': f'session-{day.isoformat()}',
+                'date': day.isoformat(),
+                'dayOfWeek': session['dayOfWeek'],
+                'startTime': session['startTime'],
+                'endTime': session['endTime']
+            })
+    return lecture_days
+
+
+def seed(storage, ar_devices):
+    """One lecturer with an authorized AR session per device and a live lecture"""
+    ar_sessions = [f'bench-ar-{index}' for index in range(ar_devices)]
+    user_id = storage.users.insert({
+        'email': 'bench-lecturer@example.com',
+        'activeSessionIds': [LECTURER_SESSION] + ar_sessions,
+        'pendingSessionIds': [],
+        'inactiveSessionIds': [],
+        'options': {}
+    })
+    start = date.today()
+    storage.lectures.insert(Lecture.create(
+        LECTURE_KEY, user_id, 'Bench Course', start.isoformat(),
+        (start + timedelta(days=SEMESTER_DAYS)).isoformat(), CLASS_SESSIONS, semester(start, SEMESTER_DAYS)
+    ))
+    return ar_sessions
+
+
+def live_lecture(driver, args, ar_sessions, rng):
+    recorder = Recorder()
+    question_ids = []
+    base = f'/api/lectures/{LECTURE_KEY}/questions'
+
+    def submit(student):
+        response = driver.send(recorder, 'POST questions', 'POST', base, {
+            'studentName': f'Student {student}',
+            'question': f'Question {rng.randrange(10 ** 6)} about recursion and the exam'
+        }, address=f'10.0.{student // 250}.{student % 250 + 1}', expect=(201, 429))
+        question = response.get_json().get('question') if response.status_code == 201 else None
+        if question and question.get('id'):
+            question_ids.append(question['id'])
+
+    def upvote(student):
+        if question_ids:
+            driver.send(recorder, 'POST upvote', 'POST', f'{base}/{rng.choice(question_ids)}/upvote',
+                        address=f'10.0.{student // 250}.{student % 250 + 1}', expect=(200, 404, 429))
+
+    def poll_next():
+        driver.send(recorder, 'GET questions/next', 'GET',
+                    f'/api/lectures/{LECTURER_SESSION}/{LECTURE_KEY}/questions/next')
+
+    def poll_status(ar_session):
+        driver.send(recorder, 'POST auth/status', 'POST', '/auth/status', {'sessionId': ar_session})
+
+    schedule = []
+    for student in range(args.students):
+        for _ in range(args.questions_per_student):
+            schedule.append((rng.uniform(0, args.duration), lambda student=student: submit(student)))
+        if rng.random() < 0.5:
+            schedule.append((rng.uniform(args.duration / 4, args.duration), lambda student=student: upvote(student)))
+    for tick in range(int(args.duration / args.poll_interval) + 1):
+        schedule.append((tick * args.poll_interval, poll_next))
+    for ar_session in ar_sessions:
+        phase = rng.uniform(0, args.ar_interval)
+        for tick in range(int(args.duration / args.ar_interval)):
+            schedule.append((phase + tick * args.ar_interval, lambda ar_session=ar_session: poll_status(ar_session)))
+    return recorder.summary(driver.run(schedule))
+
+
+def login_storm(driver, args, email_service, rng):
+    recorder = Recorder()
+
+    def login(index):
+        session_id = f'bench-login-{index}-{rng.randrange(10 ** 9)}'
+        response = driver.send(recorder, 'POST auth/login', 'POST', '/auth/login', {
+            'email': f'bench-student-{index}@example.com',
+            'sessionId': session_id
+        })
+        if response.status_code == 200:
+            driver.send(recorder, 'GET auth/verify', 'GET', f'/auth/verify?sessionId={session_id}')
+            driver.send(recorder, 'POST auth/status', 'POST', '/auth/status', {'sessionId': session_id})
+
+    schedule = [(rng.uniform(0, args.storm_seconds), lambda index=index: login(index)) for index in range(args.logins)]
+    summary = recorder.summary(driver.run(schedule))
+    summary['emailsSent'] = email_service.sent
+    return summary
+
+
+def lecture_crud(driver, args, rng):
+    recorder = Recorder()
+    start = date.today()
+    lecture_days = semester(start, SEMESTER_DAYS)
+
+    def crud(index):
+        response = driver.send(recorder, 'POST lectures', 'POST', '/api/lectures/', {
+            'sessionId': LECTURER_SESSION,
+            'courseName': f'Bench Course {index}',
+            'semesterStartDate': start.isoformat(),
+            'semesterEndDate': (start + timedelta(days=SEMESTER_DAYS)).isoformat(),
+            'classSessions': CLASS_SESSIONS,
+            'lectureDays': lecture_days
+        })
+        if response.status_code != 201:
+            return
+        key = response.get_json()['lecture']['key']
+        path = f'/api/lectures/{LECTURER_SESSION}/{key}'
+        driver.send(recorder, 'GET lecture', 'GET', path)
+        driver.send(recorder, 'PUT lecture', 'PUT', path, {'courseName': f'Bench Course {index} (updated)'})
+        day = rng.choice(lecture_days)
+        driver.send(recorder, 'PUT lecture day', 'PUT', f"{path}/day/{day['id']}", {
+            'timeline': [{'startTime': '14:00', 'endTime': '14:30', 'description': 'Recap'}]
+        })
+        driver.send(recorder, 'GET lecturer lectures', 'GET', f'/api/lectures/lecturer/{LECTURER_SESSION}')
+        driver.send(recorder, 'DELETE lecture', 'DELETE', path)
+
+    schedule = [(index * args.crud_interval, lambda index=index: crud(index)) for index in range(args.crud_lectures)]
+    return recorder.summary(driver.run(schedule))
+
+
+def compare(results, baseline, latency_tolerance, ops_tolerance):
+    """
+    List regressions against a baseline run
+
+    Returns:
+        Messages for endpoints whose p95 latency or Mongo commands per
+        request grew beyond the tolerances, or whose errors increased
+    """
+    regressions = []
+    for scenario, summary in results['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(scenario)
+        if reference is None:
+            continue
+        for label, current in summary['endpoints'].items():
+            previous = reference['endpoints'].get(label)
+            if previous is None:
+                continue
+            if previous['p95Ms'] and current['p95Ms'] > previous['p95Ms'] * (1 + latency_tolerance):
+                regressions.append(f"{scenario} {label}: p95 {previous['p95Ms']} -> {current['p95Ms']} ms")
+            if previous['dbOpsPerRequest'] is not None and current['dbOpsPerRequest'] is not None \
+                    and current['dbOpsPerRequest'] > previous['dbOpsPerRequest'] * (1 + ops_tolerance):
+                regressions.append(
+                    f"{scenario} {label}: Mongo commands {previous['dbOpsPerRequest']} -> {current['dbOpsPerRequest']}"
+                )
+            if current['errors'] > previous['errors']:
+                regressions.append(f"{scenario} {label}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def connect():
+    """URI of the benchmark database on mongod, emptied"""
+    uri = os.getenv('MONGO_URI', f'mongodb://localhost:27017/{DATABASE}')
+    client = MongoClient(uri)
+    client.drop_database(client.get_default_database(DATABASE).name)
+    return uri
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mongod', 'memory'], default='mongod')
+    parser.add_argument('--scenarios', default='live_lecture,login_storm,lecture_crud')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help='live_lecture length in seconds')
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--questions-per-student', type=int, default=1)
+    parser.add_argument('--poll-interval', type=float, default=3)
+    parser.add_argument('--ar-devices', type=int, default=5)
+    parser.add_argument('--ar-interval', type=float, default=2)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--storm-seconds', type=float, default=2)
+    parser.add_argument('--email-delay-ms', type=float, default=0, help='simulated SendGrid latency')
+    parser.add_argument('--crud-lectures', type=int, default=50)
+    parser.add_argument('--crud-interval', type=float, default=0.05)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results JSON of an earlier run')
+    parser.add_argument('--latency-tolerance', type=float, default=0.5)
+    parser.add_argument('--ops-tolerance', type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = {
+        # The login flow stores the session cookie; do not depend on the environment
+        'SECRET_KEY': 'bench-load',
+        'MONGO_COMMAND_HEADERS': True,
+        # No lease renewals or session transitions in the measurements
+        'SESSION_SCHEDULER_ENABLED': False,
+        'LOG_LEVEL': 'WARNING'
+    }
+    if args.backend == 'memory':
+        settings['STORAGE_BACKEND'] = 'memory'
+    else:
+        settings['MONGO_URI'] = connect()
+    email_service = FakeEmailService(args.email_delay_ms / 1000)
+    app = create_app('testing', settings=settings, email_service=email_service)
+    ar_sessions = seed(app.extensions['roomsense_storage'], args.ar_devices)
+
+    rng = random.Random(args.seed)
+    # The memory backend runs no Mongo commands
+    driver = Driver(app, args.concurrency, count_commands=args.backend == 'mongod')
+    scenarios = {
+        'live_lecture': lambda: live_lecture(driver, args, ar_sessions, rng),
+        'login_storm': lambda: login_storm(driver, args, email_service, rng),
+        'lecture_crud': lambda: lecture_crud(driver, args, rng)
+    }
+    results = {
+        'backend': args.backend,
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'scenarios': {}
+    }
+    try:
+        for name in args.scenarios.split(','):
+            results['scenarios'][name] = scenarios[name]()
+    finally:
+        app.extensions['roomsense_shutdown']()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    print(output)
+
+    if args.baseline and not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as handle:
+            handle.write(output + '\n')
+        print(f'No baseline at {args.baseline}: recorded this run as the baseline, '
+              f'later runs with --baseline {args.baseline} compare with it', file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.latency_tolerance, args.ops_tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
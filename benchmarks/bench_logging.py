@@ -0,0 +1,90 @@
+"""
+Logging overhead benchmark
+Measures what one log call costs the request thread with the previous setup
+(basicConfig stream handler, eager f-string) and with the queue pipeline:
+JSON records, a record filtered by level, and a sampled hot-path logger.
+
+Usage:
+    python -m benchmarks.bench_logging --calls 100000
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from config.log_pipeline import LogPipeline, request_id_var
+
+
+def per_call(log, calls):
+    """Average cost of one call in microseconds"""
+    started = time.perf_counter()
+    for index in range(calls):
+        log(index)
+    return round((time.perf_counter() - started) / calls * 1e6, 3)
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+
+    sink = open(os.devnull, 'w')
+    logger = logging.getLogger('bench.lecture_service')
+    hot_logger = logging.getLogger('bench.lecture_service.delivery')
+    lecture_key = 'AbC123'
+    results = {'calls': args.calls}
+
+    # Previous setup: stream handler on the request thread, eager formatting
+    reset_root()
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.DEBUG)
+    results['stream_fstring_us'] = per_call(
+        lambda index: logger.info(f"Created question for lecture: {lecture_key} #{index}"), args.calls
+    )
+    reset_root()
+
+    pipeline = LogPipeline({
+        'LOG_QUEUE_SIZE': args.calls * 2,
+        'LOG_FORMAT': 'json',
+        'LOG_LEVEL': 'INFO',
+        'LOG_LEVELS': '',
+        'LOG_SAMPLING': 'bench.lecture_service.delivery=0.01'
+    }, stream=sink)
+    pipeline.install()
+    request_id_var.set('bench-request')
+
+    # Pause the writer so only the calling thread's share is measured
+    pipeline.listener.stop()
+    results['queue_json_us'] = per_call(
+        lambda index: logger.info("Created question for lecture: %s #%s", lecture_key, index), args.calls
+    )
+    results['queue_filtered_debug_us'] = per_call(
+        lambda index: logger.debug("Polled lecture %s #%s", lecture_key, index), args.calls
+    )
+    results['queue_sampled_us'] = per_call(
+        lambda index: hot_logger.info("Delivered question %s in lecture %s", index, lecture_key), args.calls
+    )
+
+    # Then let the writer format and write the backlog
+    started = time.perf_counter()
+    pipeline.listener.start()
+    pipeline.stop()
+    results['writer_us_per_record'] = round(
+        (time.perf_counter() - started) / max(pipeline.handler.stats()['handled'], 1) * 1e6, 3
+    )
+    results['pipeline'] = pipeline.stats()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
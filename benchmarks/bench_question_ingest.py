@@ -0,0 +1,79 @@
+"""
+Question ingest benchmark
+Compares per-request insert_one with the write-coalescing ingest buffer
+under a burst of concurrent student questions.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_question_ingest --students 300 --rounds 5
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import threading
+import time
+
+from pymongo import MongoClient
+
+from models.lecture import StudentQuestion
+from services.question_ingest import QuestionIngestBuffer
+
+
+def run_burst(insert, students, rounds):
+    """Fire `students` concurrent inserts per round and time them"""
+    latencies = []
+    lock = threading.Lock()
+
+    def submit(index):
+        document = StudentQuestion.create('BENCH1', f'Student {index}', f'Question {index}')
+        started = time.perf_counter()
+        insert(document)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=students) as executor:
+        for _ in range(rounds):
+            list(executor.map(submit, range(students)))
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'documents': len(latencies),
+        'seconds': round(total, 3),
+        'docs_per_second': round(len(latencies) / total, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--max-batch', type=int, default=100)
+    parser.add_argument('--max-delay-ms', type=int, default=5)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'),
+                         maxPoolSize=args.students)
+    collection = client.roomsense_bench.student_questions
+    collection.drop()
+
+    results = {'insert_one': run_burst(collection.insert_one, args.students, args.rounds)}
+    collection.drop()
+
+    buffer = QuestionIngestBuffer(collection, max_batch=args.max_batch,
+                                  max_delay_ms=args.max_delay_ms,
+                                  max_pending=args.students * 2)
+    results['ingest_buffer'] = run_burst(buffer.submit, args.students, args.rounds)
+    results['ingest_buffer']['batches'] = buffer.stats()['batches']
+    buffer.close()
+    collection.drop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Question storage benchmark
+Compares one document per question with per-lecture time buckets: data and
+index size on disk, and the latency of the hot read paths.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_question_storage --lectures 20 --questions 2000
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from benchmarks.bench_dashboard import timed
+from models.lecture import Lecture, StudentQuestion
+from models.repositories import MongoStorage
+from services.lecture_service import LectureService, generate_random
+
+
+def seed(db, store, lectures, questions):
+    """Create one lecturer with lectures and questions spread over two hours"""
+    user_id = db.users.insert_one({'email': 'bench@example.com', 'activeSessionIds': ['bench-session']}).inserted_id
+    started_at = datetime.utcnow() - timedelta(hours=2)
+
+    keys = []
+    for _ in range(lectures):
+        key = generate_random(6)
+        keys.append(key)
+        db.lectures.insert_one(Lecture.create(key, user_id, 'Bench Course', '2024-01-15', '2024-05-15', [], []))
+        documents = []
+        for index in range(questions):
+            document = StudentQuestion.create(key, f'Student {index}', f'Question number {index} about the lecture')
+            document['createdAt'] = document['updatedAt'] = started_at + timedelta(seconds=index * 7200 / questions)
+            document['isAnswered'] = index % 3 == 0
+            document['isDelivered'] = index % 2 == 0
+            documents.append(document)
+        if documents:
+            store.insert_many(documents)
+    return keys
+
+
+def collection_stats(db, name):
+    """Get document count, data size and index size of a collection"""
+    stats = db.command('collStats', name)
+    return {
+        'documents': stats.get('count', 0),
+        'size_bytes': stats.get('size', 0),
+        'storage_bytes': stats.get('storageSize', 0),
+        'index_bytes': stats.get('totalIndexSize', 0)
+    }
+
+
+def run(client, mode, args):
+    """Seed one layout and measure it"""
+    client.drop_database('roomsense_bench')
+    db = client.roomsense_bench
+
+    storage = MongoStorage(db, mode)
+    store = storage.questions
+    service = LectureService(storage)
+    service.ensure_indexes()
+    keys = seed(db, store, args.lectures, args.questions)
+    key = keys[0]
+
+    results = {
+        'storage': collection_stats(db, store.collection.name),
+        'list_questions': timed(lambda: service.get_question_changes('bench-session', key), args.repeat),
+        'pending_count': timed(lambda: store.count_undelivered(key), args.repeat),
+        'queue_load': timed(lambda: store.find_undelivered(key, LectureService.QUEUE_LOAD_LIMIT), args.repeat),
+        'dashboard': timed(lambda: service.get_lecturer_dashboard('bench-session'), args.repeat)
+    }
+    client.drop_database('roomsense_bench')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lectures', type=int, default=20)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+
+    results = {
+        'lectures': args.lectures,
+        'questions_per_lecture': args.questions,
+        'documents': run(client, 'documents', args),
+        'buckets': run(client, 'buckets', args)
+    }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Read routing check
+Runs update-then-read cycles against a replica set with read routing off,
+routed without causal sessions and routed with causal sessions. Reports
+where the listing reads were served, how many missed the preceding update
+and the read latency.
+
+A local three-member replica set:
+    for port in 27017 27018 27019; do
+        mkdir -p /tmp/rs0-$port
+        mongod --replSet rs0 --port $port --dbpath /tmp/rs0-$port --fork --logpath /tmp/rs0-$port.log
+    done
+    mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+
+Usage:
+    MONGO_URI="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \\
+        python -m benchmarks.bench_read_routing --cycles 200
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+from models.lecture import Lecture
+from models.repositories import MongoStorage
+from services.lecture_service import LectureService
+from services.read_routing import ReadRouter
+
+ROUTED_COMMANDS = {'find', 'aggregate'}
+
+
+class ReadTargets(monitoring.CommandListener):
+    """Counts listing reads per server type"""
+
+    def __init__(self, client_ref):
+        self.client_ref = client_ref
+        self.lock = threading.Lock()
+        self.counts = {'primary': 0, 'secondary': 0}
+
+    def started(self, event):
+        if event.command_name not in ROUTED_COMMANDS or event.command.get(event.command_name) != 'lectures':
+            return
+        target = 'primary' if event.connection_id == self.client_ref[0].primary else 'secondary'
+        with self.lock:
+            self.counts[target] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        with self.lock:
+            counts = dict(self.counts)
+            self.counts = {'primary': 0, 'secondary': 0}
+        return counts
+
+
+def run(service, cycles):
+    """Update the lecture, then list the lecturer's lectures and check the update"""
+    stale = 0
+    latencies = []
+    for cycle in range(cycles):
+        course_name = f'Bench Course {cycle}'
+        service.update_lecture('bench-session', 'benchrr', {'courseName': course_name})
+        started = time.perf_counter()
+        lectures = service.get_lectures_by_lecturer('bench-session')
+        latencies.append((time.perf_counter() - started) * 1000)
+        if lectures[0]['courseName'] != course_name:
+            stale += 1
+    latencies.sort()
+    return {
+        'stale_reads': stale,
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cycles', type=int, default=200)
+    parser.add_argument('--max-staleness', type=int, default=90)
+    args = parser.parse_args()
+
+    client_ref = []
+    listener = ReadTargets(client_ref)
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/?replicaSet=rs0'), event_listeners=[listener])
+    client_ref.append(client)
+    client.drop_database('roomsense_bench')
+    db = client.roomsense_bench
+
+    user_id = db.users.insert_one({'email': 'bench@example.com', 'activeSessionIds': ['bench-session']}).inserted_id
+    db.lectures.insert_one(Lecture.create('benchrr', user_id, 'Bench Course', '2024-01-15', '2024-05-15', [], []))
+
+    variants = {
+        'primary': None,
+        'routed': ReadRouter(client, max_staleness_seconds=args.max_staleness, causal=False),
+        'routed_causal': ReadRouter(client, max_staleness_seconds=args.max_staleness, causal=True)
+    }
+    results = {'cycles': args.cycles}
+    for name, read_router in variants.items():
+        service = LectureService(MongoStorage(db), read_router=read_router)
+        listener.reset()
+        results[name] = run(service, args.cycles)
+        results[name]['listing_reads'] = listener.reset()
+
+    print(json.dumps(results, indent=2))
+    client.drop_database('roomsense_bench')
+
+
+if __name__ == '__main__':
+    main()
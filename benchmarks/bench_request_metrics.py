@@ -0,0 +1,96 @@
+"""
+Request metrics overhead benchmark
+Measures what recording one request costs the request thread, with one
+thread and with several threads recording at once (as gthread workers do),
+against a dictionary of counters behind a lock: the mean, and the p99 and
+maximum that show threads waiting for a lock held by a preempted thread.
+Also reports how long a /metrics render takes and that no request was lost.
+
+Usage:
+    python -m benchmarks.bench_request_metrics --requests 200000 --threads 16
+"""
+import argparse
+import json
+import threading
+import time
+
+from services.request_metrics import LATENCY_BUCKETS, RequestMetrics, observe
+
+ROUTES = [('lectures', f'lectures.endpoint_{index}') for index in range(20)]
+
+
+class LockedCounters:
+    """Baseline: every request updates the totals under one lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.in_flight = {}
+
+    def request_started(self, route):
+        with self.lock:
+            self.in_flight[route] = self.in_flight.get(route, 0) + 1
+
+    def request_finished(self, route, method, status, seconds, request_bytes, response_bytes):
+        with self.lock:
+            self.in_flight[route] -= 1
+            key = route + (method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            observe(self.latency, route + (method,), LATENCY_BUCKETS, seconds)
+
+
+def record(metrics, requests, timings):
+    clock = time.perf_counter
+    for index in range(requests):
+        route = ROUTES[index % len(ROUTES)]
+        started = clock()
+        metrics.request_started(route)
+        metrics.request_finished(route, 'GET', 200, 0.004, None, 512)
+        timings.append(clock() - started)
+
+
+def per_request(metrics, requests, threads):
+    """Mean, p99 and maximum time per recorded request in microseconds"""
+    share = requests // threads
+    timings = []
+    workers = [threading.Thread(target=record, args=(metrics, share, timings)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    timings.sort()
+    return {
+        'mean_us': round(sum(timings) / len(timings) * 1e6, 3),
+        'p99_us': round(timings[int(len(timings) * 0.99) - 1] * 1e6, 3),
+        'max_us': round(timings[-1] * 1e6, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    results = {'requests': args.requests, 'threads': args.threads}
+    for threads in (1, args.threads):
+        results[f'locked_{threads}_threads'] = per_request(LockedCounters(), args.requests, threads)
+        metrics = RequestMetrics()
+        results[f'deque_{threads}_threads'] = per_request(metrics, args.requests, threads)
+        started = time.perf_counter()
+        totals = metrics.snapshot()
+        results[f'deque_{threads}_threads_fold_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        recorded = (args.requests // threads) * threads
+        results[f'deque_{threads}_threads_lost'] = recorded - sum(totals['requests'].values())
+
+    started = time.perf_counter()
+    text = metrics.render()
+    results['render_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    results['render_lines'] = text.count('\n')
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Server profile load test
+Starts gunicorn with each worker class and drives the lecturer polling
+workload against it: lecturers poll questions/next (plain or long-poll)
+while students submit questions. Reports throughput and latency per profile.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017/roomsense_bench python -m benchmarks.bench_server_profiles \\
+        --profiles sync,gthread,gevent --lecturers 100 --duration 30 --wait 10
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from pymongo import MongoClient
+
+from models.lecture import Lecture
+
+
+def seed(db, lecturers):
+    """Create one active lecturer session and one lecture per polling client"""
+    db.users.delete_many({'email': {'$regex': '^bench-'}})
+    db.lectures.delete_many({'key': {'$regex': '^bench'}})
+    db.student_questions.delete_many({'lectureKey': {'$regex': '^bench'}})
+
+    targets = []
+    for index in range(lecturers):
+        session_id = f'bench-session-{index}'
+        key = f'bench{index}'
+        user_id = db.users.insert_one({
+            'email': f'bench-{index}@example.com',
+            'activeSessionIds': [session_id],
+            'pendingSessionIds': [],
+            'inactiveSessionIds': []
+        }).inserted_id
+        db.lectures.insert_one(Lecture.create(key, user_id, 'Bench Course', '2024-01-15', '2024-05-15', [], []))
+        targets.append((session_id, key))
+    return targets
+
+
+def start_server(profile, port):
+    """Start gunicorn with a worker class and wait until /health answers"""
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=profile, GUNICORN_BIND=f'127.0.0.1:{port}')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'wsgi:app'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({profile}) did not start')
+
+
+class Client(threading.Thread):
+    """One keep-alive connection issuing requests until the deadline"""
+
+    def __init__(self, port, next_request, deadline, pause):
+        super().__init__(daemon=True)
+        self.port = port
+        self.next_request = next_request
+        self.deadline = deadline
+        self.pause = pause
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        connection = None
+        while time.monotonic() < self.deadline:
+            method, path, body = self.next_request()
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+                headers = {'Content-Type': 'application/json'} if body is not None else {}
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    self.errors += 1
+                else:
+                    self.latencies.append((time.perf_counter() - started) * 1000)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection = None
+            if self.pause:
+                time.sleep(self.pause)
+
+
+def summarize(clients, duration):
+    """Merge client latencies into throughput and percentiles"""
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    errors = sum(client.errors for client in clients)
+    if not latencies:
+        return {'requests': 0, 'errors': errors}
+
+    def percentile(fraction):
+        return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)], 2)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99)
+    }
+
+
+def run_profile(profile, targets, args):
+    """Drive the polling workload against one gunicorn profile"""
+    process = start_server(profile, args.port)
+    try:
+        deadline = time.monotonic() + args.duration
+        wait = f'?wait={args.wait}' if args.wait else ''
+
+        pollers = []
+        for session_id, key in targets:
+            path = f'/api/lectures/{session_id}/{key}/questions/next{wait}'
+            pollers.append(Client(args.port, lambda path=path: ('GET', path, None), deadline, args.interval))
+
+        counter = iter(range(10 ** 9))
+
+        def submit():
+            index = next(counter)
+            _, key = targets[index % len(targets)]
+            body = json.dumps({'studentName': f'Student {index}', 'question': f'Benchmark question {index}'})
+            return 'POST', f'/api/lectures/{key}/questions', body
+
+        students = [Client(args.port, submit, deadline, args.student_pause) for _ in range(args.students)]
+
+        for client in pollers + students:
+            client.start()
+        for client in pollers + students:
+            client.join()
+
+        return {
+            'polling': summarize(pollers, args.duration),
+            'submissions': summarize(students, args.duration)
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--lecturers', type=int, default=100)
+    parser.add_argument('--students', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--wait', type=float, default=0, help='long-poll seconds, 0 for plain polling')
+    parser.add_argument('--interval', type=float, default=0, help='pause between polls of one lecturer')
+    parser.add_argument('--student-pause', type=float, default=0.1)
+    parser.add_argument('--port', type=int, default=8071)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/roomsense_bench'))
+    targets = seed(client.get_default_database(), args.lecturers)
+
+    results = {
+        'lecturers': args.lecturers,
+        'students': args.students,
+        'wait_seconds': args.wait,
+        'duration_seconds': args.duration
+    }
+    for profile in args.profiles.split(','):
+        results[profile] = run_profile(profile, targets, args)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Storage backend benchmark
+Times the operations on the request hot paths against the in-memory backend
+and, with --mongo, the Mongo backend. The behaviour both backends must share
+is checked by tests/test_storage_contract.py.
+
+Usage:
+    python -m benchmarks.bench_storage --repeat 2000
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_storage --mongo --question-mode buckets
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+
+from pymongo import MongoClient
+
+from benchmarks.bench_dashboard import timed
+from models.lecture import Lecture, StudentQuestion
+from models.memory_store import MemoryStorage
+from models.repositories import MongoStorage
+
+DATABASE = 'roomsense_bench'
+
+
+def moment(seconds):
+    """A fixed time (millisecond precision, like BSON dates) plus seconds"""
+    return datetime(2025, 1, 16, 10, 0, 0) + timedelta(seconds=seconds)
+
+
+def question(lecture_key, text, priority, created_at):
+    document = StudentQuestion.create(lecture_key, 'Student', text)
+    document.update({'priority': priority, 'createdAt': created_at, 'updatedAt': created_at})
+    return document
+
+
+def measure(storage, repeat):
+    """Time the operations on the request hot paths"""
+    user_id = storage.users.insert({
+        'email': 'bench@example.com', 'activeSessionIds': ['bench-session'],
+        'pendingSessionIds': [], 'inactiveSessionIds': [], 'options': {}
+    })
+    storage.lectures.insert(Lecture.create('benchkey', user_id, 'Bench Course', '2024-01-15', '2024-05-15', [], []))
+    created = iter(range(10 ** 9))
+    return {
+        'find_by_active_session': timed(lambda: storage.users.find_by_active_session('bench-session'), repeat),
+        'find_lecture': timed(lambda: storage.lectures.find_by_key('benchkey'), repeat),
+        'insert_question': timed(
+            lambda: storage.questions.insert(question('benchkey', 'Bench question', 0, moment(next(created)))), repeat
+        ),
+        'count_undelivered': timed(lambda: storage.questions.count_undelivered('benchkey'), repeat),
+        'claim': timed(lambda: storage.questions.claim('benchkey', moment(0)), repeat),
+        'find_changed_since': timed(lambda: storage.questions.find_changed_since('benchkey', moment(repeat)), repeat),
+        'dashboard': timed(lambda: storage.lectures.dashboard(user_id), repeat)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo', action='store_true', help='also run against MONGO_URI')
+    parser.add_argument('--question-mode', default='documents', help='question storage mode of the Mongo backend')
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    results = {'memory': measure(MemoryStorage(), args.repeat)}
+
+    if args.mongo:
+        client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+        client.drop_database(DATABASE)
+        results['mongo'] = measure(MongoStorage(client[DATABASE], args.question_mode), args.repeat)
+        client.drop_database(DATABASE)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
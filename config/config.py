@@ -9,6 +9,14 @@ class Config:
     # MongoDB
     MONGO_URI = os.getenv('MONGO_URI')
 
+    # Storage backend (models/repositories.py): 'mongo', or 'memory' for the
+    # in-memory engine (one process only: a single worker)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+    # Append-only file persisting the memory backend; empty keeps data in memory only
+    STORAGE_MEMORY_LOG = os.getenv('STORAGE_MEMORY_LOG', '')
+    # Sync the append-only file after every write
+    STORAGE_MEMORY_FSYNC = os.getenv('STORAGE_MEMORY_FSYNC', 'false').lower() == 'true'
+
     # Email (SMTP)
     SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
     FROM_EMAIL = os.getenv('FROM_EMAIL')
@@ -17,25 +25,194 @@ class Config:
     BASE_URL = os.getenv('BASE_URL')
     SECRET_KEY = os.getenv('SECRET_KEY')
 
+    # Logging (config/log_pipeline.py): records are written by a background thread
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    # 'json' (one object per line) or 'text'
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    # Per-logger levels, e.g. 'services.session_scheduler=WARNING,pymongo=WARNING'
+    LOG_LEVELS = os.getenv('LOG_LEVELS', 'pymongo=WARNING')
+    # Fraction of INFO/DEBUG records kept per hot-path logger, e.g.
+    # 'services.lecture_service.delivery=0.01'
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+    # Records waiting for the writer thread; further records are dropped
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+    # Request metrics in the Prometheus text format on /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    # Directory shared by the gunicorn workers so /metrics sums all of them
+    # (cleared when the server starts); empty for the metrics of one process
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+    # How often each worker writes its totals to the directory
+    METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+    # Request profiling (off: no hooks at all). A request is profiled when
+    # it carries a valid X-Profile token signed with PROFILING_SECRET, or
+    # at random with PROFILING_SAMPLE_RATE; /admin/profiles lists the profiles
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_SECRET = os.getenv('PROFILING_SECRET', '')
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+    # 'deterministic' (cProfile, .prof) or 'sampling' (stack samples, speedscope JSON)
+    PROFILING_MODE = os.getenv('PROFILING_MODE', 'deterministic')
+    PROFILING_SAMPLE_INTERVAL_MS = int(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', 5))
+    # Profiles kept on disk; the oldest are removed first
+    PROFILING_DIR = os.getenv('PROFILING_DIR', '/tmp/roomsense-profiles')
+    PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 50))
+
     # Session
+    # Raise when a request resolves more than one session to a user (the
+    # resolution is shared by all services); otherwise it is only logged
+    IDENTITY_STRICT = os.getenv('IDENTITY_STRICT', 'false').lower() == 'true'
     SESSION_EXPIRY_DAYS = int(os.getenv('SESSION_EXPIRY_DAYS', 7))
     VERIFICATION_EXPIRY_MINUTES = int(os.getenv('VERIFICATION_EXPIRY_MINUTES', 15))
 
+    # Questions
+    LONG_POLL_MAX_SECONDS = int(os.getenv('LONG_POLL_MAX_SECONDS', 25))
+    SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 100))
+    SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+
+    # Question ingest buffer (opt-in write coalescing)
+    QUESTION_INGEST_BUFFER_ENABLED = os.getenv('QUESTION_INGEST_BUFFER_ENABLED', 'false').lower() == 'true'
+    QUESTION_INGEST_MAX_BATCH = int(os.getenv('QUESTION_INGEST_MAX_BATCH', 100))
+    QUESTION_INGEST_MAX_DELAY_MS = int(os.getenv('QUESTION_INGEST_MAX_DELAY_MS', 5))
+    QUESTION_INGEST_MAX_PENDING = int(os.getenv('QUESTION_INGEST_MAX_PENDING', 1000))
+
+    # Near-duplicate question clustering (opt-in, merges questions)
+    QUESTION_CLUSTERING_ENABLED = os.getenv('QUESTION_CLUSTERING_ENABLED', 'false').lower() == 'true'
+    QUESTION_CLUSTER_THRESHOLD = float(os.getenv('QUESTION_CLUSTER_THRESHOLD', 0.6))
+    QUESTION_CLUSTER_MAX_PER_LECTURE = int(os.getenv('QUESTION_CLUSTER_MAX_PER_LECTURE', 500))
+
+    # Question storage layout: 'documents' (one per question) or 'buckets'
+    # (per-lecture time buckets in student_question_buckets)
+    QUESTION_STORAGE_MODE = os.getenv('QUESTION_STORAGE_MODE', 'documents')
+
+    # Upvote-ranked delivery queue
+    QUESTION_QUEUE_REFRESH_SECONDS = int(os.getenv('QUESTION_QUEUE_REFRESH_SECONDS', 60))
+
+    # Question submission rate limits (token buckets: rate per second, burst)
+    QUESTION_RATE_LIMIT_ENABLED = os.getenv('QUESTION_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    QUESTION_RATE_CLIENT_PER_SECOND = float(os.getenv('QUESTION_RATE_CLIENT_PER_SECOND', 1))
+    QUESTION_RATE_CLIENT_BURST = int(os.getenv('QUESTION_RATE_CLIENT_BURST', 10))
+    QUESTION_RATE_LECTURE_PER_SECOND = float(os.getenv('QUESTION_RATE_LECTURE_PER_SECOND', 20))
+    QUESTION_RATE_LECTURE_BURST = int(os.getenv('QUESTION_RATE_LECTURE_BURST', 100))
+    QUESTION_RATE_GLOBAL_PER_SECOND = float(os.getenv('QUESTION_RATE_GLOBAL_PER_SECOND', 200))
+    QUESTION_RATE_GLOBAL_BURST = int(os.getenv('QUESTION_RATE_GLOBAL_BURST', 500))
+    # Upvotes draw from buckets of their own
+    QUESTION_VOTE_CLIENT_PER_SECOND = float(os.getenv('QUESTION_VOTE_CLIENT_PER_SECOND', 2))
+    QUESTION_VOTE_CLIENT_BURST = int(os.getenv('QUESTION_VOTE_CLIENT_BURST', 20))
+    QUESTION_VOTE_LECTURE_PER_SECOND = float(os.getenv('QUESTION_VOTE_LECTURE_PER_SECOND', 50))
+    QUESTION_VOTE_LECTURE_BURST = int(os.getenv('QUESTION_VOTE_LECTURE_BURST', 200))
+    QUESTION_VOTE_GLOBAL_PER_SECOND = float(os.getenv('QUESTION_VOTE_GLOBAL_PER_SECOND', 500))
+    QUESTION_VOTE_GLOBAL_BURST = int(os.getenv('QUESTION_VOTE_GLOBAL_BURST', 1000))
+
+    # Reverse proxies in front of the app that append to X-Forwarded-For.
+    # The client address (and so the per-client rate limit) comes from the
+    # entry this many hops from the end; 0 uses the socket peer and ignores
+    # the header, which clients can set to anything
+    PROXY_TRUSTED_HOPS = int(os.getenv('PROXY_TRUSTED_HOPS', 0))
+
+    # Automatic session start/end (one leader per deployment via a Mongo lease)
+    SESSION_SCHEDULER_ENABLED = os.getenv('SESSION_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SESSION_SCHEDULER_LEASE_SECONDS = int(os.getenv('SESSION_SCHEDULER_LEASE_SECONDS', 30))
+    SESSION_SCHEDULER_LOOKAHEAD_SECONDS = int(os.getenv('SESSION_SCHEDULER_LOOKAHEAD_SECONDS', 3600))
+    # Sessions created on other workers are picked up after at most this delay
+    SESSION_SCHEDULER_RELOAD_SECONDS = int(os.getenv('SESSION_SCHEDULER_RELOAD_SECONDS', 60))
+    SESSION_SCHEDULER_RECOVERY_SECONDS = int(os.getenv('SESSION_SCHEDULER_RECOVERY_SECONDS', 86400))
+
+    # Active session registry (changes made on other workers show up after this delay)
+    ACTIVE_SESSIONS_REFRESH_SECONDS = int(os.getenv('ACTIVE_SESSIONS_REFRESH_SECONDS', 5))
+
+    # Gunicorn server profile (gunicorn.conf.py): worker class 'sync', 'gthread'
+    # or 'gevent'; counts and timeouts of 0 are derived (config/server.py)
+    GUNICORN_BIND = os.getenv('GUNICORN_BIND', '0.0.0.0:8061')
+    GUNICORN_WORKER_CLASS = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+    GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', 0))
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 0))
+    GUNICORN_WORKER_CONNECTIONS = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+    GUNICORN_PRELOAD = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+    GUNICORN_MAX_REQUESTS = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+    GUNICORN_MAX_REQUESTS_JITTER = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+    GUNICORN_TIMEOUT = int(os.getenv('GUNICORN_TIMEOUT', 0))
+    GUNICORN_GRACEFUL_TIMEOUT = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 0))
+    GUNICORN_KEEPALIVE = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+    # MongoDB client (validated at startup by config/server.py)
+    # Connections per process, 0 derives it from the worker concurrency
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 0))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    # Idle connections are closed after this long, 0 keeps them open
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 0))
+    # How long a request waits for a free pooled connection
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000))
+    # 0 waits on a socket without limit
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 0))
+    # Comma-separated wire compressors in order of preference: zstd, snappy, zlib
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+    MONGO_ZLIB_COMPRESSION_LEVEL = int(os.getenv('MONGO_ZLIB_COMPRESSION_LEVEL', -1))
+    MONGO_RETRY_WRITES = os.getenv('MONGO_RETRY_WRITES', 'true').lower() == 'true'
+    MONGO_RETRY_READS = os.getenv('MONGO_RETRY_READS', 'true').lower() == 'true'
+
+    # Mongo command monitoring: commands slower than this are logged, 0 disables
+    MONGO_SLOW_COMMAND_MS = int(os.getenv('MONGO_SLOW_COMMAND_MS', 100))
+    # Most commands one request may issue, per endpoint ('default' for the
+    # others, 0 for no limit); requests over budget are logged and counted.
+    # Long-polls and event streams query repeatedly and have no limit.
+    MONGO_QUERY_BUDGETS = os.getenv(
+        'MONGO_QUERY_BUDGETS',
+        'default=10,lectures.get_next_lecture_question=0,lectures.stream_lecture_questions=0'
+    )
+    # Report each request's command count, time and bytes in X-DB-* headers
+    MONGO_COMMAND_HEADERS = os.getenv('MONGO_COMMAND_HEADERS', 'false').lower() == 'true'
+
+    # Read routing (replica sets): lecture listings, the dashboard, question
+    # lists and counts read from secondaries; auth, sessions and delivery
+    # stay on the primary. Staleness bound of at least 90 seconds, 0 for none.
+    READ_ROUTING_ENABLED = os.getenv('READ_ROUTING_ENABLED', 'false').lower() == 'true'
+    READ_MAX_STALENESS_SECONDS = int(os.getenv('READ_MAX_STALENESS_SECONDS', 90))
+    # Causally consistent routed reads: a lecturer always sees their own updates
+    READ_ROUTING_CAUSAL = os.getenv('READ_ROUTING_CAUSAL', 'true').lower() == 'true'
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     TESTING = False
 
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+    # Fail fast when the local database is not running
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_COMMAND_HEADERS = os.getenv('MONGO_COMMAND_HEADERS', 'true').lower() == 'true'
+
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
 
+    # One in a hundred per-question records
+    LOG_SAMPLING = os.getenv(
+        'LOG_SAMPLING',
+        'services.lecture_service.questions=0.01,services.lecture_service.delivery=0.01'
+    )
+
+    # Ride out replica set elections; bound stuck sockets below the gunicorn timeout
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 20000))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000))
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', 'zlib')
+
 class TestingConfig(Config):
     """Testing configuration"""
     DEBUG = True
     TESTING = True
 
+    IDENTITY_STRICT = os.getenv('IDENTITY_STRICT', 'true').lower() == 'true'
+
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 1000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 2000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 2000))
+
 # Configuration dictionary
 config = {
     'development': DevelopmentConfig,
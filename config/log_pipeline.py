@@ -0,0 +1,302 @@
+"""
+Logging pipeline
+Request threads only enqueue log records; a background listener thread
+formats them (lazily, %-style arguments are merged there) and writes them
+as JSON lines or text. Levels per logger and sampling of hot-path loggers
+come from the LOG_* configuration values.
+"""
+import atexit
+import contextvars
+from datetime import datetime, timezone
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+
+# Request ID of the request being served (thread, greenlet or task local)
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Accepted format of a caller-supplied request ID
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord attributes that are not user supplied extra fields
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'sample_rate', 'taskName'
+}
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with time, level, logger, message and request ID"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'requestId': getattr(record, 'request_id', None)
+        }
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate is not None:
+            entry['sampleRate'] = sample_rate
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request ID on the logging thread"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps every n-th record below WARNING of a hot-path logger"""
+
+    def __init__(self, rate):
+        """
+        Initialize sampling filter
+
+        Args:
+            rate: Fraction of records to keep, between 0 and 1
+        """
+        super().__init__()
+        self.rate = rate
+        self.every = max(int(round(1 / rate)), 1)
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if next(self._counter) % self.every:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks or formats on the calling thread
+
+    Records are enqueued as they are; the listener merges the message
+    arguments. When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.addFilter(RequestIdFilter())
+        self._lock = threading.Lock()
+        self._handled = 0
+        self._dropped = 0
+        self._seconds = 0.0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def handle(self, record):
+        started = time.perf_counter()
+        result = super().handle(record)
+        # Approximate under concurrency; not worth a lock per record
+        self._handled += 1
+        self._seconds += time.perf_counter() - started
+        return result
+
+    def stats(self):
+        """
+        Get handler counters
+
+        Returns:
+            Dictionary with handled and dropped record counts and the mean
+            time the handler costs the logging thread in microseconds
+        """
+        with self._lock:
+            return {
+                'handled': self._handled,
+                'dropped': self._dropped,
+                'meanEnqueueMicros': round(self._seconds / self._handled * 1e6, 2) if self._handled else 0.0
+            }
+
+
+class LogPipeline:
+    """Root queue handler plus the listener thread writing the records"""
+
+    def __init__(self, settings, stream=None):
+        """
+        Initialize logging pipeline (not yet installed)
+
+        Args:
+            settings: Configuration mapping with the LOG_* values
+            stream: Output stream, defaults to stderr
+        """
+        self.queue = queue.Queue(maxsize=settings['LOG_QUEUE_SIZE'])
+        self.handler = NonBlockingQueueHandler(self.queue)
+        output = logging.StreamHandler(stream or sys.stderr)
+        if settings['LOG_FORMAT'] == 'json':
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter(
+                '%(asctime)s - %(levelname)s - %(name)s - [%(request_id)s] %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            ))
+        self.listener = logging.handlers.QueueListener(self.queue, output, respect_handler_level=True)
+        self.level = parse_level(settings['LOG_LEVEL'])
+        self.levels = parse_logger_settings(settings['LOG_LEVELS'], parse_level)
+        self.sampling = parse_logger_settings(settings['LOG_SAMPLING'], parse_rate)
+        self._running = False
+
+    def install(self):
+        """Replace the root handlers with the queue handler and start the listener"""
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        # Neither formatter prints source locations: skip the stack walk
+        # (findCaller) every record would otherwise pay on the calling thread
+        logging._srcfile = None
+        for name, level in self.levels.items():
+            logging.getLogger(name).setLevel(level)
+        for name, rate in self.sampling.items():
+            logging.getLogger(name).addFilter(SamplingFilter(rate))
+        self.listener.start()
+        self._running = True
+
+    def stop(self):
+        """Flush queued records and stop the listener thread (idempotent)"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+    def stats(self):
+        """
+        Get pipeline counters
+
+        Returns:
+            Handler counters plus the number of records waiting in the queue
+        """
+        return dict(self.handler.stats(), queued=self.queue.qsize())
+
+
+def parse_level(value):
+    """Resolve a level name (INFO, WARNING, ...) to its number"""
+    level = logging.getLevelName(value.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {value}")
+    return level
+
+
+def parse_rate(value):
+    """Parse a sampling rate between 0 (exclusive) and 1"""
+    rate = float(value)
+    if not 0 < rate <= 1:
+        raise ValueError(f"Log sampling rate must be in (0, 1], got {value}")
+    return rate
+
+
+def parse_logger_settings(value, parse):
+    """
+    Parse 'logger=value,logger=value' settings
+
+    Args:
+        value: Comma-separated assignments, may be empty
+        parse: Function converting each value
+
+    Returns:
+        Dictionary of logger name to parsed value
+    """
+    parsed = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, separator, setting = item.partition('=')
+        if not separator or not name.strip():
+            raise ValueError(f"Expected logger=value, got {item}")
+        parsed[name.strip()] = parse(setting)
+    return parsed
+
+
+def configure_logging(settings):
+    """
+    Install the logging pipeline once per process
+
+    Args:
+        settings: Configuration mapping with the LOG_* values
+
+    Returns:
+        The installed LogPipeline (the existing one on later calls)
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            pipeline = LogPipeline(settings)
+            pipeline.install()
+            # The listener thread is a daemon: write what is queued at exit
+            atexit.register(pipeline.stop)
+            _pipeline = pipeline
+        return _pipeline
+
+
+def init_request_ids(app, current_request, asynchronous=False):
+    """
+    Give every request an ID (the caller's X-Request-ID if valid) that is
+    attached to its log records and echoed in the response
+
+    Args:
+        app: Flask or Quart application
+        current_request: The framework's request proxy
+        asynchronous: Register coroutine hooks (Quart runs plain functions
+                      in a thread, where the ID would not reach the handler)
+    """
+    def assign_request_id():
+        request_id = current_request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request_id_var.set(request_id)
+
+    def echo_request_id(response):
+        request_id = request_id_var.get()
+        if request_id is not None:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    def clear_request_id(exception=None):
+        # Worker threads are reused; do not leak the ID into the next request
+        request_id_var.set(None)
+
+    if not asynchronous:
+        app.before_request(assign_request_id)
+        app.after_request(echo_request_id)
+        app.teardown_request(clear_request_id)
+        return
+
+    @app.before_request
+    async def assign_request_id_async():
+        assign_request_id()
+
+    @app.after_request
+    async def echo_request_id_async(response):
+        return echo_request_id(response)
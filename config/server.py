@@ -0,0 +1,163 @@
+"""
+Server profile
+Worker counts, timeouts and Mongo pool size derived from the configuration
+"""
+import importlib.util
+import multiprocessing
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+# Threads per gthread worker when GUNICORN_THREADS is 0; each held long-poll
+# occupies one of them
+DEFAULT_THREADS = 16
+# Concurrency of a worker kept for short requests: long-polls and event
+# streams beyond the rest are refused instead of taking every thread
+SHORT_REQUEST_HEADROOM = 4
+# Connections used by background threads (ingest flusher, session scheduler,
+# registry rebuilds) on top of the request concurrency
+POOL_HEADROOM = 3
+# PyMongo's own default, never exceeded by the derived pool size
+MAX_DERIVED_POOL_SIZE = 100
+# Wire compressors and the module each one needs
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+
+def server_profile(settings, cpu_count=None):
+    """
+    Resolve the gunicorn worker setup
+
+    Args:
+        settings: Configuration mapping (app.config or a flask.Config)
+        cpu_count: CPU count, defaults to the CPUs of this machine
+
+    Returns:
+        Dictionary with worker_class, workers, threads, worker_connections,
+        concurrency (requests one worker serves at once), timeout and
+        graceful_timeout
+    """
+    worker_class = settings['GUNICORN_WORKER_CLASS']
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, got {worker_class}")
+
+    cpus = cpu_count or multiprocessing.cpu_count()
+    long_poll_seconds = settings['LONG_POLL_MAX_SECONDS']
+    threads = 1
+    worker_connections = settings['GUNICORN_WORKER_CONNECTIONS']
+
+    if worker_class == 'sync':
+        # One request per process: CPU-bound sizing, and a timeout that lets
+        # a long-poll finish (the sync worker cannot heartbeat while serving)
+        workers = 2 * cpus + 1
+        concurrency = 1
+        timeout = long_poll_seconds + 30
+    elif worker_class == 'gthread':
+        workers = cpus + 1
+        threads = settings['GUNICORN_THREADS'] or DEFAULT_THREADS
+        concurrency = threads
+        timeout = 30
+    else:
+        workers = cpus + 1
+        concurrency = worker_connections
+        timeout = 30
+
+    return {
+        'worker_class': worker_class,
+        'workers': settings['GUNICORN_WORKERS'] or workers,
+        'threads': threads,
+        'worker_connections': worker_connections,
+        'concurrency': concurrency,
+        'timeout': settings['GUNICORN_TIMEOUT'] or timeout,
+        # Give in-flight long-polls time to complete on reloads and restarts
+        'graceful_timeout': settings['GUNICORN_GRACEFUL_TIMEOUT'] or long_poll_seconds + 5
+    }
+
+
+def held_request_limit(settings):
+    """
+    Cap the long-polls and event streams one worker holds at once
+
+    Each of them keeps a worker thread (gthread), greenlet (gevent) or the
+    whole process (sync) until it ends, so they get the worker concurrency
+    minus SHORT_REQUEST_HEADROOM, at least one and at most SSE_MAX_STREAMS.
+
+    Args:
+        settings: Configuration mapping
+
+    Returns:
+        Maximum number of held requests per worker
+    """
+    concurrency = server_profile(settings, cpu_count=1)['concurrency']
+    return max(min(concurrency - SHORT_REQUEST_HEADROOM, settings['SSE_MAX_STREAMS']), 1)
+
+
+def mongo_pool_size(settings):
+    """
+    Size the PyMongo connection pool of one worker process
+
+    Args:
+        settings: Configuration mapping
+
+    Returns:
+        MONGO_MAX_POOL_SIZE if set, otherwise the worker concurrency plus
+        POOL_HEADROOM, at most MAX_DERIVED_POOL_SIZE
+    """
+    if settings['MONGO_MAX_POOL_SIZE']:
+        return settings['MONGO_MAX_POOL_SIZE']
+    concurrency = server_profile(settings, cpu_count=1)['concurrency']
+    return min(concurrency + POOL_HEADROOM, MAX_DERIVED_POOL_SIZE)
+
+
+def mongo_client_options(settings):
+    """
+    Validate the MONGO_* settings and build MongoClient keyword arguments
+
+    Args:
+        settings: Configuration mapping
+
+    Returns:
+        Keyword arguments for MongoClient or PyMongo
+
+    Raises:
+        ValueError: If a setting is out of range or a compressor is unknown
+            or its module is not installed
+    """
+    max_pool_size = mongo_pool_size(settings)
+    min_pool_size = settings['MONGO_MIN_POOL_SIZE']
+    if max_pool_size < 1:
+        raise ValueError(f"MONGO_MAX_POOL_SIZE must be positive, got {max_pool_size}")
+    if not 0 <= min_pool_size <= max_pool_size:
+        raise ValueError(f"MONGO_MIN_POOL_SIZE must be between 0 and the pool size {max_pool_size}, got {min_pool_size}")
+
+    for name in ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 'MONGO_SERVER_SELECTION_TIMEOUT_MS', 'MONGO_CONNECT_TIMEOUT_MS'):
+        if settings[name] <= 0:
+            raise ValueError(f"{name} must be positive, got {settings[name]}")
+    for name in ('MONGO_SOCKET_TIMEOUT_MS', 'MONGO_MAX_IDLE_TIME_MS'):
+        if settings[name] < 0:
+            raise ValueError(f"{name} must be 0 (no limit) or positive, got {settings[name]}")
+    if not -1 <= settings['MONGO_ZLIB_COMPRESSION_LEVEL'] <= 9:
+        raise ValueError(f"MONGO_ZLIB_COMPRESSION_LEVEL must be between -1 and 9, got {settings['MONGO_ZLIB_COMPRESSION_LEVEL']}")
+
+    compressors = [name.strip() for name in settings['MONGO_COMPRESSORS'].split(',') if name.strip()]
+    for name in compressors:
+        if name not in COMPRESSOR_MODULES:
+            raise ValueError(f"MONGO_COMPRESSORS must only contain {', '.join(COMPRESSOR_MODULES)}, got {name}")
+        # PyMongo silently drops a compressor whose module is missing
+        if importlib.util.find_spec(COMPRESSOR_MODULES[name]) is None:
+            raise ValueError(f"MONGO_COMPRESSORS lists {name}, which needs the {COMPRESSOR_MODULES[name]} package")
+
+    options = {
+        'maxPoolSize': max_pool_size,
+        'minPoolSize': min_pool_size,
+        'waitQueueTimeoutMS': settings['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': settings['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'connectTimeoutMS': settings['MONGO_CONNECT_TIMEOUT_MS'],
+        'socketTimeoutMS': settings['MONGO_SOCKET_TIMEOUT_MS'] or None,
+        'maxIdleTimeMS': settings['MONGO_MAX_IDLE_TIME_MS'] or None,
+        'retryWrites': settings['MONGO_RETRY_WRITES'],
+        'retryReads': settings['MONGO_RETRY_READS']
+    }
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+        if 'zlib' in compressors:
+            options['zlibCompressionLevel'] = settings['MONGO_ZLIB_COMPRESSION_LEVEL']
+    return options
@@ -0,0 +1,87 @@
+"""
+Gunicorn configuration driven by config.Config
+
+    gunicorn wsgi:app
+
+Every setting comes from the GUNICORN_* configuration values; worker and
+thread counts and timeouts left at 0 are derived by config.server. Pick the
+profile with GUNICORN_WORKER_CLASS:
+
+    sync     one request per process, 2 * CPUs + 1 processes
+    gthread  CPUs + 1 processes with GUNICORN_THREADS threads (default 16)
+    gevent   CPUs + 1 processes with GUNICORN_WORKER_CONNECTIONS greenlets
+"""
+import os
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from flask import Config as Settings
+
+from config import get_config
+from config.server import held_request_limit, mongo_client_options, server_profile
+from services.request_metrics import clear_directory, mark_process_dead
+
+settings = Settings(os.getcwd())
+settings.from_object(get_config(os.getenv('FLASK_ENV', 'production')))
+profile = server_profile(settings)
+# Validate the Mongo settings in the master so bad values stop the server early
+mongo_options = mongo_client_options(settings)
+# Workers write their request metrics here; /metrics on any worker sums them
+metrics_dir = settings['METRICS_MULTIPROC_DIR'] if settings['METRICS_ENABLED'] else ''
+
+if profile['worker_class'] == 'gevent':
+    # Patch before the app modules (ssl, threading) are preloaded
+    from gevent import monkey
+    monkey.patch_all()
+
+wsgi_app = 'wsgi:app'
+bind = settings['GUNICORN_BIND']
+
+worker_class = profile['worker_class']
+workers = profile['workers']
+threads = profile['threads']
+worker_connections = profile['worker_connections']
+
+# Share the imported code between workers; the app itself is built per worker
+preload_app = settings['GUNICORN_PRELOAD']
+
+# Recycle workers to bound memory growth, staggered so they do not restart together
+max_requests = settings['GUNICORN_MAX_REQUESTS']
+max_requests_jitter = settings['GUNICORN_MAX_REQUESTS_JITTER']
+
+timeout = profile['timeout']
+graceful_timeout = profile['graceful_timeout']
+keepalive = settings['GUNICORN_KEEPALIVE']
+
+
+def on_starting(server):
+    # Drop the totals of a previous run
+    if metrics_dir:
+        clear_directory(metrics_dir)
+
+
+def when_ready(server):
+    server.log.info(
+        f"Server profile {worker_class}: {workers} workers x {profile['concurrency']} concurrent requests, "
+        f"{held_request_limit(settings)} of them long-polls or streams, "
+        f"Mongo pool {mongo_options['maxPoolSize']} per worker"
+    )
+
+
+def post_worker_init(worker):
+    # Mongo client, indexes and background threads are created after fork
+    worker.wsgi.build()
+
+
+def worker_exit(server, worker):
+    # Release the scheduler lease and flush buffered questions
+    wsgi = getattr(worker, 'wsgi', None)
+    if wsgi is not None:
+        wsgi.shutdown()
+
+
+def child_exit(server, worker):
+    # Keep the exited worker's counters in the totals, drop its gauges
+    if metrics_dir:
+        mark_process_dead(metrics_dir, worker.pid)
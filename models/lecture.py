@@ -33,6 +33,8 @@ class Lecture:
             'semesterEndDate': semester_end,
             'classSessions': class_sessions,
             'lectureDays': lecture_days,
+            # Compare-and-set marker for the per-lecture question cooldown
+            'lastQuestionDeliveredAt': None,
             'createdAt': datetime.utcnow(),
             'updatedAt': datetime.utcnow()
         }
@@ -58,6 +60,47 @@ class Lecture:
         # Ensure end time is after start time
         return item['endTime'] > item['startTime']
     
+    @staticmethod
+    def check_schedule(class_sessions=None, lecture_days=None):
+        """
+        Validate the class sessions and lecture days of a lecture
+
+        Raises:
+            ValueError: On the first invalid class session or lecture day
+        """
+        for session in class_sessions or []:
+            if not Lecture.validate_class_session(session):
+                raise ValueError(f"Invalid class session: {session}")
+
+        for day in lecture_days or []:
+            if not Lecture.validate_lecture_day(day):
+                raise ValueError(f"Invalid lecture day: {day}")
+
+    @staticmethod
+    def apply_day_updates(lecture_days, day_id, day_updates):
+        """
+        Validate day updates and merge them into the matching lecture day
+
+        Args:
+            lecture_days: List of lecture day objects (modified in place)
+            day_id: Lecture day ID (string)
+            day_updates: Dictionary of day fields to update
+
+        Raises:
+            ValueError: On an invalid timeline item or an unknown day
+        """
+        if 'timeline' in day_updates and day_updates['timeline']:
+            for item in day_updates['timeline']:
+                if not Lecture.validate_timeline_item(item):
+                    raise ValueError(f"Invalid timeline item: {item}")
+
+        for day in lecture_days:
+            if day.get('id') == day_id:
+                day.update(day_updates)
+                return
+
+        raise ValueError(f"Lecture day {day_id} not found")
+
     @staticmethod
     def to_json(lecture):
         """Convert lecture document to JSON-serializable format"""
@@ -80,6 +123,8 @@ class Lecture:
             lecture_copy['createdAt'] = lecture_copy['createdAt'].isoformat()
         if 'updatedAt' in lecture_copy:
             lecture_copy['updatedAt'] = lecture_copy['updatedAt'].isoformat()
+        if isinstance(lecture_copy.get('lastQuestionDeliveredAt'), datetime):
+            lecture_copy['lastQuestionDeliveredAt'] = lecture_copy['lastQuestionDeliveredAt'].isoformat()
         
         return lecture_copy
 
@@ -89,6 +134,29 @@ class Lecture:
 class StudentQuestion:
     """Student Question model"""
 
+    # One upvote outweighs this many seconds of waiting in the queue
+    VOTE_WEIGHT_SECONDS = 60
+
+    @staticmethod
+    def priority(votes, created_at):
+        """
+        Compute the delivery priority of a question
+
+        The score votes * VOTE_WEIGHT_SECONDS + age grows by the same amount
+        for every question as time passes, so ordering by
+        votes * VOTE_WEIGHT_SECONDS - createdAt is equivalent and never has
+        to be recomputed.
+
+        Args:
+            votes: Number of upvotes (and clustered duplicates)
+            created_at: Creation datetime (UTC)
+
+        Returns:
+            Float priority, higher is delivered first
+        """
+        created_seconds = (created_at - datetime(1970, 1, 1)).total_seconds()
+        return votes * StudentQuestion.VOTE_WEIGHT_SECONDS - created_seconds
+
     @staticmethod
     def create(lecture_key, student_name, question):
         """
@@ -102,15 +170,24 @@ class StudentQuestion:
         Returns:
             Dictionary representing a question document
         """
+        created_at = datetime.utcnow()
         return {
             'lectureKey': lecture_key,
             'studentName': student_name,
             'question': question,
             'isAnswered': False,
-            'createdAt': datetime.utcnow(),
+            'createdAt': created_at,
+            # bumped on every change, drives delta sync of question lists
+            'updatedAt': created_at,
+            'upvotes': 0,
+            'priority': StudentQuestion.priority(0, created_at),
             # new fields for advanced polling logic
             'isDelivered': False,
-            'deliveredAt': None
+            'deliveredAt': None,
+            # near-duplicate clustering: duplicates point at their representative
+            'clusterId': None,
+            'isDuplicate': False,
+            'duplicateCount': 0
         }
 
     @staticmethod
@@ -130,10 +207,19 @@ class StudentQuestion:
         if 'lectureId' in question_copy and isinstance(question_copy['lectureId'], ObjectId):
             question_copy['lectureId'] = str(question_copy['lectureId'])
 
+        # Voter fingerprints stay on the server
+        question_copy.pop('voters', None)
+
+        if isinstance(question_copy.get('clusterId'), ObjectId):
+            question_copy['clusterId'] = str(question_copy['clusterId'])
+
         # Convert datetime to ISO format
         if 'createdAt' in question_copy and isinstance(question_copy['createdAt'], datetime):
             question_copy['createdAt'] = question_copy['createdAt'].isoformat()
 
+        if isinstance(question_copy.get('updatedAt'), datetime):
+            question_copy['updatedAt'] = question_copy['updatedAt'].isoformat()
+
         if 'deliveredAt' in question_copy and isinstance(question_copy['deliveredAt'], datetime):
             question_copy['deliveredAt'] = question_copy['deliveredAt'].isoformat()
 
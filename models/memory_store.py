@@ -0,0 +1,1115 @@
+"""
+Memory Store
+In-memory storage engine with the methods of the Mongo repositories and
+question store, for benchmarks, local development and single-process
+(kiosk) deployments. Writes can be persisted to an append-only file.
+"""
+import bisect
+from datetime import datetime, timezone
+import logging
+import os
+import threading
+
+from bson import ObjectId, json_util
+from bson.json_util import DatetimeRepresentation, JSONMode, JSONOptions
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from models.lecture import StudentQuestion
+from models.sessions import SessionModel
+from models.user import User
+from models.verification import EmailVerification
+
+logger = logging.getLogger(__name__)
+
+# Datetimes round-trip exactly: stored values are already cut to milliseconds
+LOG_JSON_OPTIONS = JSONOptions(
+    json_mode=JSONMode.RELAXED,
+    datetime_representation=DatetimeRepresentation.ISO8601,
+    tz_aware=False
+)
+
+# Rewrite the log on load once it holds this many records beyond two per document
+COMPACT_MIN_RECORDS = 1000
+
+
+def stored(value):
+    """
+    Copy a value the way MongoDB stores it
+
+    Containers are copied, so callers can keep changing their document, and
+    datetimes become naive UTC with millisecond precision (BSON dates), so
+    comparisons behave as they do against MongoDB.
+    """
+    if isinstance(value, dict):
+        return {key: stored(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [stored(item) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond - value.microsecond % 1000)
+    return value
+
+
+def copy_document(value):
+    """Copy a stored document for a caller (containers only, values are stored already)"""
+    if isinstance(value, dict):
+        return {key: copy_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_document(item) for item in value]
+    return value
+
+
+def project(document, fields):
+    """Copy _id and the given fields of a document, like a find projection"""
+    projected = {'_id': document['_id']}
+    for field in fields:
+        if field in document:
+            projected[field] = copy_document(document[field])
+    return projected
+
+
+def _parent(document, path):
+    """Container holding the last part of a dotted path, created as needed"""
+    parts = path.split('.')
+    container = document
+    for part in parts[:-1]:
+        if isinstance(container, list):
+            container = container[int(part)]
+        else:
+            container = container.setdefault(part, {})
+    last = parts[-1]
+    return container, int(last) if isinstance(container, list) else last
+
+
+def apply_update(document, update):
+    """
+    Apply a MongoDB update document in place
+
+    Supports the operators the models build: $set, $inc, $pull and
+    $addToSet (scalar values).
+
+    Raises:
+        ValueError: On any other operator
+    """
+    for operator, changes in update.items():
+        for path, value in changes.items():
+            container, field = _parent(document, path)
+            if operator == '$set':
+                container[field] = stored(value)
+            elif operator == '$inc':
+                container[field] = container.get(field, 0) + value
+            elif operator == '$pull':
+                container[field] = [item for item in container.get(field) or [] if item != value]
+            elif operator == '$addToSet':
+                items = container.setdefault(field, [])
+                if value not in items:
+                    items.append(stored(value))
+            else:
+                raise ValueError(f"Unsupported update operator: {operator}")
+
+
+class SortedIndex:
+    """_ids ordered by a sort key, with insertion order between equal keys"""
+
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, key, _id):
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.ids.insert(position, _id)
+
+    def remove(self, key, _id):
+        position = bisect.bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.ids[position] == _id:
+                del self.keys[position]
+                del self.ids[position]
+                return
+            position += 1
+
+    def between(self, low=None, high=None, include_low=True):
+        """_ids with low <= key <= high in key order (low < key without include_low)"""
+        start = 0
+        if low is not None:
+            start = (bisect.bisect_left if include_low else bisect.bisect_right)(self.keys, low)
+        end = len(self.keys) if high is None else bisect.bisect_right(self.keys, high)
+        return self.ids[start:end]
+
+    def first(self):
+        return self.ids[0] if self.ids else None
+
+    def last_key(self):
+        return self.keys[-1] if self.keys else None
+
+
+class MemoryTable:
+    """
+    Documents of one collection keyed by _id.
+
+    Hash indexes map a key to the _ids having it (in insertion order);
+    sorted indexes keep _ids ordered by a sort key within a partition (for
+    example the lecture). Both are maintained on every put and remove.
+    Callers hold lock around reads and writes.
+    """
+
+    def __init__(self, name, log=None):
+        """
+        Initialize memory table
+
+        Args:
+            name: Collection name, also used in the append-only file
+            log: AppendOnlyLog receiving the writes, None to keep them in memory
+        """
+        self.name = name
+        self.log = log
+        self.lock = threading.RLock()
+        self.documents = {}
+        self._hash_indexes = {}
+        self._sorted_indexes = {}
+
+    def hash_index(self, name, keys):
+        """
+        Add a hash index
+
+        Args:
+            name: Index name
+            keys: Function returning the index keys of a document
+        """
+        self._hash_indexes[name] = (keys, {})
+
+    def sorted_index(self, name, entry):
+        """
+        Add a sorted index
+
+        Args:
+            name: Index name
+            entry: Function returning (partition, sort key) of a document,
+                   or None to leave the document out
+        """
+        self._sorted_indexes[name] = (entry, {})
+
+    def ids(self, index, key):
+        """_ids with a hash index key, oldest first"""
+        return list(self._hash_indexes[index][1].get(key, ()))
+
+    def first(self, index, key, condition=None):
+        """First document with a hash index key (and matching condition), or None"""
+        for _id in self._hash_indexes[index][1].get(key, ()):
+            document = self.documents[_id]
+            if condition is None or condition(document):
+                return document
+        return None
+
+    def count(self, index, key):
+        """Number of documents with a hash index key"""
+        return len(self._hash_indexes[index][1].get(key, ()))
+
+    def sorted(self, index, partition):
+        """The SortedIndex of a partition (empty if the partition has no documents)"""
+        return self._sorted_indexes[index][1].get(partition) or SortedIndex()
+
+    def get(self, _id):
+        return self.documents.get(_id)
+
+    def insert(self, document):
+        """
+        Add a new document, assigning an _id to it (and the caller's copy)
+
+        Returns:
+            The _id
+
+        Raises:
+            DuplicateKeyError: If the _id exists
+        """
+        _id = document.setdefault('_id', ObjectId())
+        if _id in self.documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_ dup key: {_id}")
+        self.put(stored(document))
+        return _id
+
+    def put(self, document, logged=True):
+        """Store a document (already in stored form), replacing the one with its _id"""
+        _id = document['_id']
+        previous = self.documents.get(_id)
+        if previous is not None:
+            self._unindex(previous)
+        self.documents[_id] = document
+        self._index(document)
+        if logged and self.log is not None:
+            self.log.append(self.name, 'put', document)
+
+    def remove(self, _id, logged=True):
+        """Remove a document; True if it existed"""
+        document = self.documents.pop(_id, None)
+        if document is None:
+            return False
+        self._unindex(document)
+        if logged and self.log is not None:
+            self.log.append(self.name, 'remove', _id)
+        return True
+
+    def _index(self, document):
+        _id = document['_id']
+        for keys, index in self._hash_indexes.values():
+            for key in keys(document):
+                index.setdefault(key, {})[_id] = None
+        for entry, partitions in self._sorted_indexes.values():
+            position = entry(document)
+            if position is not None:
+                partition, key = position
+                partitions.setdefault(partition, SortedIndex()).add(key, _id)
+
+    def _unindex(self, document):
+        _id = document['_id']
+        for keys, index in self._hash_indexes.values():
+            for key in keys(document):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.pop(_id, None)
+                    if not ids:
+                        del index[key]
+        for entry, partitions in self._sorted_indexes.values():
+            position = entry(document)
+            if position is not None:
+                partition, key = position
+                sorted_index = partitions.get(partition)
+                if sorted_index is not None:
+                    sorted_index.remove(key, _id)
+                    if not sorted_index:
+                        del partitions[partition]
+
+
+class AppendOnlyLog:
+    """
+    Append-only file of the memory engine's writes.
+
+    Every put stores the whole document and every removal its _id, one JSON
+    line (MongoDB extended JSON) per write. Loading replays the file; a torn
+    last line from a crash is ignored. When the file holds many more
+    records than documents, it is rewritten with one record per document.
+    """
+
+    def __init__(self, path, fsync=False):
+        """
+        Initialize append-only log
+
+        Args:
+            path: File path, created if missing
+            fsync: Sync the file after every write instead of leaving it to the OS
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        self._records = 0
+
+    def load(self, tables):
+        """
+        Replay the file into the tables and open it for appending
+
+        Args:
+            tables: Dictionary of MemoryTable by name
+        """
+        if os.path.exists(self.path):
+            with open(self.path) as log_file:
+                for line_number, line in enumerate(log_file, start=1):
+                    try:
+                        record = json_util.loads(line, json_options=LOG_JSON_OPTIONS)
+                    except ValueError:
+                        logger.warning("Skipping unreadable record %s of %s", line_number, self.path)
+                        continue
+                    table = tables.get(record.get('table'))
+                    if table is None:
+                        continue
+                    if record['op'] == 'put':
+                        table.put(record['value'], logged=False)
+                    else:
+                        table.remove(record['value'], logged=False)
+                    self._records += 1
+
+        documents = sum(len(table.documents) for table in tables.values())
+        if self._records > 2 * documents + COMPACT_MIN_RECORDS:
+            self.compact(tables)
+        else:
+            self._file = open(self.path, 'a')
+        logger.info("Loaded %s documents from %s", documents, self.path)
+
+    def append(self, table, op, value):
+        """Write one record (callers hold the table's lock, so per-document order is kept)"""
+        line = json_util.dumps({'table': table, 'op': op, 'value': value}, json_options=LOG_JSON_OPTIONS)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._records += 1
+
+    def compact(self, tables):
+        """Rewrite the file with one put per live document"""
+        temporary_path = f'{self.path}.compact'
+        records = 0
+        with self._lock:
+            with open(temporary_path, 'w') as compacted:
+                for name, table in tables.items():
+                    with table.lock:
+                        for document in table.documents.values():
+                            compacted.write(json_util.dumps(
+                                {'table': name, 'op': 'put', 'value': document},
+                                json_options=LOG_JSON_OPTIONS
+                            ) + '\n')
+                            records += 1
+                compacted.flush()
+                os.fsync(compacted.fileno())
+            if self._file is not None:
+                self._file.close()
+            os.replace(temporary_path, self.path)
+            self._file = open(self.path, 'a')
+            self._records = records
+        logger.info("Compacted %s to %s records", self.path, records)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        """
+        Get log counters
+
+        Returns:
+            Dictionary with the path and the number of records in the file
+        """
+        with self._lock:
+            return {'path': self.path, 'records': self._records}
+
+
+class MemoryUserRepository:
+    """Users with hash indexes on email, session IDs and uniqueNumber"""
+
+    def __init__(self, log=None):
+        self.table = MemoryTable('users', log)
+        self.table.hash_index('email', lambda user: [user.get('email')])
+        self.table.hash_index('activeSessionIds', lambda user: user.get('activeSessionIds') or ())
+        self.table.hash_index('pendingSessionIds', lambda user: user.get('pendingSessionIds') or ())
+        self.table.hash_index('uniqueNumber', lambda user: [user.get('uniqueNumber')])
+
+    def _found(self, index, key):
+        with self.table.lock:
+            user = self.table.first(index, key)
+            return copy_document(user) if user is not None else None
+
+    def _update(self, user_id, update):
+        """Apply an update to a user; True if the user exists"""
+        current = self.table.get(user_id)
+        if current is None:
+            return False
+        changed = copy_document(current)
+        apply_update(changed, update)
+        self.table.put(changed)
+        return True
+
+    def insert(self, document):
+        with self.table.lock:
+            return self.table.insert(document)
+
+    def create(self, email):
+        user_document = User.new_document(email)
+        self.insert(user_document)
+        return user_document
+
+    def find_by_email(self, email):
+        return self._found('email', email)
+
+    def find_by_active_session(self, session_id, session=None):
+        return self._found('activeSessionIds', session_id)
+
+    def find_by_active_or_pending_session(self, session_id):
+        return self._found('activeSessionIds', session_id) or self._found('pendingSessionIds', session_id)
+
+    def find_by_unique_number(self, unique_number):
+        return self._found('uniqueNumber', unique_number)
+
+    def update(self, user):
+        user_filter, update = User.update_query(user)
+        with self.table.lock:
+            return self._update(user_filter['_id'], update)
+
+    def activate_session(self, user_id, session_id):
+        with self.table.lock:
+            result, update = User.activation_change(self.table.get(user_id), session_id)
+            if update is not None:
+                self._update(user_id, update)
+            return result
+
+    def inactivate_session(self, user_id, session_id):
+        with self.table.lock:
+            result, update = User.inactivation_change(self.table.get(user_id), session_id)
+            if update is not None:
+                self._update(user_id, update)
+            return result
+
+    def delete_by_email(self, email):
+        with self.table.lock:
+            user = self.table.first('email', email)
+            return user is not None and self.table.remove(user['_id'])
+
+
+class MemoryVerificationRepository:
+    """Email verifications with hash indexes on token and email"""
+
+    def __init__(self, log=None):
+        self.table = MemoryTable('email_verifications', log)
+        self.table.hash_index('verificationToken', lambda verification: [verification.get('verificationToken')])
+        self.table.hash_index('email', lambda verification: [verification.get('email')])
+
+    def create(self, email, verification_token, minutes=15):
+        verification = EmailVerification.new_document(email, verification_token, minutes)
+        with self.table.lock:
+            self.table.insert(verification)
+        return verification
+
+    def find_by_token(self, token):
+        with self.table.lock:
+            verification = self.table.first(
+                'verificationToken', token, lambda document: document.get('isVerified') is False
+            )
+            return copy_document(verification) if verification is not None else None
+
+    def mark_as_verified(self, verification_id):
+        with self.table.lock:
+            current = self.table.get(verification_id)
+            if current is not None:
+                self.table.put(dict(current, isVerified=True))
+
+    def delete_by_email(self, email):
+        with self.table.lock:
+            ids = self.table.ids('email', email)
+            for _id in ids:
+                self.table.remove(_id)
+            return len(ids)
+
+
+class MemoryLectureRepository:
+    """Lectures with hash indexes on key and lecturerId"""
+
+    DASHBOARD_FIELDS = ['key', 'courseName', 'semesterStartDate', 'semesterEndDate']
+
+    def __init__(self, question_store, log=None):
+        """
+        Initialize lecture repository
+
+        Args:
+            question_store: MemoryQuestionStore whose statistics the dashboard joins
+            log: AppendOnlyLog receiving the writes
+        """
+        self.question_store = question_store
+        self.table = MemoryTable('lectures', log)
+        self.table.hash_index('key', lambda lecture: [lecture.get('key')])
+        self.table.hash_index('lecturerId', lambda lecture: [lecture.get('lecturerId')])
+
+    def ensure_indexes(self):
+        """Indexes are built in"""
+
+    def with_read_preference(self, read_preference):
+        return self
+
+    def _set(self, lecture, changes):
+        changed = copy_document(lecture)
+        apply_update(changed, {'$set': changes})
+        self.table.put(changed)
+        return changed
+
+    def insert(self, document):
+        with self.table.lock:
+            return self.table.insert(document)
+
+    def update(self, lecture_key, changes):
+        with self.table.lock:
+            lecture = self.table.first('key', lecture_key)
+            if lecture is None:
+                return None
+            return copy_document(self._set(lecture, changes))
+
+    def delete(self, lecture_key, lecturer_id):
+        with self.table.lock:
+            lecture = self.table.first('key', lecture_key, lambda document: document.get('lecturerId') == lecturer_id)
+            return lecture is not None and self.table.remove(lecture['_id'])
+
+    def claim_delivery_slot(self, lecture_key, now, free_before):
+        free_before = stored(free_before)
+
+        def is_free(lecture):
+            last_delivered_at = lecture.get('lastQuestionDeliveredAt')
+            return last_delivered_at is None or (
+                isinstance(last_delivered_at, datetime) and last_delivered_at <= free_before
+            )
+
+        with self.table.lock:
+            lecture = self.table.first('key', lecture_key, is_free)
+            if lecture is None:
+                return None
+            previous = project(lecture, ['lastQuestionDeliveredAt'])
+            self._set(lecture, {'lastQuestionDeliveredAt': now})
+            return previous
+
+    def release_delivery_slot(self, lecture_key, claimed_at, previous):
+        claimed_at = stored(claimed_at)
+        with self.table.lock:
+            lecture = self.table.first(
+                'key', lecture_key, lambda document: document.get('lastQuestionDeliveredAt') == claimed_at
+            )
+            if lecture is not None:
+                self._set(lecture, {'lastQuestionDeliveredAt': previous})
+
+    def find_by_key(self, lecture_key):
+        with self.table.lock:
+            lecture = self.table.first('key', lecture_key)
+            return copy_document(lecture) if lecture is not None else None
+
+    def find_delivery_state(self, lecture_key):
+        with self.table.lock:
+            lecture = self.table.first('key', lecture_key)
+            return project(lecture, ['lastQuestionDeliveredAt']) if lecture is not None else None
+
+    def owns(self, lecture_key, lecturer_id):
+        with self.table.lock:
+            return self.table.first(
+                'key', lecture_key, lambda document: document.get('lecturerId') == lecturer_id
+            ) is not None
+
+    def find_by_lecturer(self, lecturer_id, session=None):
+        with self.table.lock:
+            return [copy_document(self.table.get(_id)) for _id in self.table.ids('lecturerId', lecturer_id)]
+
+    def find_keys_by_lecturer(self, lecturer_id, session=None):
+        with self.table.lock:
+            return [self.table.get(_id).get('key') for _id in self.table.ids('lecturerId', lecturer_id)]
+
+    def dashboard(self, lecturer_id, session=None):
+        with self.table.lock:
+            lectures = [
+                project(self.table.get(_id), self.DASHBOARD_FIELDS)
+                for _id in self.table.ids('lecturerId', lecturer_id)
+            ]
+        for lecture in lectures:
+            stats = self.question_store.lecture_stats(lecture.get('key'))
+            if stats is not None:
+                lecture['questionStats'] = stats
+        # Descending, lectures without a start date last (null sorts lowest)
+        lectures.sort(
+            key=lambda lecture: (lecture.get('semesterStartDate') is not None, lecture.get('semesterStartDate') or ''),
+            reverse=True
+        )
+        return lectures
+
+
+class MemorySessionRepository:
+    """
+    Sessions with hash indexes on sessionId (unique), uniqueNumber and
+    running sessions, and the not yet started sessions sorted by expected
+    start time for the scheduler
+    """
+
+    def __init__(self, log=None):
+        self.table = MemoryTable('sessions', log)
+        self.table.hash_index('sessionId', lambda session: [session.get('sessionId')])
+        self.table.hash_index('uniqueNumber', lambda session: [session.get('uniqueNumber')])
+        self.table.hash_index(
+            'running', lambda session: [True] if session.get('session_is_active') is True else []
+        )
+        self.table.sorted_index('pendingStart', self._pending_start)
+
+    @staticmethod
+    def _not_started(session):
+        """Neither running nor started or ended before"""
+        return (
+            session.get('session_is_active') is False
+            and session.get('session_actual_start_time') is None
+            and session.get('session_actual_end_time') is None
+        )
+
+    @classmethod
+    def _pending_start(cls, session):
+        start_at = session.get('expectedStartAt')
+        if isinstance(start_at, datetime) and cls._not_started(session):
+            return None, start_at
+        return None
+
+    def ensure_indexes(self):
+        """Indexes are built in"""
+
+    def ensure_schedule_indexes(self):
+        """Indexes are built in"""
+
+    def find_duplicate_session_ids(self, limit=10):
+        """The sessionId index is unique from the first insert"""
+        return []
+
+    def _set(self, session, changes):
+        changed = copy_document(session)
+        apply_update(changed, {'$set': changes})
+        self.table.put(changed)
+
+    def create(self, session_data):
+        SessionModel.newSession(session_data)
+        with self.table.lock:
+            if self.table.count('sessionId', session_data.get('sessionId')):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: sessions index: sessionId_1 "
+                    f"dup key: {session_data.get('sessionId')}"
+                )
+            self.table.insert(session_data)
+        return {**session_data}
+
+    def update(self, session_id, changes):
+        changes["updatedAt"] = datetime.utcnow()
+        changes.pop('_id', None)
+        changes.update(SessionModel.scheduleTimes(changes))
+        with self.table.lock:
+            session = self.table.first('sessionId', session_id)
+            if session is None:
+                return 0
+            self._set(session, changes)
+            return 1
+
+    def delete(self, session_id):
+        with self.table.lock:
+            session = self.table.first('sessionId', session_id)
+            return int(session is not None and self.table.remove(session['_id']))
+
+    def start_many(self, session_ids, now):
+        started = 0
+        with self.table.lock:
+            for session_id in session_ids:
+                for _id in self.table.ids('sessionId', session_id):
+                    session = self.table.get(_id)
+                    if not self._not_started(session):
+                        continue
+                    self._set(session, {
+                        'session_is_active': True,
+                        'session_actual_start_time': now,
+                        'updatedAt': now
+                    })
+                    started += 1
+        return started
+
+    def end_many(self, session_ids, now):
+        ended = 0
+        with self.table.lock:
+            for session_id in session_ids:
+                for _id in self.table.ids('sessionId', session_id):
+                    session = self.table.get(_id)
+                    if session.get('session_is_active') is not True:
+                        continue
+                    self._set(session, {
+                        'session_is_active': False,
+                        'session_actual_end_time': now,
+                        'updatedAt': now
+                    })
+                    ended += 1
+        return ended
+
+    def find_by_session_id(self, session_id):
+        with self.table.lock:
+            session = self.table.first('sessionId', session_id)
+            return copy_document(session) if session is not None else None
+
+    def find_by_user(self, unique_number, limit=50, before=None):
+        with self.table.lock:
+            sessions = [self.table.get(_id) for _id in self.table.ids('uniqueNumber', unique_number)]
+            if before is not None:
+                start_at, object_id = before
+                start_at = stored(start_at)
+                sessions = [
+                    session for session in sessions
+                    if self._older(session.get('expectedStartAt'), session['_id'], start_at, object_id)
+                ]
+            # Newest expected start first, sessions without one last (null sorts lowest)
+            sessions.sort(
+                key=lambda session: (
+                    session.get('expectedStartAt') is not None,
+                    session.get('expectedStartAt') or datetime.min,
+                    session['_id']
+                ),
+                reverse=True
+            )
+            return [copy_document(session) for session in sessions[:limit]]
+
+    @staticmethod
+    def _older(session_start, session_id, start_at, object_id):
+        """The listing cursor condition of SessionModel.userSessionsQuery"""
+        if start_at is None:
+            return session_start is None and session_id < object_id
+        if session_start is None:
+            return True
+        return session_start < start_at or (session_start == start_at and session_id < object_id)
+
+    def find_active(self):
+        with self.table.lock:
+            return [copy_document(self.table.get(_id)) for _id in self.table.ids('running', True)]
+
+    def find_pending_starts(self, earliest, latest):
+        with self.table.lock:
+            return [
+                copy_document(self.table.get(_id))
+                for _id in self.table.sorted('pendingStart', None).between(stored(earliest), stored(latest))
+            ]
+
+    def find_running_ends(self, latest):
+        with self.table.lock:
+            sessions = [self.table.get(_id) for _id in self.table.ids('running', True)]
+            latest = stored(latest)
+            return [
+                copy_document(session) for session in sessions
+                if isinstance(session.get('expectedEndAt'), datetime) and session['expectedEndAt'] <= latest
+            ]
+
+
+class MemoryLeaseRepository:
+    """Leader leases; a single process always gets a free lease"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases = {}
+
+    def acquire(self, name, owner, now, expires_at):
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease['owner'] != owner and lease['expiresAt'] >= now:
+                return False
+            self._leases[name] = {'owner': owner, 'expiresAt': expires_at}
+            return True
+
+    def release(self, name, owner):
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease['owner'] == owner:
+                del self._leases[name]
+
+
+class MemoryQuestionStore:
+    """
+    Student questions with the methods of DocumentQuestionStore.
+
+    Hash indexes by lecture (all, unanswered, delivered) and by cluster
+    (open duplicates); per-lecture sorted indexes on the delivery order
+    (priority, then createdAt) of pending questions and on createdAt,
+    updatedAt and deliveredAt. Claiming, counting and the newest or latest
+    question are index lookups rather than scans.
+    """
+
+    def __init__(self, log=None):
+        self.table = MemoryTable('student_questions', log)
+        self.table.hash_index('lectureKey', lambda question: [question.get('lectureKey')])
+        self.table.hash_index(
+            'unanswered', lambda question: [question.get('lectureKey')] if question.get('isAnswered') is False else []
+        )
+        self.table.hash_index(
+            'delivered', lambda question: [question.get('lectureKey')] if question.get('isDelivered') is True else []
+        )
+        self.table.hash_index('openDuplicates', self._open_duplicate_cluster)
+        self.table.sorted_index('pending', self._delivery_order)
+        self.table.sorted_index('createdAt', self._time_entry('createdAt'))
+        self.table.sorted_index('updatedAt', self._time_entry('updatedAt'))
+        self.table.sorted_index('deliveredAt', self._delivered_entry)
+
+    @staticmethod
+    def _is_pending(question):
+        """The DocumentQuestionStore.undelivered_filter condition"""
+        return question.get('isDelivered') is False and question.get('isDuplicate') is not True
+
+    @staticmethod
+    def _open_duplicate_cluster(question):
+        if question.get('isDuplicate') is True and question.get('isAnswered') is False \
+                and question.get('clusterId') is not None:
+            return [question['clusterId']]
+        return []
+
+    @classmethod
+    def _delivery_order(cls, question):
+        if not cls._is_pending(question):
+            return None
+        # Highest priority first, then oldest
+        return question.get('lectureKey'), (
+            -question.get('priority', float('-inf')),
+            question.get('createdAt') or datetime.min
+        )
+
+    @staticmethod
+    def _time_entry(field):
+        def entry(question):
+            value = question.get(field)
+            return (question.get('lectureKey'), value) if isinstance(value, datetime) else None
+        return entry
+
+    @staticmethod
+    def _delivered_entry(question):
+        delivered_at = question.get('deliveredAt')
+        if question.get('isDelivered') is True and isinstance(delivered_at, datetime):
+            return question.get('lectureKey'), delivered_at
+        return None
+
+    def ensure_indexes(self):
+        """Indexes are built in"""
+
+    def with_read_preference(self, read_preference):
+        return self
+
+    def _change(self, question, update):
+        changed = copy_document(question)
+        apply_update(changed, update)
+        self.table.put(changed)
+        return changed
+
+    # Writes
+
+    def insert(self, document):
+        with self.table.lock:
+            return self.table.insert(document)
+
+    def insert_many(self, documents, ordered=False):
+        """
+        Insert a batch of questions
+
+        Raises:
+            BulkWriteError: With the failed documents, like an unordered insert_many
+        """
+        inserted, errors = [], []
+        with self.table.lock:
+            for index, document in enumerate(documents):
+                try:
+                    inserted.append(self.table.insert(document))
+                except DuplicateKeyError as e:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e)})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(inserted)})
+        return inserted
+
+    def claim(self, lecture_key, now, question_id=None):
+        with self.table.lock:
+            if question_id is None:
+                question_id = self.table.sorted('pending', lecture_key).first()
+            question = self.table.get(question_id) if question_id is not None else None
+            if question is None or question.get('lectureKey') != lecture_key or not self._is_pending(question):
+                return None
+            return copy_document(self._change(question, {
+                '$set': {'isDelivered': True, 'deliveredAt': now, 'updatedAt': now}
+            }))
+
+    def mark_answered(self, question_id, now):
+        with self.table.lock:
+            question = self.table.get(question_id)
+            if question is None or question.get('isAnswered') is not False:
+                return None
+            before = project(question, ['lectureKey'])
+            self._change(question, {'$set': {'isAnswered': True, 'updatedAt': now}})
+            return before
+
+    def set_flag_many(self, question_ids, flag, now):
+        changes = {flag: True, 'updatedAt': now}
+        if flag == 'isDelivered':
+            changes['deliveredAt'] = now
+
+        changed = []
+        with self.table.lock:
+            for question_id in question_ids:
+                question = self.table.get(question_id)
+                if question is not None and question.get(flag) is False:
+                    self._change(question, {'$set': changes})
+                    changed.append(question_id)
+        return changed
+
+    def answer_duplicates(self, cluster_ids, now):
+        """Answer the duplicates clustered under the given representatives; returns how many"""
+        answered = 0
+        with self.table.lock:
+            for cluster_id in cluster_ids:
+                for question_id in self.table.ids('openDuplicates', cluster_id):
+                    self._change(self.table.get(question_id), {'$set': {'isAnswered': True, 'updatedAt': now}})
+                    answered += 1
+        return answered
+
+    def upvote(self, lecture_key, question_id, voter, now):
+        with self.table.lock:
+            question = self.table.get(question_id)
+            if question is None or question.get('lectureKey') != lecture_key \
+                    or question.get('isDelivered') is not False \
+                    or voter in (question.get('voters') or []):
+                return None
+            question = self._change(question, {
+                '$inc': {'upvotes': 1, 'priority': StudentQuestion.VOTE_WEIGHT_SECONDS},
+                '$set': {'updatedAt': now},
+                '$addToSet': {'voters': voter}
+            })
+            return project(question, ['upvotes', 'priority', 'clusterId', 'isDuplicate'])
+
+    def bump_priority(self, question_id, now, duplicate=False):
+        increments = {'priority': StudentQuestion.VOTE_WEIGHT_SECONDS}
+        if duplicate:
+            increments['duplicateCount'] = 1
+
+        with self.table.lock:
+            question = self.table.get(question_id)
+            if question is None:
+                return None
+            question = self._change(question, {'$inc': increments, '$set': {'updatedAt': now}})
+            return project(question, ['priority', 'isDelivered'])
+
+    def delete_by_lecture(self, lecture_key):
+        """Delete every question of a lecture; returns how many"""
+        with self.table.lock:
+            question_ids = self.table.ids('lectureKey', lecture_key)
+            for question_id in question_ids:
+                self.table.remove(question_id)
+            return len(question_ids)
+
+    # Reads
+
+    def _copies(self, question_ids):
+        return [copy_document(self.table.get(question_id)) for question_id in question_ids]
+
+    def find_by_lecture(self, lecture_key, session=None):
+        with self.table.lock:
+            return self._copies(self.table.ids('lectureKey', lecture_key))
+
+    def find_changed_since(self, lecture_key, since_at=None, session=None):
+        low = stored(since_at) if since_at is not None else None
+        with self.table.lock:
+            return self._copies(self.table.sorted('updatedAt', lecture_key).between(low, include_low=False))
+
+    def find_open_representatives(self, lecture_key, limit):
+        representatives = []
+        with self.table.lock:
+            for question_id in reversed(self.table.sorted('createdAt', lecture_key).ids):
+                question = self.table.get(question_id)
+                if question.get('isAnswered') is False and question.get('isDuplicate') is not True:
+                    representatives.append(project(question, ['question']))
+                    if len(representatives) == limit:
+                        break
+        representatives.reverse()
+        return representatives
+
+    def find_undelivered(self, lecture_key, limit):
+        with self.table.lock:
+            return [
+                project(self.table.get(question_id), ['priority', 'createdAt'])
+                for question_id in self.table.sorted('pending', lecture_key).ids[:limit]
+            ]
+
+    def find_by_ids(self, lecture_key, question_ids, fields):
+        found = {}
+        with self.table.lock:
+            for question_id in question_ids:
+                question = self.table.get(question_id)
+                if question is not None and question.get('lectureKey') == lecture_key:
+                    found[question_id] = project(question, fields)
+        return found
+
+    def find_ids(self, lecture_key, criteria, limit):
+        matching = []
+        with self.table.lock:
+            for question_id in self.table.ids('lectureKey', lecture_key):
+                question = self.table.get(question_id)
+                if all(question.get(field) == value for field, value in criteria.items()):
+                    matching.append(question_id)
+                    if len(matching) == limit:
+                        break
+        return matching
+
+    def count_undelivered(self, lecture_key):
+        with self.table.lock:
+            return len(self.table.sorted('pending', lecture_key))
+
+    def count_unanswered(self, lecture_keys, session=None):
+        with self.table.lock:
+            return sum(self.table.count('unanswered', lecture_key) for lecture_key in set(lecture_keys))
+
+    def last_delivered_at(self, lecture_key):
+        with self.table.lock:
+            return self.table.sorted('deliveredAt', lecture_key).last_key()
+
+    def lecture_stats(self, lecture_key):
+        """
+        Get the question statistics of a lecture (see lookup_stats_stage)
+
+        Returns:
+            Dictionary with total, unanswered, delivered and lastQuestionAt,
+            or None if the lecture has no questions
+        """
+        with self.table.lock:
+            total = self.table.count('lectureKey', lecture_key)
+            if total == 0:
+                return None
+            return {
+                '_id': None,
+                'total': total,
+                'unanswered': self.table.count('unanswered', lecture_key),
+                'delivered': self.table.count('delivered', lecture_key),
+                'lastQuestionAt': self.table.sorted('createdAt', lecture_key).last_key()
+            }
+
+
+class MemoryStorage:
+    """The in-memory repositories, optionally persisted to an append-only file"""
+
+    backend = 'memory'
+
+    def __init__(self, log_path=None, fsync=False):
+        """
+        Initialize memory storage
+
+        Args:
+            log_path: Append-only file to load from and write to, None to
+                      keep the data in memory only
+            fsync: Sync the file after every write
+        """
+        self.log = AppendOnlyLog(log_path, fsync) if log_path else None
+        self.questions = MemoryQuestionStore(self.log)
+        self.users = MemoryUserRepository(self.log)
+        self.verifications = MemoryVerificationRepository(self.log)
+        self.lectures = MemoryLectureRepository(self.questions, self.log)
+        self.sessions = MemorySessionRepository(self.log)
+        self.leases = MemoryLeaseRepository()
+        self.tables = {
+            repository.table.name: repository.table
+            for repository in (self.questions, self.users, self.verifications, self.lectures, self.sessions)
+        }
+        if self.log is not None:
+            self.log.load(self.tables)
+
+    def compact(self):
+        """Rewrite the append-only file with one record per document"""
+        if self.log is not None:
+            self.log.compact(self.tables)
+
+    def close(self):
+        """Close the append-only file"""
+        if self.log is not None:
+            self.log.close()
+
+    def stats(self):
+        """
+        Get storage counters
+
+        Returns:
+            Dictionary with the backend, documents per collection and the
+            append-only file (None without persistence)
+        """
+        documents = {}
+        for name, table in self.tables.items():
+            with table.lock:
+                documents[name] = len(table.documents)
+        return {
+            'backend': self.backend,
+            'documents': documents,
+            'log': self.log.stats() if self.log is not None else None
+        }
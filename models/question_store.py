@@ -0,0 +1,727 @@
+"""
+Question Store
+Data access for student questions, stored one document per question or
+grouped into per-lecture time buckets
+"""
+import copy
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.lecture import StudentQuestion
+
+
+class DocumentQuestionStore:
+    """Every question is its own document in student_questions"""
+
+    def __init__(self, db):
+        """
+        Initialize document store
+
+        Args:
+            db: MongoDB database instance
+        """
+        self.collection = db.student_questions
+
+    def ensure_indexes(self):
+        """Create the indexes backing the question queries"""
+        self.collection.create_index([
+            ('lectureKey', 1),
+            ('isDelivered', 1),
+            ('priority', -1)
+        ])
+        self.collection.create_index([('lectureKey', 1), ('updatedAt', 1)])
+
+    @staticmethod
+    def undelivered_filter(lecture_key):
+        """Filter matching the questions of a lecture that still await delivery"""
+        return {
+            'lectureKey': lecture_key,
+            'isDelivered': False,
+            # Clustered duplicates travel with their representative
+            'isDuplicate': {'$ne': True}
+        }
+
+    def with_read_preference(self, read_preference):
+        """Copy of this store whose queries use another read preference"""
+        store = copy.copy(self)
+        store.collection = self.collection.with_options(read_preference=read_preference)
+        return store
+
+    # Writes
+
+    def insert(self, document):
+        """Insert one question and return its ID"""
+        return self.collection.insert_one(document).inserted_id
+
+    def insert_many(self, documents, ordered=False):
+        """Insert a batch of questions (used by the ingest buffer)"""
+        return self.collection.insert_many(documents, ordered=ordered)
+
+    def claim(self, lecture_key, now, question_id=None):
+        """
+        Atomically mark a question delivered
+
+        Args:
+            lecture_key: Lecture Key (string)
+            now: Delivery time
+            question_id: Question to claim, or None for the highest priority one
+
+        Returns:
+            The delivered question document or None
+        """
+        question_filter = self.undelivered_filter(lecture_key)
+        sort = [('priority', -1), ('createdAt', 1)]
+        if question_id is not None:
+            question_filter['_id'] = question_id
+            sort = None
+
+        return self.collection.find_one_and_update(
+            question_filter,
+            {'$set': {'isDelivered': True, 'deliveredAt': now, 'updatedAt': now}},
+            sort=sort,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def mark_answered(self, question_id, now):
+        """
+        Mark one unanswered question as answered
+
+        Returns:
+            The question (with _id and lectureKey) or None if it was not found
+            or already answered
+        """
+        return self.collection.find_one_and_update(
+            {'_id': question_id, 'isAnswered': False},
+            {'$set': {'isAnswered': True, 'updatedAt': now}},
+            projection={'lectureKey': 1}
+        )
+
+    def set_flag_many(self, question_ids, flag, now):
+        """
+        Set isAnswered or isDelivered on many questions
+
+        Only questions without the flag are updated. If some were flagged
+        concurrently, the ones this call changed are read back by their
+        updatedAt, which is set to now.
+
+        Returns:
+            IDs of the questions this call flagged, in question_ids order
+        """
+        changes = {flag: True, 'updatedAt': now}
+        if flag == 'isDelivered':
+            changes['deliveredAt'] = now
+
+        result = self.collection.update_many(
+            {'_id': {'$in': question_ids}, flag: False},
+            {'$set': changes}
+        )
+        if result.modified_count == len(question_ids):
+            return list(question_ids)
+
+        changed = {
+            question['_id'] for question in self.collection.find(
+                {'_id': {'$in': question_ids}, flag: True, 'updatedAt': now},
+                {'_id': 1}
+            )
+        }
+        return [question_id for question_id in question_ids if question_id in changed]
+
+    def answer_duplicates(self, cluster_ids, now):
+        """Answer the duplicates clustered under the given representatives"""
+        return self.collection.update_many(
+            {'clusterId': {'$in': cluster_ids}, 'isDuplicate': True, 'isAnswered': False},
+            {'$set': {'isAnswered': True, 'updatedAt': now}}
+        )
+
+    def upvote(self, lecture_key, question_id, voter, now):
+        """
+        Add the upvote of a voter to an undelivered question
+
+        The voter is recorded in the question's voters in the same update,
+        which only matches if they have not voted yet.
+
+        Returns:
+            The question with upvotes, priority, clusterId and isDuplicate,
+            or None if it is not pending or the voter already voted
+        """
+        return self.collection.find_one_and_update(
+            {
+                '_id': question_id,
+                'lectureKey': lecture_key,
+                'isDelivered': False,
+                'voters': {'$ne': voter}
+            },
+            {
+                '$inc': {'upvotes': 1, 'priority': StudentQuestion.VOTE_WEIGHT_SECONDS},
+                '$set': {'updatedAt': now},
+                '$addToSet': {'voters': voter}
+            },
+            projection={'upvotes': 1, 'priority': 1, 'clusterId': 1, 'isDuplicate': 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def bump_priority(self, question_id, now, duplicate=False):
+        """
+        Raise the priority of a representative by one vote
+
+        Args:
+            question_id: Representative question ID
+            now: Time of the change
+            duplicate: Also count one more clustered duplicate
+
+        Returns:
+            The question with priority and isDelivered, or None
+        """
+        increments = {'priority': StudentQuestion.VOTE_WEIGHT_SECONDS}
+        if duplicate:
+            increments['duplicateCount'] = 1
+
+        return self.collection.find_one_and_update(
+            {'_id': question_id},
+            {'$inc': increments, '$set': {'updatedAt': now}},
+            projection={'priority': 1, 'isDelivered': 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def delete_by_lecture(self, lecture_key):
+        """Delete every question of a lecture"""
+        return self.collection.delete_many({'lectureKey': lecture_key})
+
+    # Reads
+
+    def find_by_lecture(self, lecture_key, session=None):
+        """Get every question of a lecture"""
+        return list(self.collection.find({'lectureKey': lecture_key}, session=session))
+
+    def find_changed_since(self, lecture_key, since_at=None, session=None):
+        """Get the questions of a lecture updated after since_at, oldest change first"""
+        query = {'lectureKey': lecture_key}
+        if since_at is not None:
+            query['updatedAt'] = {'$gt': since_at}
+        return list(self.collection.find(query, session=session).sort('updatedAt', 1))
+
+    def find_open_representatives(self, lecture_key, limit):
+        """Get the newest unanswered cluster representatives, oldest first"""
+        representatives = list(self.collection.find(
+            {
+                'lectureKey': lecture_key,
+                'isAnswered': False,
+                'isDuplicate': {'$ne': True}
+            },
+            {'question': 1}
+        ).sort('createdAt', -1).limit(limit))
+        representatives.reverse()
+        return representatives
+
+    def find_undelivered(self, lecture_key, limit):
+        """Get _id, priority and createdAt of pending questions, highest priority first"""
+        return list(self.collection.find(
+            self.undelivered_filter(lecture_key),
+            {'priority': 1, 'createdAt': 1}
+        ).sort('priority', -1).limit(limit))
+
+    def find_by_ids(self, lecture_key, question_ids, fields):
+        """Get the given questions of a lecture keyed by _id"""
+        projection = {field: 1 for field in fields}
+        return {
+            question['_id']: question for question in self.collection.find(
+                {'_id': {'$in': question_ids}, 'lectureKey': lecture_key},
+                projection
+            )
+        }
+
+    def find_ids(self, lecture_key, criteria, limit):
+        """Get the IDs of the questions of a lecture matching flag criteria"""
+        query = {'lectureKey': lecture_key, **criteria}
+        return [question['_id'] for question in self.collection.find(query, {'_id': 1}).limit(limit)]
+
+    def count_undelivered(self, lecture_key):
+        """Count the questions of a lecture awaiting delivery"""
+        return self.collection.count_documents(self.undelivered_filter(lecture_key))
+
+    def count_unanswered(self, lecture_keys, session=None):
+        """Count the unanswered questions of the given lectures"""
+        return self.collection.count_documents({
+            'lectureKey': {'$in': list(lecture_keys)},
+            'isAnswered': False
+        }, session=session)
+
+    def last_delivered_at(self, lecture_key):
+        """Get the time of the latest delivery in a lecture, or None"""
+        last_delivered = self.collection.find_one(
+            {
+                'lectureKey': lecture_key,
+                'isDelivered': True,
+                'deliveredAt': {'$ne': None}
+            },
+            {'deliveredAt': 1},
+            sort=[('deliveredAt', -1)]
+        )
+        return last_delivered.get('deliveredAt') if last_delivered else None
+
+    def lookup_stats_stage(self, as_field):
+        """
+        Aggregation stage joining per-lecture question statistics onto lectures
+
+        The joined array holds at most one document with total, unanswered,
+        delivered and lastQuestionAt.
+        """
+        return {'$lookup': {
+            'from': self.collection.name,
+            'localField': 'key',
+            'foreignField': 'lectureKey',
+            'pipeline': [
+                {'$group': {
+                    '_id': None,
+                    'total': {'$sum': 1},
+                    'unanswered': {'$sum': {'$cond': ['$isAnswered', 0, 1]}},
+                    'delivered': {'$sum': {'$cond': ['$isDelivered', 1, 0]}},
+                    'lastQuestionAt': {'$max': '$createdAt'}
+                }}
+            ],
+            'as': as_field
+        }}
+
+
+class BucketedQuestionStore:
+    """
+    Questions grouped per lecture and time window in student_question_buckets.
+
+    Bucket document:
+    {
+        lectureKey, bucketStart,
+        count, unansweredCount, deliveredCount, pendingCount,
+        lastQuestionAt, updatedAt,
+        questions: [ question fields without lectureKey ]
+    }
+
+    A bucket holds up to MAX_BUCKET_SIZE questions created within
+    BUCKET_MINUTES; a full bucket is followed by a new one for the same
+    window. Single questions are changed with positional updates that adjust
+    the bucket counters in the same write; multi-question updates are
+    aggregation-pipeline updates that recompute the counters from the array
+    (MongoDB 4.2+).
+    """
+    BUCKET_MINUTES = 60
+    MAX_BUCKET_SIZE = 200
+    # Attempts to claim the best pending question when racing other workers
+    CLAIM_ATTEMPTS = 3
+
+    def __init__(self, db, bucket_minutes=None, max_bucket_size=None):
+        """
+        Initialize bucketed store
+
+        Args:
+            db: MongoDB database instance
+            bucket_minutes: Width of a bucket time window
+            max_bucket_size: Maximum number of questions per bucket
+        """
+        self.collection = db.student_question_buckets
+        self.bucket_minutes = bucket_minutes or self.BUCKET_MINUTES
+        self.max_bucket_size = max_bucket_size or self.MAX_BUCKET_SIZE
+
+    def ensure_indexes(self):
+        """Create the indexes backing the bucket queries"""
+        self.collection.create_index([('lectureKey', 1), ('bucketStart', 1)])
+        self.collection.create_index([('lectureKey', 1), ('updatedAt', 1)])
+        self.collection.create_index('questions._id')
+
+    # Helpers
+
+    def bucket_start(self, created_at):
+        """Floor a creation time to the start of its bucket window"""
+        minutes = (created_at.hour * 60 + created_at.minute) // self.bucket_minutes * self.bucket_minutes
+        return datetime(created_at.year, created_at.month, created_at.day) + timedelta(minutes=minutes)
+
+    @staticmethod
+    def _is_pending(question):
+        return not question.get('isDelivered') and not question.get('isDuplicate')
+
+    @staticmethod
+    def _recount_stage(now):
+        """Pipeline stage recomputing the bucket counters from its questions"""
+        def size_where(condition):
+            return {'$size': {'$filter': {'input': '$questions', 'cond': condition}}}
+
+        return {'$set': {
+            'unansweredCount': size_where({'$not': ['$$this.isAnswered']}),
+            'deliveredCount': size_where('$$this.isDelivered'),
+            'pendingCount': size_where({'$and': [
+                {'$not': ['$$this.isDelivered']},
+                {'$ne': ['$$this.isDuplicate', True]}
+            ]}),
+            'updatedAt': now
+        }}
+
+    def _elements_update(self, condition, changes, now):
+        """Pipeline update merging changes into the questions matching condition"""
+        return [
+            {'$set': {'questions': {'$map': {
+                'input': '$questions',
+                'in': {'$cond': [condition, {'$mergeObjects': ['$$this', changes]}, '$$this']}
+            }}}},
+            self._recount_stage(now)
+        ]
+
+    @staticmethod
+    def _unpack(bucket):
+        """Get the single matched question of a bucket with its lectureKey"""
+        if not bucket or not bucket.get('questions'):
+            return None
+        question = dict(bucket['questions'][0])
+        question['lectureKey'] = bucket.get('lectureKey')
+        return question
+
+    def _unwound(self, match, question_match, sort=None, limit=None, project=None):
+        """Aggregate the questions of matching buckets as flat documents"""
+        pipeline = [
+            {'$match': match},
+            {'$unwind': '$questions'},
+            {'$match': {f"questions.{field}": value for field, value in question_match.items()}}
+        ]
+        if sort:
+            pipeline.append({'$sort': {f"questions.{field}": order for field, order in sort}})
+        if limit:
+            pipeline.append({'$limit': limit})
+        pipeline.append({'$set': {'questions.lectureKey': '$lectureKey'}})
+        pipeline.append({'$replaceRoot': {'newRoot': '$questions'}})
+        if project:
+            pipeline.append({'$project': {field: 1 for field in project}})
+        return list(self.collection.aggregate(pipeline))
+
+    def with_read_preference(self, read_preference):
+        """Copy of this store whose queries use another read preference"""
+        store = copy.copy(self)
+        store.collection = self.collection.with_options(read_preference=read_preference)
+        return store
+
+    # Writes
+
+    def insert(self, document):
+        """Insert one question and return its ID"""
+        self.insert_many([document])
+        return document['_id']
+
+    def insert_many(self, documents, ordered=False):
+        """
+        Append questions to the open bucket of their lecture and window
+
+        Questions are grouped so every bucket receives one $push; all
+        groups go out in a single bulk_write. Write errors refer to buckets,
+        not questions, so a failed bulk write fails the whole batch.
+        """
+        groups = {}
+        for document in documents:
+            document.setdefault('_id', ObjectId())
+            key = (document['lectureKey'], self.bucket_start(document['createdAt']))
+            groups.setdefault(key, []).append(document)
+
+        operations = []
+        for (lecture_key, bucket_start), group in groups.items():
+            for offset in range(0, len(group), self.max_bucket_size):
+                chunk = group[offset:offset + self.max_bucket_size]
+                elements = [{k: v for k, v in q.items() if k != 'lectureKey'} for q in chunk]
+                operations.append(UpdateOne(
+                    {
+                        'lectureKey': lecture_key,
+                        'bucketStart': bucket_start,
+                        'count': {'$lte': self.max_bucket_size - len(chunk)}
+                    },
+                    {
+                        '$push': {'questions': {'$each': elements}},
+                        '$inc': {
+                            'count': len(chunk),
+                            'unansweredCount': sum(1 for q in chunk if not q.get('isAnswered')),
+                            'deliveredCount': sum(1 for q in chunk if q.get('isDelivered')),
+                            'pendingCount': sum(1 for q in chunk if self._is_pending(q))
+                        },
+                        '$max': {
+                            'lastQuestionAt': max(q['createdAt'] for q in chunk),
+                            'updatedAt': max(q.get('updatedAt') or q['createdAt'] for q in chunk)
+                        }
+                    },
+                    upsert=True
+                ))
+
+        if operations:
+            try:
+                self.collection.bulk_write(operations, ordered=ordered)
+            except BulkWriteError as e:
+                raise Exception(f"Bucket write failed: {e.details.get('writeErrors')}")
+
+    def claim(self, lecture_key, now, question_id=None):
+        """Atomically mark a question delivered (see DocumentQuestionStore.claim)"""
+        if question_id is not None:
+            return self._claim_id(lecture_key, question_id, now)
+
+        for _ in range(self.CLAIM_ATTEMPTS):
+            best = self.find_undelivered(lecture_key, 1)
+            if not best:
+                return None
+            question = self._claim_id(lecture_key, best[0]['_id'], now)
+            if question is not None:
+                return question
+        return None
+
+    def _claim_id(self, lecture_key, question_id, now):
+        """Mark one pending question delivered, or return None if it is not pending"""
+        return self._update_element(
+            {
+                'lectureKey': lecture_key,
+                'questions': {'$elemMatch': {
+                    '_id': question_id,
+                    'isDelivered': False,
+                    'isDuplicate': {'$ne': True}
+                }}
+            },
+            question_id,
+            {
+                '$set': {
+                    'questions.$.isDelivered': True,
+                    'questions.$.deliveredAt': now,
+                    'questions.$.updatedAt': now,
+                    'updatedAt': now
+                },
+                '$inc': {'deliveredCount': 1, 'pendingCount': -1}
+            }
+        )
+
+    def _update_element(self, bucket_filter, question_id, update):
+        """
+        Apply a positional update to the question matched by bucket_filter
+
+        The filter pins the state of the question, so counter increments in
+        update are exact.
+
+        Returns:
+            The updated question with its lectureKey, or None if nothing matched
+        """
+        bucket = self.collection.find_one_and_update(
+            bucket_filter,
+            update,
+            projection={'lectureKey': 1, 'questions': {'$elemMatch': {'_id': question_id}}},
+            return_document=ReturnDocument.AFTER
+        )
+        return self._unpack(bucket)
+
+    def mark_answered(self, question_id, now):
+        """Mark one unanswered question as answered (see DocumentQuestionStore)"""
+        return self._update_element(
+            {'questions': {'$elemMatch': {'_id': question_id, 'isAnswered': False}}},
+            question_id,
+            {
+                '$set': {
+                    'questions.$.isAnswered': True,
+                    'questions.$.updatedAt': now,
+                    'updatedAt': now
+                },
+                '$inc': {'unansweredCount': -1}
+            }
+        )
+
+    def set_flag_many(self, question_ids, flag, now):
+        """
+        Set isAnswered or isDelivered on many questions
+
+        update_many only reports modified buckets, so the questions this call
+        changed are always read back by their updatedAt, which is set to now.
+
+        Returns:
+            IDs of the questions this call flagged, in question_ids order
+        """
+        changes = {flag: True, 'updatedAt': now}
+        if flag == 'isDelivered':
+            changes['deliveredAt'] = now
+        condition = {'$and': [
+            {'$in': ['$$this._id', question_ids]},
+            {'$not': [f"$$this.{flag}"]}
+        ]}
+        self.collection.update_many(
+            {'questions._id': {'$in': question_ids}},
+            self._elements_update(condition, changes, now)
+        )
+
+        changed = {
+            question['_id'] for question in self._unwound(
+                {'questions._id': {'$in': question_ids}},
+                {'_id': {'$in': question_ids}, flag: True, 'updatedAt': now},
+                project=['_id']
+            )
+        }
+        return [question_id for question_id in question_ids if question_id in changed]
+
+    def answer_duplicates(self, cluster_ids, now):
+        """Answer the duplicates clustered under the given representatives"""
+        condition = {'$and': [
+            {'$in': ['$$this.clusterId', cluster_ids]},
+            {'$eq': ['$$this.isDuplicate', True]},
+            {'$not': ['$$this.isAnswered']}
+        ]}
+        self.collection.update_many(
+            {'questions.clusterId': {'$in': cluster_ids}},
+            self._elements_update(condition, {'isAnswered': True, 'updatedAt': now}, now)
+        )
+
+    def upvote(self, lecture_key, question_id, voter, now):
+        """Add the upvote of a voter to an undelivered question (see DocumentQuestionStore)"""
+        return self._update_element(
+            {
+                'lectureKey': lecture_key,
+                'questions': {'$elemMatch': {
+                    '_id': question_id,
+                    'isDelivered': False,
+                    'voters': {'$ne': voter}
+                }}
+            },
+            question_id,
+            {
+                '$inc': {
+                    'questions.$.upvotes': 1,
+                    'questions.$.priority': StudentQuestion.VOTE_WEIGHT_SECONDS
+                },
+                '$set': {'questions.$.updatedAt': now, 'updatedAt': now},
+                '$addToSet': {'questions.$.voters': voter}
+            }
+        )
+
+    def bump_priority(self, question_id, now, duplicate=False):
+        """Raise the priority of a representative by one vote (see DocumentQuestionStore)"""
+        increments = {'questions.$.priority': StudentQuestion.VOTE_WEIGHT_SECONDS}
+        if duplicate:
+            increments['questions.$.duplicateCount'] = 1
+
+        return self._update_element(
+            {'questions._id': question_id},
+            question_id,
+            {'$inc': increments, '$set': {'questions.$.updatedAt': now, 'updatedAt': now}}
+        )
+
+    def delete_by_lecture(self, lecture_key):
+        """Delete every question of a lecture"""
+        self.collection.delete_many({'lectureKey': lecture_key})
+
+    # Reads
+
+    def find_by_lecture(self, lecture_key, session=None):
+        """Get every question of a lecture"""
+        questions = []
+        for bucket in self.collection.find({'lectureKey': lecture_key}, session=session).sort('bucketStart', 1):
+            for question in bucket['questions']:
+                questions.append(dict(question, lectureKey=lecture_key))
+        return questions
+
+    def find_changed_since(self, lecture_key, since_at=None, session=None):
+        """Get the questions of a lecture updated after since_at, oldest change first"""
+        query = {'lectureKey': lecture_key}
+        if since_at is not None:
+            query['updatedAt'] = {'$gt': since_at}
+
+        changed = []
+        for bucket in self.collection.find(query, session=session):
+            for question in bucket['questions']:
+                updated_at = question.get('updatedAt') or question['createdAt']
+                if since_at is None or updated_at > since_at:
+                    changed.append(dict(question, lectureKey=lecture_key))
+        changed.sort(key=lambda q: q.get('updatedAt') or q['createdAt'])
+        return changed
+
+    def find_open_representatives(self, lecture_key, limit):
+        """Get the newest unanswered cluster representatives, oldest first"""
+        representatives = self._unwound(
+            {'lectureKey': lecture_key, 'unansweredCount': {'$gt': 0}},
+            {'isAnswered': False, 'isDuplicate': {'$ne': True}},
+            sort=[('createdAt', -1)],
+            limit=limit,
+            project=['question']
+        )
+        representatives.reverse()
+        return representatives
+
+    def find_undelivered(self, lecture_key, limit):
+        """Get _id, priority and createdAt of pending questions, highest priority first"""
+        return self._unwound(
+            {'lectureKey': lecture_key, 'pendingCount': {'$gt': 0}},
+            {'isDelivered': False, 'isDuplicate': {'$ne': True}},
+            sort=[('priority', -1), ('createdAt', 1)],
+            limit=limit,
+            project=['priority', 'createdAt']
+        )
+
+    def find_by_ids(self, lecture_key, question_ids, fields):
+        """Get the given questions of a lecture keyed by _id"""
+        questions = self._unwound(
+            {'lectureKey': lecture_key, 'questions._id': {'$in': question_ids}},
+            {'_id': {'$in': question_ids}},
+            project=fields
+        )
+        return {question['_id']: question for question in questions}
+
+    def find_ids(self, lecture_key, criteria, limit):
+        """Get the IDs of the questions of a lecture matching flag criteria"""
+        questions = self._unwound({'lectureKey': lecture_key}, criteria, limit=limit, project=['_id'])
+        return [question['_id'] for question in questions]
+
+    def _sum_counter(self, match, counter, session=None):
+        result = next(iter(self.collection.aggregate([
+            {'$match': match},
+            {'$group': {'_id': None, 'total': {'$sum': f"${counter}"}}}
+        ], session=session)), None)
+        return result['total'] if result else 0
+
+    def count_undelivered(self, lecture_key):
+        """Count the questions of a lecture awaiting delivery"""
+        return self._sum_counter({'lectureKey': lecture_key}, 'pendingCount')
+
+    def count_unanswered(self, lecture_keys, session=None):
+        """Count the unanswered questions of the given lectures"""
+        return self._sum_counter({'lectureKey': {'$in': list(lecture_keys)}}, 'unansweredCount', session=session)
+
+    def last_delivered_at(self, lecture_key):
+        """Get the time of the latest delivery in a lecture, or None"""
+        latest = self._unwound(
+            {'lectureKey': lecture_key, 'deliveredCount': {'$gt': 0}},
+            {'isDelivered': True, 'deliveredAt': {'$ne': None}},
+            sort=[('deliveredAt', -1)],
+            limit=1,
+            project=['deliveredAt']
+        )
+        return latest[0]['deliveredAt'] if latest else None
+
+    def lookup_stats_stage(self, as_field):
+        """Aggregation stage summing the bucket counters of each lecture"""
+        return {'$lookup': {
+            'from': self.collection.name,
+            'localField': 'key',
+            'foreignField': 'lectureKey',
+            'pipeline': [
+                {'$group': {
+                    '_id': None,
+                    'total': {'$sum': '$count'},
+                    'unanswered': {'$sum': '$unansweredCount'},
+                    'delivered': {'$sum': '$deliveredCount'},
+                    'lastQuestionAt': {'$max': '$lastQuestionAt'}
+                }}
+            ],
+            'as': as_field
+        }}
+
+
+def get_question_store(db, mode='documents'):
+    """
+    Build the question store for a storage mode
+
+    Args:
+        db: MongoDB database instance
+        mode: 'documents' (one document per question) or 'buckets'
+
+    Returns:
+        DocumentQuestionStore or BucketedQuestionStore
+    """
+    if mode == 'buckets':
+        return BucketedQuestionStore(db)
+    if mode == 'documents':
+        return DocumentQuestionStore(db)
+    raise ValueError(f"Unknown question storage mode: {mode}")
+
@@ -0,0 +1,461 @@
+"""
+Repositories
+Data access for users, email verifications, lectures, sessions and
+scheduler leases, so the services do not depend on a particular store.
+The Mongo repositories below wrap the model helpers; models/memory_store.py
+has the in-memory engine with the same methods.
+"""
+import copy
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models.memory_store import MemoryStorage
+from models.question_store import get_question_store
+from models.sessions import SessionModel
+from models.user import User
+from models.verification import EmailVerification
+
+STORAGE_BACKENDS = ('mongo', 'memory')
+# Oldest server running the dashboard: its $lookup combines localField and
+# foreignField with a pipeline, which MongoDB accepts from 5.0 on
+MONGO_DASHBOARD_MIN_VERSION = (5, 0)
+
+
+class MongoUserRepository:
+    """Users in the users collection"""
+
+    def __init__(self, db):
+        """
+        Initialize user repository
+
+        Args:
+            db: MongoDB database instance
+        """
+        self.db = db
+
+    def insert(self, document):
+        """Insert a complete user document and return its ID"""
+        return self.db.users.insert_one(document).inserted_id
+
+    def create(self, email):
+        """Create a user with no sessions and return the document"""
+        return User.create(self.db, email)
+
+    def find_by_email(self, email):
+        return User.find_by_email(self.db, email)
+
+    def find_by_active_session(self, session_id, session=None):
+        return User.find_by_active_session(self.db, session_id, session=session)
+
+    def find_by_active_or_pending_session(self, session_id):
+        return User.find_by_active_or_pending_session(self.db, session_id)
+
+    def find_by_unique_number(self, unique_number):
+        return User.find_by_unique_number(self.db, unique_number)
+
+    def update(self, user):
+        """Write a modified user document back; True if the user exists"""
+        return User.update_user(self.db, user)
+
+    def activate_session(self, user_id, session_id):
+        """Move a pending session to the active ones (see User.activation_change)"""
+        return User.activate_session(self.db, user_id, session_id)
+
+    def inactivate_session(self, user_id, session_id):
+        """Move a session to the inactive ones (see User.inactivation_change)"""
+        return User.inactivate_session(self.db, user_id, session_id)
+
+    def delete_by_email(self, email):
+        return User.delete_by_email(self.db, email)
+
+
+class MongoVerificationRepository:
+    """Email verifications in the email_verifications collection"""
+
+    def __init__(self, db):
+        """
+        Initialize verification repository
+
+        Args:
+            db: MongoDB database instance
+        """
+        self.db = db
+
+    def create(self, email, verification_token, minutes=15):
+        return EmailVerification.create(self.db, email, verification_token, minutes)
+
+    def find_by_token(self, token):
+        """Find the unverified verification of a token"""
+        return EmailVerification.find_by_token(self.db, token)
+
+    def mark_as_verified(self, verification_id):
+        EmailVerification.mark_as_verified(self.db, verification_id)
+
+    def delete_by_email(self, email):
+        """Delete all verifications of an email and return how many there were"""
+        return EmailVerification.delete_by_email(self.db, email).deleted_count
+
+
+class MongoLectureRepository:
+    """Lectures in the lectures collection"""
+
+    def __init__(self, db, question_store):
+        """
+        Initialize lecture repository
+
+        Args:
+            db: MongoDB database instance
+            question_store: Question store whose statistics the dashboard joins
+        """
+        self.collection = db.lectures
+        self.question_store = question_store
+
+    def ensure_indexes(self):
+        """Create the indexes backing the lecture queries"""
+        self.collection.create_index('key')
+        self.collection.create_index('lecturerId')
+
+    def with_read_preference(self, read_preference):
+        """Copy of this repository whose queries use another read preference"""
+        repository = copy.copy(self)
+        repository.collection = self.collection.with_options(read_preference=read_preference)
+        return repository
+
+    # Writes
+
+    def insert(self, document):
+        """Insert one lecture and return its ID"""
+        return self.collection.insert_one(document).inserted_id
+
+    def update(self, lecture_key, changes):
+        """
+        Set fields of a lecture
+
+        Returns:
+            The updated lecture or None if there is no such lecture
+        """
+        return self.collection.find_one_and_update(
+            {'key': lecture_key},
+            {'$set': changes},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def delete(self, lecture_key, lecturer_id):
+        """Delete a lecture of a lecturer; True if it existed"""
+        return self.collection.delete_one({'key': lecture_key, 'lecturerId': lecturer_id}).deleted_count > 0
+
+    def claim_delivery_slot(self, lecture_key, now, free_before):
+        """
+        Take the per-lecture question cooldown slot (compare-and-set)
+
+        Args:
+            lecture_key: Lecture Key (string)
+            now: Delivery time stored in lastQuestionDeliveredAt
+            free_before: The slot is free when the last delivery is no later
+
+        Returns:
+            The lecture with the previous lastQuestionDeliveredAt, or None
+            if the slot is taken or the lecture does not exist
+        """
+        return self.collection.find_one_and_update(
+            {
+                'key': lecture_key,
+                '$or': [
+                    {'lastQuestionDeliveredAt': None},
+                    {'lastQuestionDeliveredAt': {'$lte': free_before}}
+                ]
+            },
+            {'$set': {'lastQuestionDeliveredAt': now}},
+            projection={'lastQuestionDeliveredAt': 1}
+        )
+
+    def release_delivery_slot(self, lecture_key, claimed_at, previous):
+        """Undo claim_delivery_slot unless another delivery claimed the slot since"""
+        self.collection.update_one(
+            {'key': lecture_key, 'lastQuestionDeliveredAt': claimed_at},
+            {'$set': {'lastQuestionDeliveredAt': previous}}
+        )
+
+    # Reads
+
+    def find_by_key(self, lecture_key):
+        return self.collection.find_one({'key': lecture_key})
+
+    def find_delivery_state(self, lecture_key):
+        """Get _id and lastQuestionDeliveredAt (absent on old lectures) of a lecture"""
+        return self.collection.find_one({'key': lecture_key}, {'lastQuestionDeliveredAt': 1})
+
+    def owns(self, lecture_key, lecturer_id):
+        """Check that a lecture belongs to a lecturer"""
+        return self.collection.find_one({'key': lecture_key, 'lecturerId': lecturer_id}, {'_id': 1}) is not None
+
+    def find_by_lecturer(self, lecturer_id, session=None):
+        return list(self.collection.find({'lecturerId': lecturer_id}, session=session))
+
+    def find_keys_by_lecturer(self, lecturer_id, session=None):
+        return [
+            lecture['key']
+            for lecture in self.collection.find({'lecturerId': lecturer_id}, {'key': 1}, session=session)
+        ]
+
+    def dashboard(self, lecturer_id, session=None):
+        """
+        Get the lectures of a lecturer with their question statistics
+
+        Runs as one aggregation joining grouped counts from the question
+        store, instead of one request per lecture. Needs MongoDB 5.0 or
+        newer (MONGO_DASHBOARD_MIN_VERSION); older servers reject the
+        $lookup stage.
+
+        Returns:
+            Lectures (_id, key, courseName, semester dates) newest semester
+            first, each with questionStats (total, unanswered, delivered,
+            lastQuestionAt) unless it has no questions
+        """
+        pipeline = [
+            {'$match': {'lecturerId': lecturer_id}},
+            self.question_store.lookup_stats_stage('questionStats'),
+            {'$project': {
+                'key': 1,
+                'courseName': 1,
+                'semesterStartDate': 1,
+                'semesterEndDate': 1,
+                'questionStats': {'$arrayElemAt': ['$questionStats', 0]}
+            }},
+            {'$sort': {'semesterStartDate': -1}}
+        ]
+        return list(self.collection.aggregate(pipeline, session=session))
+
+
+class MongoSessionRepository:
+    """Sessions in the sessions collection"""
+
+    def __init__(self, db):
+        """
+        Initialize session repository
+
+        Args:
+            db: MongoDB database instance
+        """
+        self.db = db
+        self.collection = db.sessions
+
+    def ensure_indexes(self):
+        """
+        Create the unique sessionId index and the listing indexes, and store
+        the parsed schedule times on sessions created before they existed
+        """
+        SessionModel.ensureIndexes(self.db)
+        SessionModel.backfillScheduleTimes(self.db)
+
+    def ensure_schedule_indexes(self):
+        """
+        Create the index backing the scheduler's start range query (the end
+        query uses the session_is_active index)
+        """
+        self.collection.create_index('expectedStartAt')
+
+    # Writes
+
+    def create(self, session_data):
+        """
+        Insert a session
+
+        Returns:
+            The stored session including _id
+
+        Raises:
+            DuplicateKeyError: If the sessionId is taken
+        """
+        return SessionModel.createSession(self.db, session_data)
+
+    def update(self, session_id, changes):
+        """Set fields of a session and return the number of sessions modified"""
+        return SessionModel.updateSession(self.db, session_id, changes).modified_count
+
+    def delete(self, session_id):
+        """Delete a session and return the number of sessions deleted"""
+        return SessionModel.deleteSession(self.db, session_id).deleted_count
+
+    def start_many(self, session_ids, now):
+        """
+        Start the given sessions that have neither started nor ended
+
+        Returns:
+            Number of sessions started
+        """
+        return self.collection.update_many(
+            {
+                'sessionId': {'$in': session_ids},
+                'session_is_active': False,
+                'session_actual_start_time': None,
+                # Sessions ended by hand before their start stay ended
+                'session_actual_end_time': None
+            },
+            {'$set': {
+                'session_is_active': True,
+                'session_actual_start_time': now,
+                'updatedAt': now
+            }}
+        ).modified_count
+
+    def end_many(self, session_ids, now):
+        """
+        End the given sessions that are running
+
+        Returns:
+            Number of sessions ended
+        """
+        return self.collection.update_many(
+            {'sessionId': {'$in': session_ids}, 'session_is_active': True},
+            {'$set': {
+                'session_is_active': False,
+                'session_actual_end_time': now,
+                'updatedAt': now
+            }}
+        ).modified_count
+
+    # Reads
+
+    def find_by_session_id(self, session_id):
+        return SessionModel.findSessionBySessionId(self.db, session_id)
+
+    def find_by_user(self, unique_number, limit=50, before=None):
+        """Newest sessions first; before is the (start time, _id) of the last session already seen"""
+        return SessionModel.findSessionsByUserUniqueId(self.db, unique_number, limit, before)
+
+    def find_active(self):
+        """Get the summary fields of the running sessions"""
+        return list(SessionModel.findActiveSessions(self.db))
+
+    def find_duplicate_session_ids(self, limit=10):
+        """Get sessionIds stored more than once (they block the unique index)"""
+        return [
+            group['_id'] for group in self.collection.aggregate([
+                {'$group': {'_id': '$sessionId', 'count': {'$sum': 1}}},
+                {'$match': {'count': {'$gt': 1}}},
+                {'$limit': limit}
+            ])
+        ]
+
+    def find_pending_starts(self, earliest, latest):
+        """
+        Get sessions that have not started and are expected to start between
+        earliest and latest (naive UTC datetimes)
+
+        Returns:
+            Sessions with sessionId, expectedStartAt and expectedEndAt
+        """
+        return list(self.collection.find(
+            {
+                'expectedStartAt': {'$gte': earliest, '$lte': latest},
+                'session_is_active': False,
+                'session_actual_start_time': None,
+                'session_actual_end_time': None
+            },
+            {'sessionId': 1, 'expectedStartAt': 1, 'expectedEndAt': 1}
+        ))
+
+    def find_running_ends(self, latest):
+        """Get sessionId and expectedEndAt of running sessions expected to end by latest"""
+        return list(self.collection.find(
+            {'session_is_active': True, 'expectedEndAt': {'$lte': latest}},
+            {'sessionId': 1, 'expectedEndAt': 1}
+        ))
+
+
+class MongoLeaseRepository:
+    """Leader leases in the scheduler_leases collection"""
+
+    def __init__(self, db):
+        """
+        Initialize lease repository
+
+        Args:
+            db: MongoDB database instance
+        """
+        self.collection = db.scheduler_leases
+
+    def acquire(self, name, owner, now, expires_at):
+        """
+        Take or renew a lease that is free, expired or already held by owner
+
+        Returns:
+            True if owner holds the lease until expires_at
+        """
+        try:
+            lease = self.collection.find_one_and_update(
+                {
+                    '_id': name,
+                    '$or': [{'owner': owner}, {'expiresAt': {'$lt': now}}]
+                },
+                {'$set': {'owner': owner, 'expiresAt': expires_at}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another owner holds a live lease (the upsert collided with it)
+            return False
+        return lease is not None and lease.get('owner') == owner
+
+    def release(self, name, owner):
+        """Give up a lease held by owner"""
+        self.collection.delete_one({'_id': name, 'owner': owner})
+
+
+class MongoStorage:
+    """The Mongo repositories of one database"""
+
+    backend = 'mongo'
+
+    def __init__(self, db, question_mode='documents'):
+        """
+        Initialize Mongo storage
+
+        Args:
+            db: MongoDB database instance
+            question_mode: Question storage mode (see get_question_store)
+        """
+        self.db = db
+        self.question_mode = question_mode
+        self.questions = get_question_store(db, question_mode)
+        self.users = MongoUserRepository(db)
+        self.verifications = MongoVerificationRepository(db)
+        self.lectures = MongoLectureRepository(db, self.questions)
+        self.sessions = MongoSessionRepository(db)
+        self.leases = MongoLeaseRepository(db)
+
+    def close(self):
+        """Nothing to release; the client belongs to the application"""
+
+    def stats(self):
+        """
+        Get storage settings
+
+        Returns:
+            Dictionary with the backend and question storage mode
+        """
+        return {'backend': self.backend, 'questionStorage': self.question_mode}
+
+
+def get_storage(backend, db=None, question_mode='documents', log_path=None, fsync=False):
+    """
+    Build the storage for a backend
+
+    Args:
+        backend: 'mongo' or 'memory'
+        db: MongoDB database instance (mongo)
+        question_mode: Question storage mode (mongo)
+        log_path: Append-only file the memory engine persists to, None to
+                  keep the data in memory only (memory)
+        fsync: Sync the append-only file after every write (memory)
+
+    Returns:
+        MongoStorage or MemoryStorage
+    """
+    if backend == 'mongo':
+        return MongoStorage(db, question_mode)
+    if backend == 'memory':
+        return MemoryStorage(log_path=log_path, fsync=fsync)
+    raise ValueError(f"Unknown storage backend: {backend}")
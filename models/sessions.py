@@ -1,12 +1,121 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+
+def parse_session_time(value):
+    """
+    Parse a session time given by a client
+
+    Args:
+        value: ISO 8601 string (e.g. "2025-01-16T10:00:00Z") or datetime
+
+    Returns:
+        Naive UTC datetime, or None if the value is missing or malformed
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    else:
+        return None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 
 class SessionModel:
+    # Client time fields and the parsed UTC datetimes stored next to them,
+    # which the scheduler queries (the strings may use any ISO 8601 form)
+    SCHEDULE_FIELDS = {
+        "session_expected_start_time": "expectedStartAt",
+        "session_expected_end_time": "expectedEndAt"
+    }
+
+    # Listing index of earlier versions, ordered by the raw start time string
+    RAW_LISTING_INDEX = "uniqueNumber_1_session_expected_start_time_-1__id_-1"
 
     @staticmethod
-    def createSession(db, sessionData):
+    def ensureIndexes(db):
+        db.sessions.create_index("sessionId", unique=True)
+        # Time-ordered listing per user; _id breaks ties between equal start times
+        db.sessions.create_index([
+            ("uniqueNumber", 1),
+            ("expectedStartAt", -1),
+            ("_id", -1)
+        ])
+        if SessionModel.RAW_LISTING_INDEX in db.sessions.index_information():
+            db.sessions.drop_index(SessionModel.RAW_LISTING_INDEX)
+        # Live sessions (active session registry, scheduled ends)
+        db.sessions.create_index([("session_is_active", 1), ("expectedEndAt", 1)])
+
+    @staticmethod
+    def scheduleTimes(sessionData):
+        """Parsed expectedStartAt/expectedEndAt for the time fields present in sessionData"""
+        return {
+            parsed: parse_session_time(sessionData[field])
+            for field, parsed in SessionModel.SCHEDULE_FIELDS.items()
+            if field in sessionData
+        }
+
+    @staticmethod
+    def validateTimes(sessionData):
+        """Error message for a session time that is set but not ISO 8601, None if all are valid"""
+        for field in SessionModel.SCHEDULE_FIELDS:
+            value = sessionData.get(field)
+            if value not in (None, "") and parse_session_time(value) is None:
+                return f"{field} must be an ISO 8601 time such as 2025-01-16T10:00:00Z"
+        return None
+
+    @staticmethod
+    def backfillScheduleTimes(db):
+        """
+        Store expectedStartAt/expectedEndAt on sessions created before they existed
+
+        Returns:
+            Number of sessions updated
+        """
+        operations = [
+            UpdateOne({"_id": session["_id"]}, {"$set": SessionModel.scheduleTimes(
+                {field: session.get(field) for field in SessionModel.SCHEDULE_FIELDS}
+            )})
+            for session in db.sessions.find(
+                {"expectedStartAt": {"$exists": False}},
+                {field: 1 for field in SessionModel.SCHEDULE_FIELDS}
+            )
+        ]
+        if not operations:
+            return 0
+        return db.sessions.bulk_write(operations, ordered=False).modified_count
+
+    @staticmethod
+    def validatePayload(payload):
+        """Error message for an unusable create payload, None if it is valid"""
+        # Ensure payload is dict
+        if payload is None:
+            return "No JSON body received"
+
+        uniqueNumber = payload.get("uniqueNumber")
+        if not uniqueNumber or str(uniqueNumber).strip() == "":
+            return "userUniqueId is required"
+        return SessionModel.validateTimes(payload)
+
+    @staticmethod
+    def newSession(sessionData):
         sessionData["createdAt"] = datetime.utcnow()
         sessionData["updatedAt"] = datetime.utcnow()
+        sessionData.update(SessionModel.scheduleTimes({
+            field: sessionData.get(field) for field in SessionModel.SCHEDULE_FIELDS
+        }))
+        return sessionData
+
+    @staticmethod
+    def createSession(db, sessionData):
+        SessionModel.newSession(sessionData)
 
         result = db.sessions.insert_one(sessionData)
         return {**sessionData, "_id": result.inserted_id}
@@ -16,13 +125,47 @@ class SessionModel:
         session = db.sessions.find_one({"_id": ObjectId(sessionId)})
         return session
     
-    def findSessionsByUserUniqueId(db, userUniqueId):
-        sessions = list(db.sessions.find({"uniqueNumber": userUniqueId}))
+    # Parsed start time, so "13:00+01:00" and "12:30Z" order by the instant;
+    # sessions without a start time (null) come last
+    USER_SESSIONS_SORT = [("expectedStartAt", -1), ("_id", -1)]
+
+    @staticmethod
+    def userSessionsQuery(userUniqueId, before=None):
+        """Filter for a user's sessions after before, the (expectedStartAt, _id) of the last session already seen"""
+        query = {"uniqueNumber": userUniqueId}
+        if before is not None:
+            start_at, object_id = before
+            if start_at is None:
+                query["expectedStartAt"] = None
+                query["_id"] = {"$lt": object_id}
+            else:
+                query["$or"] = [
+                    {"expectedStartAt": {"$lt": start_at}},
+                    {"expectedStartAt": start_at, "_id": {"$lt": object_id}},
+                    {"expectedStartAt": None}
+                ]
+        return query
+
+    def findSessionsByUserUniqueId(db, userUniqueId, limit=50, before=None):
+        """Newest sessions first; before is the (expectedStartAt, _id) of the last session already seen"""
+        sessions = list(
+            db.sessions.find(SessionModel.userSessionsQuery(userUniqueId, before))
+            .sort(SessionModel.USER_SESSIONS_SORT)
+            .limit(limit)
+        )
         # print("===================")
         # print("all sessions",sessions)
         # print("===================")
         return sessions
     
+    @staticmethod
+    def findActiveSessions(db):
+        return db.sessions.find(
+            {"session_is_active": True},
+            {"sessionId": 1, "name": 1, "uniqueNumber": 1,
+             "session_actual_start_time": 1, "session_expected_end_time": 1}
+        )
+
     def findSessionBySessionId(db, sessionId):
         session = db.sessions.find_one({"sessionId": sessionId})
         return session
@@ -31,6 +174,7 @@ class SessionModel:
     def updateSession(db, sessionId, updateData):
         updateData["updatedAt"] = datetime.utcnow()
         updateData.pop('_id', None)  # Prevent updating the _id field if present
+        updateData.update(SessionModel.scheduleTimes(updateData))
         result = db.sessions.update_one(
             {"sessionId": sessionId},
             {"$set": updateData}
@@ -10,19 +10,17 @@ class User:
     """
 
     @staticmethod
-    def create(db, email):
+    def new_document(email):
         """
-        Create a new user with isActive set to False by default
+        Build a new user document with no sessions and default options
 
         Args:
-            db: Database connection
             email: User's email address
-            unique_number: Generated unique 10-digit number
 
         Returns:
-            dict: Created user document
+            dict: User document (without _id)
         """
-        user_document = {
+        return {
             'email': email,
             'createdAt': datetime.utcnow(),
             'activeSessionIds': [],
@@ -37,6 +35,21 @@ class User:
             }
         }
 
+    @staticmethod
+    def create(db, email):
+        """
+        Create a new user with isActive set to False by default
+
+        Args:
+            db: Database connection
+            email: User's email address
+            unique_number: Generated unique 10-digit number
+
+        Returns:
+            dict: Created user document
+        """
+        user_document = User.new_document(email)
+
         result = db.users.insert_one(user_document)
         user_document['_id'] = result.inserted_id
 
@@ -71,18 +84,19 @@ class User:
         return db.users.find_one({'email': email})
 
     @staticmethod
-    def find_by_active_session(db, session_id):
+    def find_by_active_session(db, session_id, session=None):
         """
         Find user by active session ID
 
         Args:
             db: Database connection
             session_id: Session ID to search for
+            session: Optional ClientSession the lookup belongs to
 
         Returns:
             dict: User document or None if not found
         """
-        return db.users.find_one({'activeSessionIds': session_id})
+        return db.users.find_one({'activeSessionIds': session_id}, session=session)
 
     @staticmethod
     def find_by_active_or_pending_session(db, session_id):
@@ -118,7 +132,16 @@ class User:
         return db.users.find_one({'uniqueNumber': unique_number})
 
     @staticmethod
-    def update_user(db, user):
+    def update_query(user):
+        """
+        Build the update writing a modified user document back
+
+        Args:
+            user: User document including _id
+
+        Returns:
+            tuple: (filter, update) for update_one
+        """
         if '_id' not in user:
             raise ValueError("User object must contain '_id'")
 
@@ -129,19 +152,28 @@ class User:
         # Always update lastLogin as well
         update_data['lastLogin'] = datetime.utcnow()
 
-        result = db.users.update_one(
-            {'_id': user_id},
-            {'$set': update_data}
-        )
+        return {'_id': user_id}, {'$set': update_data}
 
-        return result.modified_count > 0 or result.matched_count > 0
+    @staticmethod
+    def update_user(db, user):
+        result = db.users.update_one(*User.update_query(user))
 
+        return result.modified_count > 0 or result.matched_count > 0
 
     @staticmethod
-    def activate_session(db, _id, session_id):
-        user = db.users.find_one({'_id': _id})
+    def activation_change(user, session_id):
+        """
+        Decide whether a pending session can become active
+
+        Args:
+            user: User document or None
+            session_id: Session ID to activate
+
+        Returns:
+            tuple: (result dict, update to apply or None when refused)
+        """
         if not user:
-            return {"success": False, "message": "User not found"}
+            return {"success": False, "message": "User not found"}, None
 
         active = user.get('activeSessionIds', [])
         pending = user.get('pendingSessionIds', [])
@@ -149,32 +181,37 @@ class User:
 
         # Already active
         if session_id in active:
-            return {"success": False, "message": "Session is already active"}
+            return {"success": False, "message": "Session is already active"}, None
 
         # Was active before but now inactive → outdated
         if session_id in inactive:
-            return {"success": False, "message": "Session is outdated"}
+            return {"success": False, "message": "Session is outdated"}, None
 
         # Must be in pending to activate
         if session_id not in pending:
-            return {"success": False, "message": "Session not found"}
+            return {"success": False, "message": "Session not found"}, None
 
         # Move from pending → active
-        db.users.update_one(
-            {'_id': _id},
-            {
-                '$pull': {'pendingSessionIds': session_id},
-                '$addToSet': {'activeSessionIds': session_id}
-            }
-        )
-
-        return {"success": True, "message": "Session activated"}
+        update = {
+            '$pull': {'pendingSessionIds': session_id},
+            '$addToSet': {'activeSessionIds': session_id}
+        }
+        return {"success": True, "message": "Session activated"}, update
 
     @staticmethod
-    def inactivate_session(db, _id, session_id):
-        user = db.users.find_one({'_id': _id})
+    def inactivation_change(user, session_id):
+        """
+        Decide whether a session can become inactive
+
+        Args:
+            user: User document or None
+            session_id: Session ID to inactivate
+
+        Returns:
+            tuple: (result dict, update to apply or None when refused)
+        """
         if not user:
-            return {"success": False, "message": "User not found"}
+            return {"success": False, "message": "User not found"}, None
 
         active = user.get('activeSessionIds', [])
         pending = user.get('pendingSessionIds', [])
@@ -182,25 +219,35 @@ class User:
 
         # Already inactive
         if session_id in inactive:
-            return {"success": False, "message": "Session already inactive"}
+            return {"success": False, "message": "Session already inactive"}, None
 
         # Not found anywhere
         if session_id not in active and session_id not in pending:
-            return {"success": False, "message": "Session not found"}
+            return {"success": False, "message": "Session not found"}, None
 
         # Move active → inactive, pending → inactive
-        db.users.update_one(
-            {'_id': _id},
-            {
-                '$pull': {
-                    'activeSessionIds': session_id,
-                    'pendingSessionIds': session_id
-                },
-                '$addToSet': {'inactiveSessionIds': session_id}
-            }
-        )
+        update = {
+            '$pull': {
+                'activeSessionIds': session_id,
+                'pendingSessionIds': session_id
+            },
+            '$addToSet': {'inactiveSessionIds': session_id}
+        }
+        return {"success": True, "message": "Session inactivated"}, update
+
+    @staticmethod
+    def activate_session(db, _id, session_id):
+        result, update = User.activation_change(db.users.find_one({'_id': _id}), session_id)
+        if update is not None:
+            db.users.update_one({'_id': _id}, update)
+        return result
 
-        return {"success": True, "message": "Session inactivated"}
+    @staticmethod
+    def inactivate_session(db, _id, session_id):
+        result, update = User.inactivation_change(db.users.find_one({'_id': _id}), session_id)
+        if update is not None:
+            db.users.update_one({'_id': _id}, update)
+        return result
 
     @staticmethod
     def delete_by_email(db, email):
@@ -8,15 +8,20 @@ class EmailVerification:
     """Email verification model"""
     
     @staticmethod
-    def create(db, email, verification_token, minutes=15):
-        """Create a new email verification"""
-        verification = {
+    def new_document(email, verification_token, minutes=15):
+        """Build a new email verification document"""
+        return {
             'email': email,
             'verificationToken': verification_token,
             'createdAt': datetime.utcnow(),
             'expiresAt': datetime.utcnow() + timedelta(minutes=minutes),
             'isVerified': False
         }
+
+    @staticmethod
+    def create(db, email, verification_token, minutes=15):
+        """Create a new email verification"""
+        verification = EmailVerification.new_document(email, verification_token, minutes)
         result = db.email_verifications.insert_one(verification)
         verification['_id'] = result.inserted_id
         return verification
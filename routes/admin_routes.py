@@ -0,0 +1,64 @@
+"""
+Admin Routes
+API endpoints for the stored request profiles
+"""
+from flask import Blueprint, jsonify, request, send_file
+import logging
+
+from services.request_profiler import ADMIN_HEADER
+
+logger = logging.getLogger(__name__)
+
+
+def init_admin_routes(request_profiler):
+    """
+    Initialize admin routes blueprint
+
+    Args:
+        request_profiler: RequestProfiler whose profiles are served
+
+    Returns:
+        Flask blueprint
+    """
+    blueprint = Blueprint('admin', __name__, url_prefix='/admin')
+
+    @blueprint.before_request
+    def require_admin_token():
+        if not request_profiler.is_admin(request.headers.get(ADMIN_HEADER)):
+            return jsonify({
+                'success': False,
+                'message': 'Valid admin token required'
+            }), 403
+
+    @blueprint.route('/profiles', methods=['GET'])
+    def list_profiles():
+        """
+        List the stored request profiles, newest first
+        """
+        return jsonify({
+            'success': True,
+            'profiler': request_profiler.stats(),
+            'profiles': request_profiler.profiles()
+        }), 200
+
+    @blueprint.route('/profiles/<name>', methods=['GET'])
+    def get_profile(name):
+        """
+        Download a stored profile (pstats or speedscope JSON)
+        """
+        path = request_profiler.profile_path(name)
+        if path is None:
+            return jsonify({
+                'success': False,
+                'message': 'Profile not found'
+            }), 404
+        try:
+            return send_file(path, as_attachment=True, download_name=name)
+        except FileNotFoundError:
+            # Rotated out meanwhile
+            return jsonify({
+                'success': False,
+                'message': 'Profile not found'
+            }), 404
+
+    return blueprint
@@ -0,0 +1,135 @@
+"""
+Lecture Routes for the ASGI server
+The idle-heavy endpoints of routes/lecture_routes.py, served on the event loop
+"""
+from quart import Blueprint, Response, request, jsonify
+import asyncio
+import logging
+import math
+
+from routes.lecture_routes import format_sse
+
+logger = logging.getLogger(__name__)
+
+
+def init_async_lecture_routes(lecture_service, stream_limiter=None, heartbeat_seconds=15):
+    """
+    Initialize the long-poll and event stream routes
+
+    Same paths, parameters and responses as in init_lecture_routes. The
+    LectureService is the one the WSGI app uses: its wait plans run on
+    executor threads step by step and wait on the event loop in between, so
+    an idle lecturer holds no thread. Every other endpoint is served by the
+    WSGI app (see asgi.py).
+
+    Args:
+        lecture_service: LectureService built with an AsyncQuestionNotifier
+        stream_limiter: StreamLimiter bounding concurrent event streams
+        heartbeat_seconds: Idle interval between event stream heartbeats
+
+    Returns:
+        Quart blueprint
+    """
+    blueprint = Blueprint('lectures', __name__, url_prefix='/api/lectures')
+    notifier = lecture_service.notifier
+
+    @blueprint.route('/<session_id>/<lecture_key>/questions/next', methods=['GET'])
+    async def get_next_lecture_question(session_id, lecture_key):
+        """Get the next deliverable question, long-polling up to ?wait= seconds"""
+        try:
+            wait = request.args.get('wait', type=float)
+            if wait is not None and not math.isfinite(wait):
+                return jsonify({
+                    'success': False,
+                    'message': 'wait must be a finite number of seconds'
+                }), 400
+
+            steps = await asyncio.to_thread(
+                lecture_service.next_question_steps, session_id, lecture_key, wait or 0
+            )
+            items = notifier.follow_async(steps)
+            try:
+                question = await anext(items, None)
+            finally:
+                await items.aclose()
+
+            return jsonify({
+                'success': True,
+                'question': question  # will be null/None if no question available
+            }), 200
+
+        except Exception as e:
+            logger.error("Error fetching next question: %s", e)
+            return jsonify({
+                'success': False,
+                'message': 'Failed to fetch next question'
+            }), 500
+
+    @blueprint.route('/<session_id>/<lecture_key>/questions/stream', methods=['GET'])
+    async def stream_lecture_questions(session_id, lecture_key):
+        """Server-Sent Events feed of a lecture"""
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+
+        if stream_limiter is not None and not stream_limiter.acquire():
+            return jsonify({
+                'success': False,
+                'message': 'Too many open streams, please retry later'
+            }), 503
+
+        try:
+            steps = await asyncio.to_thread(
+                lecture_service.lecture_event_steps,
+                session_id,
+                lecture_key,
+                last_event_id,
+                heartbeat_seconds
+            )
+        except ValueError as e:
+            if stream_limiter is not None:
+                stream_limiter.release()
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        except Exception as e:
+            if stream_limiter is not None:
+                stream_limiter.release()
+            logger.error("Error opening question stream: %s", e)
+            return jsonify({
+                'success': False,
+                'message': 'Failed to open question stream'
+            }), 500
+
+        events = notifier.follow_async(steps)
+
+        async def generate():
+            try:
+                yield f"retry: {heartbeat_seconds * 1000}\n\n"
+                async for item in events:
+                    if item is None:
+                        yield ': heartbeat\n\n'
+                    else:
+                        yield format_sse(*item)
+            finally:
+                # Runs when the stream ends, including client disconnects
+                await events.aclose()
+                if stream_limiter is not None:
+                    stream_limiter.release()
+
+        response = Response(
+            generate(),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        # Streams stay open until the client leaves
+        response.timeout = None
+        return response
+
+    return blueprint
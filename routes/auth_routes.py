@@ -7,10 +7,11 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 def init_auth_routes(auth_service):
     """Initialize auth routes with service dependency"""
+    # One blueprint per app, so the factory can build several apps
+    auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
     @auth_bp.route('/options')
     def get_options():
@@ -31,7 +32,7 @@ def init_auth_routes(auth_service):
                 return jsonify(result), 400
 
         except Exception as e:
-            logger.error(f"Options cannot be retrieved error: {str(e)}")
+            logger.error("Options cannot be retrieved error: %s", e)
             return jsonify({
                 'message': 'Options cannot be retrieved'
             }), 500
@@ -56,7 +57,7 @@ def init_auth_routes(auth_service):
                 return jsonify(result), 400
 
         except Exception as e:
-            logger.error(f"Options cannot be saved error: {str(e)}")
+            logger.error("Options cannot be saved error: %s", e)
             return jsonify({
                 'message': 'Options cannot be saved'
             }), 500
@@ -88,7 +89,7 @@ def init_auth_routes(auth_service):
                 return jsonify(result), 400
                 
         except Exception as e:
-            logger.error(f"Login error: {str(e)}")
+            logger.error("Login error: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Login failed'
@@ -97,7 +98,7 @@ def init_auth_routes(auth_service):
 
 
         except Exception as e:
-            logger.error(f"Login error: {str(e)}")
+            logger.error("Login error: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Login failed'
@@ -129,7 +130,7 @@ def init_auth_routes(auth_service):
                 return jsonify(result), 400
 
         except Exception as e:
-            logger.error(f"Login error: {str(e)}")
+            logger.error("Login error: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Login failed'
@@ -180,7 +181,7 @@ def init_auth_routes(auth_service):
             return jsonify(result), 200
 
         except Exception as e:
-            logger.error(f"Status check error: {str(e)}")
+            logger.error("Status check error: %s", e)
             return jsonify({
                 'loggedIn': False,
                 'email': None,
@@ -212,7 +213,7 @@ def init_auth_routes(auth_service):
                 return jsonify(result), 400
 
         except Exception as e:
-            logger.error(f"Logout error: {str(e)}")
+            logger.error("Logout error: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Logout failed'
@@ -2,18 +2,53 @@
 Lecture Routes
 API endpoints for lecture management
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from bson import ObjectId
+import hashlib
+import json
 import logging
+import math
+
+from services.lecture_service import DuplicateVote
+from services.question_ingest import IngestBufferFull
 
 logger = logging.getLogger(__name__)
 
 
-def init_lecture_routes(lecture_service):
+def format_sse(event_id, event, data):
+    """Format a single Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def client_fingerprint():
+    """
+    Identify the submitting client by address and user agent
+
+    The address is remote_addr, which the proxy middleware (see
+    PROXY_TRUSTED_HOPS) sets from the X-Forwarded-For entries added by
+    trusted proxies. The raw header is never read, as clients control it.
+    """
+    address = request.remote_addr or ''
+    user_agent = request.headers.get('User-Agent', '')
+    return hashlib.blake2b(f"{address}|{user_agent}".encode('utf-8'), digest_size=8).hexdigest()
+
+
+def init_lecture_routes(lecture_service, stream_limiter=None, heartbeat_seconds=15,
+                        rate_limiter=None):
     """
     Initialize lecture routes blueprint
     
     Args:
         lecture_service: LectureService instance
+        stream_limiter: StreamLimiter bounding the concurrent event streams
+                        and long-polls, which hold a worker thread each
+        heartbeat_seconds: Idle interval between event stream heartbeats
+        rate_limiter: QuestionRateLimiter guarding question submission
         
     Returns:
         Flask blueprint
@@ -84,7 +119,7 @@ def init_lecture_routes(lecture_service):
                 'message': str(e)
             }), 400
         except Exception as e:
-            logger.error(f"Error creating lecture: {str(e)}")
+            logger.error("Error creating lecture: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to create lecture'
@@ -106,12 +141,35 @@ def init_lecture_routes(lecture_service):
             }), 200
             
         except Exception as e:
-            logger.error(f"Error fetching lectures: {str(e)}")
+            logger.error("Error fetching lectures: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to fetch lectures'
             }), 500
     
+    @blueprint.route('/lecturer/<session_id>/dashboard', methods=['GET'])
+    def get_lecturer_dashboard(session_id):
+        """
+        Get all lectures of a lecturer with question statistics
+
+        Replaces fetching the lectures, the questions of every lecture and
+        the unanswered count separately
+        """
+        try:
+            dashboard = lecture_service.get_lecturer_dashboard(session_id)
+
+            return jsonify({
+                'success': True,
+                'lectures': dashboard
+            }), 200
+
+        except Exception as e:
+            logger.error("Error fetching dashboard: %s", e)
+            return jsonify({
+                'success': False,
+                'message': 'Failed to fetch dashboard'
+            }), 500
+
     @blueprint.route('/<session_id>/<lecture_key>', methods=['GET'])
     def get_lecture(session_id, lecture_key):
         """
@@ -132,7 +190,7 @@ def init_lecture_routes(lecture_service):
             }), 200
             
         except Exception as e:
-            logger.error(f"Error fetching lecture: {str(e)}")
+            logger.error("Error fetching lecture: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to fetch lecture'
@@ -181,7 +239,7 @@ def init_lecture_routes(lecture_service):
                 'message': str(e)
             }), 400
         except Exception as e:
-            logger.error(f"Error updating lecture: {str(e)}")
+            logger.error("Error updating lecture: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to update lecture'
@@ -217,7 +275,7 @@ def init_lecture_routes(lecture_service):
             }), 200
             
         except Exception as e:
-            logger.error(f"Error deleting lecture: {str(e)}")
+            logger.error("Error deleting lecture: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to delete lecture'
@@ -262,7 +320,7 @@ def init_lecture_routes(lecture_service):
                 'message': str(e)
             }), 400
         except Exception as e:
-            logger.error(f"Error updating lecture day: {str(e)}")
+            logger.error("Error updating lecture day: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to update lecture day'
@@ -281,6 +339,15 @@ def init_lecture_routes(lecture_service):
             "question": "What is recursion?"
         }
         """
+        # Shed floods before parsing the body or touching the database
+        if rate_limiter is not None:
+            allowed, retry_after = rate_limiter.check(lecture_key, client_fingerprint())
+            if not allowed:
+                return jsonify({
+                    'success': False,
+                    'message': 'Too many questions, please slow down'
+                }), 429, {'Retry-After': str(max(int(math.ceil(retry_after)), 1))}
+
         try:
             data = request.get_json()
             
@@ -302,28 +369,95 @@ def init_lecture_routes(lecture_service):
                 'question': question
             }), 201
             
+        except IngestBufferFull:
+            return jsonify({
+                'success': False,
+                'message': 'Too many questions at once, please retry'
+            }), 503, {'Retry-After': '1'}
         except Exception as e:
-            logger.error(f"Error creating question: {str(e)}")
+            logger.error("Error creating question: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to create question'
             }), 500
     
+    @blueprint.route('/<lecture_key>/questions/<question_id>/upvote', methods=['POST'])
+    def upvote_question(lecture_key, question_id):
+        """
+        Upvote a pending student question
+        """
+        if rate_limiter is not None:
+            allowed, retry_after = rate_limiter.check(lecture_key, client_fingerprint(), action='vote')
+            if not allowed:
+                return jsonify({
+                    'success': False,
+                    'message': 'Too many votes, please slow down'
+                }), 429, {'Retry-After': str(max(int(math.ceil(retry_after)), 1))}
+
+        if not ObjectId.is_valid(question_id):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid question ID'
+            }), 400
+
+        try:
+            upvotes = lecture_service.upvote_question(lecture_key, question_id, client_fingerprint())
+
+            if upvotes is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Question not found or already delivered'
+                }), 404
+
+            return jsonify({
+                'success': True,
+                'upvotes': upvotes
+            }), 200
+
+        except DuplicateVote:
+            return jsonify({
+                'success': False,
+                'message': 'You already voted for this question'
+            }), 409
+        except Exception as e:
+            logger.error("Error upvoting question: %s", e)
+            return jsonify({
+                'success': False,
+                'message': 'Failed to upvote question'
+            }), 500
+
     @blueprint.route('/<session_id>/<lecture_key>/questions', methods=['GET'])
     def get_lecture_questions(session_id, lecture_key):
         """
         Get all questions for a lecture
+
+        Query params:
+            since: Cursor from a previous response; only questions created
+                   or modified after it are returned
         """
         try:
-            questions = lecture_service.get_questions_by_lecture(session_id, lecture_key)
+            since = request.args.get('since')
+            if since is not None:
+                try:
+                    since = int(since)
+                    if since < 0:
+                        raise ValueError(since)
+                except ValueError:
+                    return jsonify({
+                        'success': False,
+                        'message': 'since must be a cursor returned by this endpoint'
+                    }), 400
+
+            questions, cursor = lecture_service.get_question_changes(session_id, lecture_key, since)
             
             return jsonify({
                 'success': True,
-                'questions': questions
+                'questions': questions,
+                'cursor': cursor
             }), 200
             
         except Exception as e:
-            logger.error(f"Error fetching questions: {str(e)}")
+            logger.error("Error fetching questions: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to fetch questions'
@@ -331,8 +465,34 @@ def init_lecture_routes(lecture_service):
 
     @blueprint.route('/<session_id>/<lecture_key>/questions/next', methods=['GET'])
     def get_next_lecture_question(session_id, lecture_key):
+        """
+        Get the next deliverable question for a lecture
+
+        Query params:
+            wait: Optional long-poll timeout in seconds. The request is held
+                  until a question becomes deliverable or the timeout expires.
+        """
         try:
-            question = lecture_service.get_next_question_for_lecture(session_id, lecture_key)
+            wait = request.args.get('wait', type=float)
+            if wait is not None and not math.isfinite(wait):
+                return jsonify({
+                    'success': False,
+                    'message': 'wait must be a finite number of seconds'
+                }), 400
+
+            if wait:
+                if stream_limiter is not None and not stream_limiter.acquire():
+                    return jsonify({
+                        'success': False,
+                        'message': 'Too many waiting requests, please retry later'
+                    }), 503
+                try:
+                    question = lecture_service.wait_for_next_question(session_id, lecture_key, wait)
+                finally:
+                    if stream_limiter is not None:
+                        stream_limiter.release()
+            else:
+                question = lecture_service.get_next_question_for_lecture(session_id, lecture_key)
 
             return jsonify({
                 'success': True,
@@ -340,13 +500,86 @@ def init_lecture_routes(lecture_service):
             }), 200
 
         except Exception as e:
-            logger.error(f"Error fetching next question: {str(e)}")
+            logger.error("Error fetching next question: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to fetch next question'
             }), 500
 
     
+    @blueprint.route('/<session_id>/<lecture_key>/questions/stream', methods=['GET'])
+    def stream_lecture_questions(session_id, lecture_key):
+        """
+        Server-Sent Events feed of a lecture
+
+        Events:
+            question: a question was delivered to the lecturer
+            answered: a question was marked as answered
+            unanswered_count: the number of unanswered questions changed
+
+        Headers / Query params:
+            Last-Event-ID / lastEventId: Resume after the given event ID
+        """
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+
+        if stream_limiter is not None and not stream_limiter.acquire():
+            return jsonify({
+                'success': False,
+                'message': 'Too many open streams, please retry later'
+            }), 503
+
+        try:
+            events = lecture_service.stream_lecture_events(
+                session_id,
+                lecture_key,
+                last_event_id=last_event_id,
+                heartbeat_seconds=heartbeat_seconds
+            )
+        except ValueError as e:
+            if stream_limiter is not None:
+                stream_limiter.release()
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        except Exception as e:
+            if stream_limiter is not None:
+                stream_limiter.release()
+            logger.error("Error opening question stream: %s", e)
+            return jsonify({
+                'success': False,
+                'message': 'Failed to open question stream'
+            }), 500
+
+        def generate():
+            yield f"retry: {heartbeat_seconds * 1000}\n\n"
+            for item in events:
+                if item is None:
+                    yield ': heartbeat\n\n'
+                else:
+                    yield format_sse(*item)
+
+        def close_stream():
+            events.close()
+            if stream_limiter is not None:
+                stream_limiter.release()
+
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        # Runs when the server closes the response, including client disconnects
+        response.call_on_close(close_stream)
+        return response
+
     @blueprint.route('/lecturer/<session_id>/questions/unanswered/count', methods=['GET'])
     def get_unanswered_count(session_id):
         """
@@ -361,12 +594,86 @@ def init_lecture_routes(lecture_service):
             }), 200
             
         except Exception as e:
-            logger.error(f"Error counting questions: {str(e)}")
+            logger.error("Error counting questions: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to count questions'
             }), 500
     
+    def bulk_question_update(session_id, lecture_key, operation, action):
+        """Shared handler of the bulk question endpoints"""
+        try:
+            data = request.get_json(silent=True) or {}
+            question_ids = data.get('questionIds')
+            scope = data.get('scope')
+
+            if question_ids is None and scope is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'questionIds or scope is required'
+                }), 400
+            if question_ids is not None and not isinstance(question_ids, list):
+                return jsonify({
+                    'success': False,
+                    'message': 'questionIds must be a list'
+                }), 400
+
+            result = operation(session_id, lecture_key, question_ids=question_ids, scope=scope)
+
+            if result is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Lecture not found or unauthorized'
+                }), 404
+
+            return jsonify({
+                'success': True,
+                'updated': result['updated'],
+                'results': result['results']
+            }), 200
+
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        except Exception as e:
+            logger.error("Error bulk %s questions: %s", action, e)
+            return jsonify({
+                'success': False,
+                'message': f'Failed to mark questions {action}'
+            }), 500
+
+    @blueprint.route('/<session_id>/<lecture_key>/questions/answer', methods=['PUT'])
+    def bulk_mark_answered(session_id, lecture_key):
+        """
+        Mark many questions of a lecture as answered
+
+        Request body (one of):
+        {
+            "questionIds": ["...", "..."]
+        }
+        {
+            "scope": "delivered"  // or "all"
+        }
+        """
+        return bulk_question_update(session_id, lecture_key, lecture_service.bulk_mark_answered, 'answered')
+
+    @blueprint.route('/<session_id>/<lecture_key>/questions/deliver', methods=['PUT'])
+    def bulk_mark_delivered(session_id, lecture_key):
+        """
+        Mark many questions of a lecture as delivered
+
+        Request body (one of):
+        {
+            "questionIds": ["...", "..."]
+        }
+        {
+            "scope": "all"
+        }
+        """
+        return bulk_question_update(session_id, lecture_key, lecture_service.bulk_mark_delivered, 'delivered')
+
     @blueprint.route('/questions/<session_id>/<question_id>/answer', methods=['PUT'])
     def mark_question_answered(session_id, question_id):
         """
@@ -387,7 +694,7 @@ def init_lecture_routes(lecture_service):
             }), 200
             
         except Exception as e:
-            logger.error(f"Error marking question: {str(e)}")
+            logger.error("Error marking question: %s", e)
             return jsonify({
                 'success': False,
                 'message': 'Failed to mark question'
@@ -0,0 +1,50 @@
+"""
+Sessions Routes
+API endpoints for sessions
+"""
+from flask import Blueprint, jsonify, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def init_sessions_routes(sessions_service):
+    """
+    Initialize sessions routes blueprint
+
+    Args:
+        sessions_service: SessionsService instance
+
+    Returns:
+        Flask blueprint
+    """
+    blueprint = Blueprint('sessions', __name__, url_prefix='/api/sessions')
+
+    def active_sessions_response(unique_number=None):
+        """Live sessions for a caller with an active login session (?sessionId=)"""
+        session_id = (request.args.get('sessionId') or '').strip()
+        if not session_id:
+            return jsonify({'success': False, 'message': 'sessionId is required'}), 401
+        try:
+            result = sessions_service.get_active_sessions(session_id, unique_number)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 401
+        return jsonify(result), 200 if result['success'] else 503
+
+    @blueprint.route('/active', methods=['GET'])
+    def get_active_sessions():
+        """
+        Get every session that is live right now
+
+        Served from the in-memory registry, safe to poll frequently
+        """
+        return active_sessions_response()
+
+    @blueprint.route('/active/<unique_number>', methods=['GET'])
+    def get_active_sessions_for_user(unique_number):
+        """
+        Get the live sessions of a user
+        """
+        return active_sessions_response(unique_number)
+
+    return blueprint
@@ -0,0 +1,158 @@
+"""
+Active Sessions
+In-memory registry of the sessions that are live right now
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveSessionRegistry:
+    """
+    Live sessions keyed by sessionId and by user uniqueNumber.
+
+    Reads are served from memory. Starts, ends and deletes made through this
+    worker update the registry immediately; changes made by other workers or
+    by the session scheduler are picked up by rebuilding from the
+    session_is_active index once the registry is older than refresh_seconds,
+    so status boards can poll at any rate for one small query per interval.
+    """
+
+    def __init__(self, sessions, refresh_seconds=5):
+        """
+        Initialize active session registry
+
+        Args:
+            sessions: Session repository (storage.sessions)
+            refresh_seconds: Maximum age before the registry is rebuilt
+        """
+        self.sessions = sessions
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._by_user = {}
+        self._loaded_at = None
+
+    @staticmethod
+    def summarize(session):
+        """Reduce a session document to the fields status boards need"""
+        started_at = session.get('session_actual_start_time')
+        return {
+            'sessionId': session.get('sessionId'),
+            'name': session.get('name'),
+            'uniqueNumber': session.get('uniqueNumber'),
+            'expectedEndTime': session.get('session_expected_end_time'),
+            'startedAt': started_at.isoformat() if hasattr(started_at, 'isoformat') else started_at
+        }
+
+    def rebuild(self):
+        """Reload the registry from the database"""
+        self.load(self.sessions.find_active())
+
+    def load(self, active_sessions):
+        """
+        Replace the registry contents
+
+        Args:
+            active_sessions: Iterable of the live session documents
+        """
+        sessions = {}
+        by_user = {}
+        for session in active_sessions:
+            summary = self.summarize(session)
+            sessions[summary['sessionId']] = summary
+            by_user.setdefault(summary['uniqueNumber'], set()).add(summary['sessionId'])
+
+        with self._lock:
+            self._sessions = sessions
+            self._by_user = by_user
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Rebuild on the next read, e.g. after the scheduler changed sessions"""
+        with self._lock:
+            self._loaded_at = None
+
+    def add(self, session):
+        """Register a session that just started"""
+        summary = self.summarize(session)
+        with self._lock:
+            self._discard(summary['sessionId'])
+            self._sessions[summary['sessionId']] = summary
+            self._by_user.setdefault(summary['uniqueNumber'], set()).add(summary['sessionId'])
+
+    def remove(self, session_id):
+        """Drop a session that ended or was deleted"""
+        with self._lock:
+            self._discard(session_id)
+
+    def _discard(self, session_id):
+        """Remove a session from both maps (caller holds the lock)"""
+        summary = self._sessions.pop(session_id, None)
+        if summary is None:
+            return
+        user_sessions = self._by_user.get(summary['uniqueNumber'])
+        if user_sessions is not None:
+            user_sessions.discard(session_id)
+            if not user_sessions:
+                del self._by_user[summary['uniqueNumber']]
+
+    def is_loaded(self):
+        """Check whether the registry was loaded at least once"""
+        with self._lock:
+            return self._loaded_at is not None
+
+    def is_stale(self):
+        """Check whether the registry is due for a rebuild"""
+        with self._lock:
+            return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def _ensure_fresh(self):
+        if self.is_stale():
+            try:
+                self.rebuild()
+            except Exception as e:
+                # Serve the last known state rather than fail the poll
+                logger.error("Error rebuilding active sessions: %s", e)
+                if not self.is_loaded():
+                    raise
+
+    def for_user(self, unique_number):
+        """
+        Get the live sessions of a user
+
+        Args:
+            unique_number: User uniqueNumber
+
+        Returns:
+            List of session summaries
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return [self._sessions[session_id] for session_id in self._by_user.get(unique_number, ())]
+
+    def all(self):
+        """
+        Get every live session
+
+        Returns:
+            List of session summaries
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stats(self):
+        """
+        Get registry counters
+
+        Returns:
+            Dictionary with the number of live sessions and users
+        """
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'users': len(self._by_user)
+            }
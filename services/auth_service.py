@@ -3,8 +3,8 @@ Authentication service - Business logic layer
 """
 import logging
 
-from models.user import User
 from models.verification import EmailVerification
+from services.request_identity import RequestIdentity
 
 logger = logging.getLogger(__name__)
 
@@ -12,31 +12,35 @@ logger = logging.getLogger(__name__)
 class AuthService:
     """Service for handling authentication business logic"""
 
-    def __init__(self, db, email_service):
-        self.db = db
+    def __init__(self, storage, email_service, identity=None):
+        # Repositories of the configured backend (MongoStorage or MemoryStorage)
+        self.users = storage.users
+        self.verifications = storage.verifications
         self.email_service = email_service
+        # Session to user resolution shared with the other services
+        self.identity = identity or RequestIdentity(storage.users)
 
     def login(self, email, session_id):
         email = email.lower().strip()
         session_id = session_id.strip()
 
         # Check if user exists
-        user = User.find_by_email(self.db, email)
+        user = self.users.find_by_email(email)
         if not user:
-            user = User.create(self.db, email)
+            user = self.users.create(email)
         user.get("pendingSessionIds", []).append(session_id)
-        User.update_user(self.db, user)
+        self.users.update(user)
 
         # Delete any existing verification tokens
-        EmailVerification.delete_by_email(self.db, email)
+        self.verifications.delete_by_email(email)
 
         # Create verification record
-        EmailVerification.create(self.db, email, session_id)
+        self.verifications.create(email, session_id)
 
         # Send verification email
         try:
             self.email_service.send_verification_email(email, session_id)
-            logger.info(f"Login verification email sent to: {email}")
+            logger.info("Login verification email sent to: %s", email)
             return {
                 'success': True,
                 'message': 'Verification email sent. Please check your email.',
@@ -45,7 +49,7 @@ class AuthService:
                 }
             }
         except Exception as e:
-            logger.error(f"Failed to send verification email: {str(e)}")
+            logger.error("Failed to send verification email: %s", e)
             return {
                 'success': False,
                 'message': 'Failed to send verification email. Please try again.'
@@ -53,7 +57,7 @@ class AuthService:
 
     def get_user(self, session_id):
         session_id = session_id.strip()
-        user =  User.find_by_active_session(self.db, session_id)
+        user = self.identity.current_user(session_id)
         if not user:
             return {'message': 'No user found',
                     'success': False}
@@ -65,13 +69,13 @@ class AuthService:
 
     def save_options(self, session_id, data):
         session_id = session_id.strip()
-        user = User.find_by_active_session(self.db, session_id)
+        user = self.identity.current_user(session_id)
         if not user:
             return {'message': 'No user found',
                     'success': False}
 
         user['options'] = data
-        User.update_user(self.db, user)
+        self.users.update(user)
         return {
             'success': True
         }
@@ -82,14 +86,14 @@ class AuthService:
         ar_session_id = ar_session_id.strip()
 
         # Check if user exists
-        user = User.find_by_active_session(self.db, session_id)
+        user = self.identity.current_user(session_id)
         if not user:
             return {
                 'success': False,
                 'message': 'Given session id was not active.'
             }
         user.get("activeSessionIds", []).append(ar_session_id)
-        User.update_user(self.db, user)
+        self.users.update(user)
         return {
             'success': True,
             'message': 'AR session was authorized.',
@@ -98,7 +102,7 @@ class AuthService:
     def verify_email(self, session_id):
 
         # Find verification record
-        verification = EmailVerification.find_by_token(self.db, session_id)
+        verification = self.verifications.find_by_token(session_id)
 
         if not verification:
             return {
@@ -114,7 +118,7 @@ class AuthService:
             }
 
         # Find user
-        user = User.find_by_email(self.db, verification['email'])
+        user = self.users.find_by_email(verification['email'])
         if not user:
             return {
                 'success': False,
@@ -122,13 +126,14 @@ class AuthService:
             }
 
         # Mark verification as verified
-        EmailVerification.mark_as_verified(self.db, verification['_id'])
+        self.verifications.mark_as_verified(verification['_id'])
 
         # Set user as active
-        User.activate_session(self.db, user['_id'], session_id)
+        self.users.activate_session(user['_id'], session_id)
+        self.identity.invalidate(session_id)
 
 
-        logger.info(f"User logged in successfully: {user['email']}")
+        logger.info("User logged in successfully: %s", user['email'])
 
         return {
             'success': True,
@@ -139,7 +144,7 @@ class AuthService:
         }
 
     def is_session_alive(self, session_id):
-        user = User.find_by_active_session(self.db, session_id)
+        user = self.identity.current_user(session_id)
         return session_id in user.get('activeSessionIds', [])
 
 
@@ -154,7 +159,7 @@ class AuthService:
         session_id = session_id.strip()
 
         # Find user by session token
-        user = User.find_by_active_session(self.db, session_id)
+        user = self.identity.current_user(session_id)
 
         if not user:
             return {
@@ -193,7 +198,7 @@ class AuthService:
         session_id = session_id.strip()
 
         # Find user
-        user = User.find_by_active_or_pending_session(self.db, session_id)
+        user = self.users.find_by_active_or_pending_session(session_id)
 
         if not user:
             return {
@@ -202,9 +207,10 @@ class AuthService:
             }
 
         # Set user as inactive
-        User.inactivate_session(self.db, user['_id'], session_id)
+        self.users.inactivate_session(user['_id'], session_id)
+        self.identity.invalidate(session_id)
 
-        logger.info(f"User logged out: {user['email']}")
+        logger.info("User logged out: %s", user['email'])
 
         return {
             'success': True,
@@ -0,0 +1,241 @@
+"""
+Command Monitor
+Command listener attributing every Mongo command to the request that issued
+it: counts, time and bytes per request, slow command logging and per-route
+query budgets
+"""
+import contextvars
+import logging
+import threading
+
+import bson
+from bson.errors import InvalidDocument
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Mongo command totals of the request being served (thread, greenlet or task local)
+request_commands_var = contextvars.ContextVar('request_commands', default=None)
+
+# Response headers with the request's totals (when enabled)
+COMMANDS_HEADER = 'X-DB-Commands'
+TIME_HEADER = 'X-DB-Time-Ms'
+BYTES_HEADER = 'X-DB-Bytes'
+OVER_BUDGET_HEADER = 'X-DB-Over-Budget'
+
+# Budget key applying to endpoints without a budget of their own
+DEFAULT_BUDGET = 'default'
+
+
+class RequestCommands:
+    """Mongo command totals of one request"""
+
+    __slots__ = ('count', 'failed', 'micros', 'bytes_sent', 'bytes_received')
+
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+        self.micros = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def milliseconds(self):
+        return round(self.micros / 1000, 3)
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """
+    Times every command of one MongoClient (register via event_listeners).
+
+    pymongo publishes command events on the thread that runs the command,
+    so the totals of the request being served are found through
+    request_commands_var; commands of background threads (ingest flushes,
+    the session scheduler) only count towards the per-command totals.
+    """
+
+    def __init__(self, slow_ms=100, budgets=None):
+        """
+        Initialize command monitor
+
+        Args:
+            slow_ms: Log commands taking longer than this, 0 to disable
+            budgets: Dictionary of endpoint (or 'default') to the most
+                     commands a request may issue, 0 for no limit
+        """
+        self.slow_ms = slow_ms
+        self.budgets = dict(budgets or {})
+        self._lock = threading.Lock()
+        # Started and succeeded/failed are published on the same thread
+        self._pending = threading.local()
+        self._commands = {}
+        self._slow = 0
+        self._over_budget = {}
+
+    def started(self, event):
+        self._pending.collection = command_collection(event.command_name, event.command)
+        commands = request_commands_var.get()
+        if commands is not None:
+            commands.count += 1
+            commands.bytes_sent += encoded_size(event.command)
+
+    def succeeded(self, event):
+        size = encoded_size(event.reply)
+        self._finished(event, size, failed=False)
+        commands = request_commands_var.get()
+        if commands is not None:
+            commands.micros += event.duration_micros
+            commands.bytes_received += size
+
+    def failed(self, event):
+        self._finished(event, 0, failed=True)
+        commands = request_commands_var.get()
+        if commands is not None:
+            commands.micros += event.duration_micros
+            commands.failed += 1
+
+    def _finished(self, event, size, failed):
+        name = event.command_name
+        with self._lock:
+            totals = self._commands.get(name)
+            if totals is None:
+                totals = self._commands[name] = {'count': 0, 'failed': 0, 'micros': 0, 'bytes': 0}
+            totals['count'] += 1
+            totals['failed'] += failed
+            totals['micros'] += event.duration_micros
+            totals['bytes'] += size
+        if self.slow_ms and event.duration_micros > self.slow_ms * 1000:
+            with self._lock:
+                self._slow += 1
+            logger.warning(
+                "Slow Mongo command %s on %s.%s: %.1f ms",
+                name, event.database_name, getattr(self._pending, 'collection', None),
+                event.duration_micros / 1000
+            )
+
+    def budget(self, endpoint):
+        """Most commands a request to endpoint may issue, 0 for no limit"""
+        return self.budgets.get(endpoint, self.budgets.get(DEFAULT_BUDGET, 0))
+
+    def check_budget(self, endpoint, method, commands):
+        """
+        Flag a request that issued more commands than its route's budget
+
+        Args:
+            endpoint: Flask endpoint name
+            method: HTTP method
+            commands: RequestCommands of the request
+
+        Returns:
+            True if the request exceeded its budget
+        """
+        budget = self.budget(endpoint)
+        if not budget or commands.count <= budget:
+            return False
+        with self._lock:
+            self._over_budget[endpoint] = self._over_budget.get(endpoint, 0) + 1
+        logger.warning(
+            "%s %s issued %s Mongo commands (budget %s, %.1f ms)",
+            method, endpoint, commands.count, budget, commands.micros / 1000
+        )
+        return True
+
+    def stats(self):
+        """
+        Get command counters
+
+        Returns:
+            Dictionary with count, failures, mean time in ms and reply bytes
+            per command name, the number of slow commands and requests over
+            budget per endpoint
+        """
+        with self._lock:
+            return {
+                'commands': {
+                    name: {
+                        'count': totals['count'],
+                        'failed': totals['failed'],
+                        'meanMs': round(totals['micros'] / totals['count'] / 1000, 3) if totals['count'] else 0.0,
+                        'replyBytes': totals['bytes']
+                    }
+                    for name, totals in self._commands.items()
+                },
+                'slow': self._slow,
+                'overBudget': dict(self._over_budget)
+            }
+
+
+def command_collection(name, command):
+    """Collection a command operates on, None for database commands"""
+    target = command.get('collection') if name == 'getMore' else command.get(name)
+    return target if isinstance(target, str) else None
+
+
+def encoded_size(document):
+    """BSON size of a command or reply document"""
+    try:
+        return len(bson.encode(document))
+    except (InvalidDocument, TypeError):
+        return 0
+
+
+def parse_budgets(value):
+    """
+    Parse 'endpoint=commands,...' query budgets
+
+    Args:
+        value: Comma-separated assignments, may be empty; 'default' applies
+               to endpoints not listed
+
+    Returns:
+        Dictionary of endpoint to command budget
+    """
+    budgets = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        endpoint, separator, budget = item.partition('=')
+        if not separator or not endpoint.strip():
+            raise ValueError(f"Expected endpoint=commands, got {item}")
+        budget = int(budget)
+        if budget < 0:
+            raise ValueError(f"Query budget must be 0 or more, got {item}")
+        budgets[endpoint.strip()] = budget
+    return budgets
+
+
+def init_command_monitor(app, monitor, current_request, headers=False):
+    """
+    Attribute the Mongo commands of every request to it
+
+    Args:
+        app: Flask application
+        monitor: CommandMonitor registered with the application's MongoClient
+        current_request: The framework's request proxy
+        headers: Report the request's totals in X-DB-* response headers
+    """
+    def start_commands():
+        request_commands_var.set(RequestCommands())
+
+    def report_commands(response):
+        commands = request_commands_var.get()
+        if headers and commands is not None:
+            response.headers[COMMANDS_HEADER] = str(commands.count)
+            response.headers[TIME_HEADER] = str(commands.milliseconds)
+            response.headers[BYTES_HEADER] = f'{commands.bytes_sent}/{commands.bytes_received}'
+            budget = monitor.budget(current_request.endpoint)
+            if budget and commands.count > budget:
+                response.headers[OVER_BUDGET_HEADER] = str(budget)
+        return response
+
+    def finish_commands(exception=None):
+        # After streamed responses too, so their commands are included
+        commands = request_commands_var.get()
+        if commands is None:
+            return
+        request_commands_var.set(None)
+        monitor.check_budget(current_request.endpoint or 'unmatched', current_request.method, commands)
+
+    app.before_request(start_commands)
+    app.after_request(report_commands)
+    app.teardown_request(finish_commands)
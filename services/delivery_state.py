@@ -0,0 +1,78 @@
+"""
+Delivery State
+Per-lecture question delivery state kept close to the lecture service
+"""
+import threading
+
+
+class DeliveryStateStore:
+    """
+    In-process table of per-lecture delivery state.
+
+    Each entry holds:
+        lastDeliveredAt: When the lecture last delivered a question (datetime or None)
+        pendingHint: Best known number of undelivered questions (int or None if unknown)
+        pendingCheckedAt: Monotonic time at which pendingHint was last confirmed
+
+    The state is a cache: the lecture document stays the source of truth and
+    is compared-and-set before every delivery. A shared store (for example a
+    Redis hash per lecture) can replace this class by implementing get, update
+    and adjust_pending with the same semantics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def get(self, lecture_key):
+        """
+        Get a copy of the delivery state of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+
+        Returns:
+            State dictionary or None if the lecture is not cached
+        """
+        with self._lock:
+            state = self._states.get(lecture_key)
+            return dict(state) if state is not None else None
+
+    def update(self, lecture_key, **fields):
+        """
+        Create or update the delivery state of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+            **fields: State fields to set
+        """
+        with self._lock:
+            state = self._states.setdefault(lecture_key, {
+                'lastDeliveredAt': None,
+                'pendingHint': None,
+                'pendingCheckedAt': None
+            })
+            state.update(fields)
+
+    def adjust_pending(self, lecture_key, delta):
+        """
+        Shift the pending hint of a lecture if it is known
+
+        Args:
+            lecture_key: Lecture Key (string)
+            delta: Number of questions added (positive) or removed (negative)
+        """
+        with self._lock:
+            state = self._states.get(lecture_key)
+            if state is not None and state['pendingHint'] is not None:
+                state['pendingHint'] = max(state['pendingHint'] + delta, 0)
+
+    def discard(self, lecture_key):
+        """
+        Forget the delivery state of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        with self._lock:
+            self._states.pop(lecture_key, None)
@@ -25,7 +25,7 @@ class EmailService:
         self.sg = SendGridAPIClient(api_key)
         self.from_email = from_email
         self.config = config
-        logger.info(f"Email service initialized with SendGrid. Sender: {from_email}")
+        logger.info("Email service initialized with SendGrid. Sender: %s", from_email)
 
     def send_verification_email(self, email, sessionId):
         """Send verification email with login link"""
@@ -172,9 +172,9 @@ class EmailService:
             )
 
             response = self.sg.send(message)
-            logger.info(f"✅ Verification email sent to: {email}, Status: {response.status_code}")
+            logger.info("✅ Verification email sent to: %s, Status: %s", email, response.status_code)
             return True
 
         except Exception as e:
-            logger.error(f"❌ SendGrid error for {email}: {str(e)}")
+            logger.error("❌ SendGrid error for %s: %s", email, e)
             raise
\ No newline at end of file
@@ -5,43 +5,82 @@ Business logic for lecture management
 from bson import ObjectId
 from datetime import datetime, timedelta
 import logging
+import math
+import time
 
 from models.lecture import Lecture, StudentQuestion
-from models.user import User
+from services.delivery_state import DeliveryStateStore
+from services.question_notifier import QuestionNotifier, Wait
+from services.question_queue import QuestionPriorityQueue
+from services.read_routing import routed_session
+from services.request_identity import RequestIdentity
 import random
 import string
 
 logger = logging.getLogger(__name__)
+# Per-question records; sampled in production (LOG_SAMPLING)
+question_logger = logging.getLogger(f'{__name__}.questions')
+delivery_logger = logging.getLogger(f'{__name__}.delivery')
 
 def generate_random(size: int) -> str:
     chars = string.ascii_letters + string.digits
     return ''.join(random.choice(chars) for _ in range(size))
 
 
+class DuplicateVote(Exception):
+    """Raised when a client upvotes a question it already voted for"""
+
+
 class LectureService:
     """Service for managing lectures and student questions"""
     QUESTION_COOLDOWN_SECONDS = 30
+    LONG_POLL_MAX_SECONDS = 25
+    # Questions created on other workers are only seen after this delay
+    PENDING_HINT_TTL_SECONDS = 3
+    QUEUE_CLAIM_ATTEMPTS = 5
+    QUEUE_LOAD_LIMIT = 5000
+    CHANGE_CURSOR_OVERLAP_SECONDS = 5
+    MAX_BULK_QUESTIONS = 1000
     
-    def __init__(self, db):
+    def __init__(self, storage, notifier=None, long_poll_max_seconds=None, delivery_state=None,
+                 ingest_buffer=None, clusterer=None, question_queue=None,
+                 read_router=None, identity=None):
         """
         Initialize lecture service
         
         Args:
-            db: MongoDB database instance
+            storage: MongoStorage or MemoryStorage; its question store sets
+                     the question storage layout
+            notifier: QuestionNotifier used to wake long-polling lecturers
+            long_poll_max_seconds: Upper bound for long-poll timeouts
+            delivery_state: DeliveryStateStore caching per-lecture delivery state
+            ingest_buffer: Optional QuestionIngestBuffer batching question inserts
+            clusterer: Optional QuestionClusterer grouping near-duplicate questions
+            question_queue: QuestionPriorityQueue ordering pending questions
+            read_router: Optional ReadRouter sending the read-only listings
+                         and counts to secondaries
+            identity: RequestIdentity resolving session IDs to users, shared
+                      with the other services
         """
-        self.db = db
-        self.lectures = db.lectures
-        self.questions = db.student_questions
+        self.identity = identity or RequestIdentity(storage.users)
+        self.lectures = storage.lectures
+        self.question_store = storage.questions
+        self.notifier = notifier or QuestionNotifier()
+        self.long_poll_max_seconds = long_poll_max_seconds or self.LONG_POLL_MAX_SECONDS
+        self.delivery_state = delivery_state or DeliveryStateStore()
+        self.ingest_buffer = ingest_buffer
+        self.clusterer = clusterer
+        self.question_queue = question_queue or QuestionPriorityQueue()
+        # Listings and counts read through these; delivery and writes use the primary
+        self.read_router = read_router
+        self.lecture_reads = read_router.store(self.lectures) if read_router else self.lectures
+        self.question_reads = read_router.store(self.question_store) if read_router else self.question_store
+
+    def ensure_indexes(self):
+        """Create the indexes backing the lecture and question queries"""
+        self.lectures.ensure_indexes()
+        self.question_store.ensure_indexes()
 
-    def verify_and_get_user(self, session_id):
-        try:
-            user =  User.find_by_active_session(self.db, session_id)
-            if user is None:
-                raise ValueError('Session is not active')
-            return user
-        except Exception as e:
-            raise e
-    
     def create_lecture(self, session_id, course_name, semester_start, semester_end,
                       class_sessions, lecture_days):
         """
@@ -58,17 +97,10 @@ class LectureService:
         Returns:
             Created lecture document
         """
-        user = self.verify_and_get_user(session_id)
+        user = self.identity.require_user(session_id)
         try:
-            # Validate class sessions
-            for session in class_sessions:
-                if not Lecture.validate_class_session(session):
-                    raise ValueError(f"Invalid class session: {session}")
-            
-            # Validate lecture days
-            for day in lecture_days:
-                if not Lecture.validate_lecture_day(day):
-                    raise ValueError(f"Invalid lecture day: {day}")
+            # Validate class sessions and lecture days
+            Lecture.check_schedule(class_sessions, lecture_days)
             
             # Create lecture document
             lecture_doc = Lecture.create(
@@ -82,15 +114,14 @@ class LectureService:
             )
             
             # Insert into database
-            result = self.lectures.insert_one(lecture_doc)
-            lecture_doc['_id'] = result.inserted_id
+            lecture_doc['_id'] = self.lectures.insert(lecture_doc)
             
-            logger.info(f"Created lecture: {result.inserted_id} for lecturer: {user['_id']}")
+            logger.info("Created lecture: %s for lecturer: %s", lecture_doc['_id'], user['_id'])
             
             return Lecture.to_json(lecture_doc)
             
         except Exception as e:
-            logger.error(f"Error creating lecture: {str(e)}")
+            logger.error("Error creating lecture: %s", e)
             raise
     
     def get_lectures_by_lecturer(self, session_id):
@@ -103,14 +134,54 @@ class LectureService:
         Returns:
             List of lecture documents
         """
-        user = self.verify_and_get_user(session_id)
-        try:
-            lectures = list(self.lectures.find({'lecturerId': user['_id']}))
-            return [Lecture.to_json(lecture) for lecture in lectures]
-        except Exception as e:
-            logger.error(f"Error fetching lectures for session {session_id}: {str(e)}")
-            raise
+        with routed_session(self.read_router) as session:
+            user = self.identity.require_user(session_id, session=session)
+            try:
+                lectures = self.lecture_reads.find_by_lecturer(user['_id'], session=session)
+                return [Lecture.to_json(lecture) for lecture in lectures]
+            except Exception as e:
+                logger.error("Error fetching lectures for session %s: %s", session_id, e)
+                raise
     
+    def get_lecturer_dashboard(self, session_id):
+        """
+        Get every lecture of a lecturer with its question statistics
+
+        One query for all lectures (an aggregation with MongoDB), instead of
+        one request per lecture.
+
+        Args:
+            session_id: Lecturer's session id (string)
+
+        Returns:
+            List of lecture summaries with total, unanswered and delivered
+            question counts and the time of the last question
+        """
+        with routed_session(self.read_router) as session:
+            user = self.identity.require_user(session_id, session=session)
+            try:
+                dashboard = []
+                for lecture in self.lecture_reads.dashboard(user['_id'], session=session):
+                    stats = lecture.get('questionStats') or {}
+                    last_question_at = stats.get('lastQuestionAt')
+                    dashboard.append({
+                        'id': str(lecture['_id']),
+                        'key': lecture.get('key'),
+                        'courseName': lecture.get('courseName'),
+                        'semesterStartDate': lecture.get('semesterStartDate'),
+                        'semesterEndDate': lecture.get('semesterEndDate'),
+                        'totalQuestions': stats.get('total', 0),
+                        'unansweredQuestions': stats.get('unanswered', 0),
+                        'deliveredQuestions': stats.get('delivered', 0),
+                        'lastQuestionAt': last_question_at.isoformat() if last_question_at else None
+                    })
+
+                return dashboard
+
+            except Exception as e:
+                logger.error("Error building dashboard for session %s: %s", session_id, e)
+                raise
+
     def get_lecture_by_key(self, session_id, lecture_key):
         """
         Get a specific lecture by ID
@@ -122,16 +193,15 @@ class LectureService:
         Returns:
             Lecture document or None
         """
-        self.verify_and_get_user(session_id)
+        self.identity.require_user(session_id)
         try:
-            lecture = self.lectures.find_one({'key': lecture_key})
+            lecture = self.lectures.find_by_key(lecture_key)
             return Lecture.to_json(lecture) if lecture else None
         except Exception as e:
-            logger.error(f"Error fetching lecture {lecture_key}: {str(e)}")
+            logger.error("Error fetching lecture %s: %s", lecture_key, e)
             raise
     
     def update_lecture(self, session_id, lecture_key, updates):
-        self.verify_and_get_user(session_id)
         """
         Update a lecture
         
@@ -143,35 +213,22 @@ class LectureService:
         Returns:
             Updated lecture document or None
         """
-        self.verify_and_get_user(session_id)
+        self.identity.require_user(session_id)
         try:
             # Add updatedAt timestamp
             updates['updatedAt'] = datetime.utcnow()
             
-            # Validate class sessions if provided
-            if 'classSessions' in updates:
-                for session in updates['classSessions']:
-                    if not Lecture.validate_class_session(session):
-                        raise ValueError(f"Invalid class session: {session}")
-            
-            # Validate lecture days if provided
-            if 'lectureDays' in updates:
-                for day in updates['lectureDays']:
-                    if not Lecture.validate_lecture_day(day):
-                        raise ValueError(f"Invalid lecture day: {day}")
-            
-            result = self.lectures.find_one_and_update(
-                {'key': lecture_key},
-                {'$set': updates},
-                return_document=True
-            )
+            # Validate class sessions and lecture days if provided
+            Lecture.check_schedule(updates.get('classSessions'), updates.get('lectureDays'))
+            
+            result = self.lectures.update(lecture_key, updates)
             
-            logger.info(f"Updated lecture: {lecture_key}")
+            logger.info("Updated lecture: %s", lecture_key)
             
             return Lecture.to_json(result) if result else None
 
         except Exception as e:
-            logger.error(f"Error updating lecture {lecture_key}: {str(e)}")
+            logger.error("Error updating lecture %s: %s", lecture_key, e)
             raise
     
     def update_lecture_day(self, session_id, lecture_key, day_id, day_updates):
@@ -187,50 +244,29 @@ class LectureService:
         Returns:
             Updated lecture document or None
         """
-        self.verify_and_get_user(session_id)
+        self.identity.require_user(session_id)
         try:
-            # Validate timeline items if provided
-            if 'timeline' in day_updates and day_updates['timeline']:
-                for item in day_updates['timeline']:
-                    if not Lecture.validate_timeline_item(item):
-                        raise ValueError(f"Invalid timeline item: {item}")
-
             # Find the lecture
-            lecture = self.lectures.find_one({'key': lecture_key})
+            lecture = self.lectures.find_by_key(lecture_key)
             if not lecture:
                 return None
             
-            # Update the specific day
+            # Validate and update the specific day
             lecture_days = lecture.get('lectureDays', [])
-            day_found = False
-            
-            for day in lecture_days:
-                if day.get('id') == day_id:
-                    day.update(day_updates)
-                    day_found = True
-                    break
-            
-            if not day_found:
-                raise ValueError(f"Lecture day {day_id} not found")
+            Lecture.apply_day_updates(lecture_days, day_id, day_updates)
             
             # Update the lecture
-            result = self.lectures.find_one_and_update(
-                {'key': lecture_key},
-                {
-                    '$set': {
-                        'lectureDays': lecture_days,
-                        'updatedAt': datetime.utcnow()
-                    }
-                },
-                return_document=True
-            )
+            result = self.lectures.update(lecture_key, {
+                'lectureDays': lecture_days,
+                'updatedAt': datetime.utcnow()
+            })
             
-            logger.info(f"Updated lecture day {day_id} in lecture {lecture_key}")
+            logger.info("Updated lecture day %s in lecture %s", day_id, lecture_key)
             
             return Lecture.to_json(result) if result else None
             
         except Exception as e:
-            logger.error(f"Error updating lecture day: {str(e)}")
+            logger.error("Error updating lecture day: %s", e)
             raise
     
     def delete_lecture(self, session_id, lecture_key):
@@ -244,23 +280,23 @@ class LectureService:
         Returns:
             Boolean indicating success
         """
-        user = self.verify_and_get_user(session_id)
+        user = self.identity.require_user(session_id)
         try:
-            result = self.lectures.delete_one({
-                'key': lecture_key,
-                'lecturerId': user['_id']
-            })
-            
-            if result.deleted_count > 0:
+            if self.lectures.delete(lecture_key, user['_id']):
                 # Also delete associated questions
-                self.questions.delete_many({'lectureKey': lecture_key})
-                logger.info(f"Deleted lecture: {lecture_key}")
+                self.question_store.delete_by_lecture(lecture_key)
+                self.delivery_state.discard(lecture_key)
+                if self.clusterer is not None:
+                    self.clusterer.discard(lecture_key)
+                self.question_queue.discard(lecture_key)
+                self.notifier.discard(lecture_key)
+                logger.info("Deleted lecture: %s", lecture_key)
                 return True
             
             return False
             
         except Exception as e:
-            logger.error(f"Error deleting lecture {lecture_key}: {str(e)}")
+            logger.error("Error deleting lecture %s: %s", lecture_key, e)
             raise
     
     # Student Questions
@@ -283,37 +319,102 @@ class LectureService:
                 student_name=student_name,
                 question=question_text
             )
+
+            # Attach near-duplicates to the cluster of an open question
+            signature = None
+            if self.clusterer is not None:
+                signature = self.clusterer.signature(question_text)
+                self._ensure_cluster_index(lecture_key)
+                cluster_id = self.clusterer.match(lecture_key, signature)
+                if cluster_id is not None:
+                    question_doc['clusterId'] = cluster_id
+                    question_doc['isDuplicate'] = True
+                else:
+                    question_doc['_id'] = ObjectId()
+                    question_doc['clusterId'] = question_doc['_id']
+            
+            if self.ingest_buffer is not None:
+                question_doc['_id'] = self.ingest_buffer.submit(question_doc)
+            else:
+                question_doc['_id'] = self.question_store.insert(question_doc)
+
+            if question_doc['isDuplicate']:
+                # A duplicate counts as a vote for its representative
+                representative = self.question_store.bump_priority(
+                    question_doc['clusterId'], datetime.utcnow(), duplicate=True
+                )
+                if representative is not None and not representative.get('isDelivered'):
+                    self.question_queue.push(lecture_key, representative['_id'], representative['priority'])
+                question_logger.info("Clustered question for lecture: %s", lecture_key)
+                return StudentQuestion.to_json(question_doc)
+
+            if signature is not None:
+                self.clusterer.add(lecture_key, question_doc['_id'], signature)
+
+            self.question_queue.push(lecture_key, question_doc['_id'], question_doc['priority'])
+
+            # Wake lecturers long-polling this lecture
+            self.delivery_state.adjust_pending(lecture_key, 1)
+            self.notifier.notify(lecture_key)
             
-            result = self.questions.insert_one(question_doc)
-            question_doc['_id'] = result.inserted_id
-            
-            logger.info(f"Created question for lecture: {lecture_key}")
+            question_logger.info("Created question for lecture: %s", lecture_key)
             
             return StudentQuestion.to_json(question_doc)
             
         except Exception as e:
-            logger.error(f"Error creating question: {str(e)}")
+            logger.error("Error creating question: %s", e)
             raise
     
-    def get_questions_by_lecture(self, session_id, lecture_key):
+    def _ensure_cluster_index(self, lecture_key):
         """
-        Get all questions for a specific lecture
-        
+        Rebuild the cluster index of a lecture from the database if needed
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        if self.clusterer.is_loaded(lecture_key):
+            return
+
+        representatives = self.question_store.find_open_representatives(
+            lecture_key, self.clusterer.max_clusters
+        )
+        self.clusterer.rebuild(lecture_key, representatives)
+
+    def get_question_changes(self, session_id, lecture_key, since=None):
+        """
+        Get the questions of a lecture created or modified after a cursor
+
+        Every write to a question sets its updatedAt. Changes are returned
+        from CHANGE_CURSOR_OVERLAP_SECONDS before the cursor on, so writes
+        that were in flight on other workers when the previous cursor was
+        issued are not missed; clients merge the result by question ID.
+
         Args:
-            lecture_key: Lecture ID (string)
             session_id: Session ID (string)
-            
+            lecture_key: Lecture Key (string)
+            since: Cursor returned by a previous call (epoch milliseconds),
+                   None for the full list
+
         Returns:
-            List of question documents
+            Tuple of (list of question documents, new cursor)
         """
-        self.verify_and_get_user(session_id)
-        try:
-            questions = list(self.questions.find({'lectureKey': lecture_key}))
-            return [StudentQuestion.to_json(q) for q in questions]
-        except Exception as e:
-            logger.error(f"Error fetching questions for lecture {lecture_key}: {str(e)}")
-            raise
-    
+        with routed_session(self.read_router) as session:
+            self.identity.require_user(session_id, session=session)
+            try:
+                now = datetime.utcnow()
+                since_at = None
+                if since is not None:
+                    since_at = (datetime(1970, 1, 1) + timedelta(milliseconds=since)
+                                - timedelta(seconds=self.CHANGE_CURSOR_OVERLAP_SECONDS))
+
+                questions = self.question_reads.find_changed_since(lecture_key, since_at, session=session)
+                cursor = int((now - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+                return [StudentQuestion.to_json(q) for q in questions], cursor
+            except Exception as e:
+                logger.error("Error fetching question changes for lecture %s: %s", lecture_key, e)
+                raise
+
     def get_unanswered_questions_count(self, session_id):
         """
         Get count of unanswered questions for all lecturer's lectures
@@ -324,27 +425,21 @@ class LectureService:
         Returns:
             Count of unanswered questions
         """
-        user = self.verify_and_get_user(session_id)
-        try:
-            # Get all lectures for this lecturer
-            lectures = list(self.lectures.find(
-                {'lecturerId': user['_id']},
-                {'_id': 1}
-            ))
-            lecture_ids = [str(lecture['_id']) for lecture in lectures]
-            
-            # Count unanswered questions
-            count = self.questions.count_documents({
-                'lectureId': {'$in': lecture_ids},
-                'isAnswered': False
-            })
+        with routed_session(self.read_router) as session:
+            user = self.identity.require_user(session_id, session=session)
+            try:
+                # Get all lectures for this lecturer
+                lecture_keys = self.lecture_reads.find_keys_by_lecturer(user['_id'], session=session)
             
-            return count
+                # Count unanswered questions (questions reference lectures by key)
+                count = self.question_reads.count_unanswered(lecture_keys, session=session)
             
-        except Exception as e:
-            logger.error(f"Error counting questions: {str(e)}")
-            raise
-    
+                return count
+            
+            except Exception as e:
+                logger.error("Error counting questions: %s", e)
+                raise
+
     def mark_question_answered(self, session_id, question_id):
         """
         Mark a question as answered
@@ -356,17 +451,185 @@ class LectureService:
         Returns:
             Boolean indicating success
         """
-        self.verify_and_get_user(session_id)
+        self.identity.require_user(session_id)
+        try:
+            now = datetime.utcnow()
+            question = self.question_store.mark_answered(ObjectId(question_id), now)
+            if question is None:
+                return False
+
+            self._after_answered(question.get('lectureKey'), [question['_id']], now)
+            return True
+        except Exception as e:
+            logger.error("Error marking question %s as answered: %s", question_id, e)
+            raise
+
+    def bulk_mark_answered(self, session_id, lecture_key, question_ids=None, scope=None):
+        """
+        Mark many questions of a lecture as answered with one update_many
+
+        Args:
+            session_id: User's session id (string)
+            lecture_key: Lecture Key (string)
+            question_ids: List of question IDs (strings), or None to use scope
+            scope: 'delivered' for every delivered question, 'all' for every
+                   question of the lecture
+
+        Returns:
+            Dictionary with per-ID outcomes ('answered', 'already_answered',
+            'not_found', 'invalid_id') and the number of updated questions,
+            or None if the lecture does not belong to the user
+        """
+        user = self.identity.require_user(session_id)
+        try:
+            if not self._owns_lecture(user, lecture_key):
+                return None
+
+            outcomes, targets = self._resolve_bulk_targets(
+                lecture_key, question_ids, scope, done_field='isAnswered', done_outcome='already_answered'
+            )
+
+            now = datetime.utcnow()
+            answered = []
+            if targets:
+                # Questions answered concurrently since they were resolved
+                # are reported as already answered
+                answered = self.question_store.set_flag_many(targets, 'isAnswered', now)
+                answered_ids = set(answered)
+                for target in targets:
+                    outcomes[str(target)] = 'answered' if target in answered_ids else 'already_answered'
+            if answered:
+                self._after_answered(lecture_key, answered, now)
+
+            logger.info("Bulk answered %s questions in lecture %s", len(answered), lecture_key)
+
+            return {'results': outcomes, 'updated': len(answered)}
+
+        except Exception as e:
+            logger.error("Error bulk answering questions in lecture %s: %s", lecture_key, e)
+            raise
+
+    def bulk_mark_delivered(self, session_id, lecture_key, question_ids=None, scope=None):
+        """
+        Mark many questions of a lecture as delivered with one update_many
+
+        Delivered questions are removed from the delivery queue without
+        starting the cooldown, e.g. when the lecturer dismisses them.
+
+        Args:
+            session_id: User's session id (string)
+            lecture_key: Lecture Key (string)
+            question_ids: List of question IDs (strings), or None to use scope
+            scope: 'all' for every undelivered question of the lecture
+
+        Returns:
+            Dictionary with per-ID outcomes ('delivered', 'already_delivered',
+            'not_found', 'invalid_id') and the number of updated questions,
+            or None if the lecture does not belong to the user
+        """
+        user = self.identity.require_user(session_id)
         try:
-            result = self.questions.update_one(
-                {'_id': ObjectId(question_id)},
-                {'$set': {'isAnswered': True}}
+            if not self._owns_lecture(user, lecture_key):
+                return None
+
+            outcomes, targets = self._resolve_bulk_targets(
+                lecture_key, question_ids, scope, done_field='isDelivered', done_outcome='already_delivered'
             )
-            return result.modified_count > 0
+
+            now = datetime.utcnow()
+            delivered = []
+            if targets:
+                delivered = self.question_store.set_flag_many(targets, 'isDelivered', now)
+                delivered_ids = set(delivered)
+                for target in targets:
+                    outcomes[str(target)] = 'delivered' if target in delivered_ids else 'already_delivered'
+                for question_id in delivered:
+                    self.question_queue.remove(lecture_key, question_id)
+                self.delivery_state.adjust_pending(lecture_key, -len(delivered))
+
+            logger.info("Bulk delivered %s questions in lecture %s", len(delivered), lecture_key)
+
+            return {'results': outcomes, 'updated': len(delivered)}
+
         except Exception as e:
-            logger.error(f"Error marking question {question_id} as answered: {str(e)}")
+            logger.error("Error bulk delivering questions in lecture %s: %s", lecture_key, e)
             raise
 
+    def _owns_lecture(self, user, lecture_key):
+        """Check that a lecture belongs to a user"""
+        return self.lectures.owns(lecture_key, user['_id'])
+
+    def _resolve_bulk_targets(self, lecture_key, question_ids, scope, done_field, done_outcome):
+        """
+        Work out which questions a bulk operation applies to
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_ids: List of question IDs (strings) or None
+            scope: Named filter used when question_ids is None
+            done_field: Boolean field the operation sets
+            done_outcome: Outcome reported for questions already done
+
+        Returns:
+            Tuple of (outcomes by ID for questions that are skipped,
+            list of ObjectIds to update)
+        """
+        outcomes = {}
+
+        if question_ids is None:
+            criteria = {done_field: False}
+            if scope == 'delivered':
+                criteria['isDelivered'] = True
+            elif scope != 'all':
+                raise ValueError(f"Invalid scope: {scope}")
+            targets = self.question_store.find_ids(lecture_key, criteria, self.MAX_BULK_QUESTIONS)
+            return outcomes, targets
+
+        if len(question_ids) > self.MAX_BULK_QUESTIONS:
+            raise ValueError(f"At most {self.MAX_BULK_QUESTIONS} questions per request")
+
+        object_ids = []
+        for question_id in question_ids:
+            if ObjectId.is_valid(question_id):
+                object_ids.append(ObjectId(question_id))
+            else:
+                outcomes[str(question_id)] = 'invalid_id'
+
+        found = self.question_store.find_by_ids(lecture_key, object_ids, [done_field])
+
+        targets = []
+        for object_id in object_ids:
+            question = found.get(object_id)
+            if question is None:
+                outcomes[str(object_id)] = 'not_found'
+            elif question.get(done_field):
+                outcomes[str(object_id)] = done_outcome
+            else:
+                targets.append(object_id)
+
+        return outcomes, targets
+
+    def _after_answered(self, lecture_key, question_ids, now):
+        """
+        Propagate answered questions to clusters, duplicates and streams
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_ids: ObjectIds of the questions just answered
+            now: Time of the answer
+        """
+        # Duplicates are answered together with their representative
+        self.question_store.answer_duplicates(question_ids, now)
+
+        # Later look-alikes start a new cluster instead of joining an answered one
+        if self.clusterer is not None:
+            for question_id in question_ids:
+                self.clusterer.remove(lecture_key, question_id)
+
+        ids = [str(question_id) for question_id in question_ids]
+        event = {'id': ids[0], 'ids': ids} if len(ids) == 1 else {'ids': ids}
+        self.notifier.publish(lecture_key, 'answered', event)
+
 
 
     def get_next_question_for_lecture(self, session_id, lecture_key):
@@ -383,55 +646,366 @@ class LectureService:
         """
         # Ensure the session is valid (also implicitly ensures that only
         # authorized lecturer can pull questions if you enforce that)
-        self.verify_and_get_user(session_id)
-
-        now = datetime.utcnow()
+        self.identity.require_user(session_id)
 
         try:
-            # 1) Find the last delivered question for this lecture
-            last_delivered = self.questions.find_one(
-                {
-                    'lectureKey': lecture_key,
-                    'isDelivered': True,
-                    'deliveredAt': {'$ne': None}
-                },
-                sort=[('deliveredAt', -1)]
+            question, _ = self._deliver_next_question(lecture_key)
+            return question
+
+        except Exception as e:
+            logger.error(
+                "Error fetching next question for lecture %s: %s", lecture_key, e
             )
+            raise
+
+    def wait_for_next_question(self, session_id, lecture_key, timeout):
+        """
+        Long-poll variant of get_next_question_for_lecture
+
+        Holds the caller until a question becomes deliverable, either because
+        a new one was created or because the cooldown window expired, or
+        until the timeout elapses.
+
+        Args:
+            session_id: User's session id (string)
+            lecture_key: Lecture Key (string)
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Delivered question document or None on timeout
+        """
+        steps = self.next_question_steps(session_id, lecture_key, timeout)
+        return next(self.notifier.follow(steps), None)
+
+    def next_question_steps(self, session_id, lecture_key, timeout):
+        """
+        Wait plan of wait_for_next_question
+
+        The session and timeout are checked right away; the returned plan
+        yields the delivered question, if any, once it is driven by
+        QuestionNotifier.follow (threads) or follow_async (event loop).
+
+        Args:
+            session_id: User's session id (string)
+            lecture_key: Lecture Key (string)
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Wait plan generator
+        """
+        self.identity.require_user(session_id)
+
+        timeout = float(timeout)
+        if not math.isfinite(timeout):
+            # NaN would make the deadline unreachable and hold the caller forever
+            raise ValueError(f"timeout must be finite, got {timeout}")
+        timeout = min(max(timeout, 0), self.long_poll_max_seconds)
+
+        return self._next_question_steps(lecture_key, time.monotonic() + timeout)
 
-            # 2) Enforce 30-second cooldown per lecture
-            if last_delivered is not None:
-                delivered_at = last_delivered.get('deliveredAt')
-                if delivered_at is not None:
-                    next_allowed_time = delivered_at + timedelta(seconds=self.QUESTION_COOLDOWN_SECONDS)
-                    if now < next_allowed_time:
-                        # Still in cooldown window: do not return any question
-                        return None
-
-            # 3) Atomically pick the oldest undelivered question and mark it delivered
-            #    This ensures each question can only be returned once.
-            next_question = self.questions.find_one_and_update(
-                {
-                    'lectureKey': lecture_key,
-                    'isDelivered': False
-                },
-                {
-                    '$set': {
-                        'isDelivered': True,
-                        'deliveredAt': now
-                    }
-                },
-                sort=[('createdAt', 1)],
-                return_document=True
+    def _next_question_steps(self, lecture_key, deadline):
+        """Generator backing next_question_steps"""
+        try:
+            while True:
+                # Read the version before querying so a question created
+                # between the query and the wait still wakes us up
+                seen_version = self.notifier.version(lecture_key)
+                question, retry_after = self._deliver_next_question(lecture_key)
+                if question is not None:
+                    yield question
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+
+                wait_seconds = remaining if retry_after is None else min(remaining, retry_after)
+                yield Wait(lecture_key, seen_version, wait_seconds)
+
+        except Exception as e:
+            logger.error(
+                "Error waiting for next question for lecture %s: %s", lecture_key, e
             )
+            raise
 
-            if not next_question:
-                # No undelivered questions exist
-                return None
+    def stream_lecture_events(self, session_id, lecture_key, last_event_id=None,
+                              heartbeat_seconds=15):
+        """
+        Follow the question feed of a lecture
+
+        Delivers questions with the same cooldown and single-delivery rules
+        as get_next_question_for_lecture and relays delivered, answered and
+        unanswered-count changes of the lecture.
+
+        Args:
+            session_id: User's session id (string)
+            lecture_key: Lecture Key (string)
+            last_event_id: ID of the last event the client received, used to
+                           replay retained events after a reconnect
+            heartbeat_seconds: Maximum idle time before a heartbeat is yielded
+
+        Returns:
+            Generator of (event_id, event, data) tuples, or None for heartbeats
+        """
+        steps = self.lecture_event_steps(session_id, lecture_key, last_event_id, heartbeat_seconds)
+        return self.notifier.follow(steps)
+
+    def lecture_event_steps(self, session_id, lecture_key, last_event_id=None,
+                            heartbeat_seconds=15):
+        """
+        Wait plan of stream_lecture_events
+
+        The session is checked right away; the returned plan yields the
+        items of stream_lecture_events once it is driven by
+        QuestionNotifier.follow (threads) or follow_async (event loop).
+
+        Returns:
+            Wait plan generator
+        """
+        self.identity.require_user(session_id)
+
+        if last_event_id is None:
+            last_event_id = self.notifier.last_event_id(lecture_key)
 
-            return StudentQuestion.to_json(next_question)
+        return self._lecture_event_steps(lecture_key, last_event_id, heartbeat_seconds)
+
+    def _lecture_event_steps(self, lecture_key, last_event_id, heartbeat_seconds):
+        """Generator backing lecture_event_steps"""
+        counted_version = None
+        last_count = None
+
+        try:
+            while True:
+                # Read the version before delivering so a question created
+                # while delivering still wakes us up (a delivery of our own
+                # only costs one more pass)
+                seen_version = self.notifier.version(lecture_key)
+                _, retry_after = self._deliver_next_question(lecture_key)
+
+                for event_id, event, data in self.notifier.events_since(lecture_key, last_event_id):
+                    last_event_id = event_id
+                    yield event_id, event, data
+
+                # Only recount when something happened to the lecture
+                if seen_version != counted_version:
+                    counted_version = seen_version
+                    count = self.question_store.count_unanswered([lecture_key])
+                    if count != last_count:
+                        last_count = count
+                        yield None, 'unanswered_count', {'count': count}
+
+                wait_seconds = heartbeat_seconds if retry_after is None else min(heartbeat_seconds, retry_after)
+                if (yield Wait(lecture_key, seen_version, wait_seconds)) == seen_version:
+                    yield None
 
         except Exception as e:
             logger.error(
-                f"Error fetching next question for lecture {lecture_key}: {str(e)}"
+                "Error streaming events for lecture %s: %s", lecture_key, e
             )
             raise
+
+    def _deliver_next_question(self, lecture_key):
+        """
+        Try to deliver the next question of a lecture
+
+        The cooldown and "nothing pending" cases are answered from the
+        in-process delivery state. Mongo is only consulted when a delivery is
+        possible, and the cooldown slot is claimed with a compare-and-set on
+        the lecture document so concurrent workers never deliver twice within
+        one cooldown window.
+
+        Args:
+            lecture_key: Lecture Key (string)
+
+        Returns:
+            Tuple of (question document or None, seconds until the cooldown
+            expires or None when no cooldown is active)
+        """
+        now = datetime.utcnow()
+        cooldown = timedelta(seconds=self.QUESTION_COOLDOWN_SECONDS)
+
+        state = self.delivery_state.get(lecture_key)
+        if state is None:
+            state = self._load_delivery_state(lecture_key)
+
+        # 1) Enforce 30-second cooldown per lecture without touching the database
+        last_delivered_at = state['lastDeliveredAt']
+        if last_delivered_at is not None and now < last_delivered_at + cooldown:
+            return None, (last_delivered_at + cooldown - now).total_seconds()
+
+        # 2) Skip the database while nothing is known to be pending
+        if state['pendingHint'] is None or self._pending_hint_expired(state):
+            pending = self.question_store.count_undelivered(lecture_key)
+            self.delivery_state.update(
+                lecture_key,
+                pendingHint=pending,
+                pendingCheckedAt=time.monotonic()
+            )
+            if pending == 0:
+                return None, None
+        elif state['pendingHint'] == 0:
+            return None, None
+
+        # 3) Claim the cooldown slot on the lecture document (compare-and-set)
+        claimed = self.lectures.claim_delivery_slot(lecture_key, now, now - cooldown)
+
+        if claimed is None:
+            # Another worker delivered inside the window (or the lecture is gone)
+            lecture = self.lectures.find_delivery_state(lecture_key)
+            if lecture is None:
+                self.delivery_state.update(lecture_key, pendingHint=0, pendingCheckedAt=time.monotonic())
+                return None, None
+
+            last_delivered_at = lecture.get('lastQuestionDeliveredAt')
+            self.delivery_state.update(lecture_key, lastDeliveredAt=last_delivered_at)
+            if last_delivered_at is None or now >= last_delivered_at + cooldown:
+                return None, None
+            return None, (last_delivered_at + cooldown - now).total_seconds()
+
+        # 4) Atomically pick the highest-priority question and mark it delivered
+        #    This ensures each question can only be returned once.
+        next_question = self._claim_next_question(lecture_key, now)
+
+        if not next_question:
+            # No undelivered questions exist: release the claimed slot
+            previous = claimed.get('lastQuestionDeliveredAt')
+            self.lectures.release_delivery_slot(lecture_key, now, previous)
+            self.delivery_state.update(
+                lecture_key,
+                lastDeliveredAt=previous,
+                pendingHint=0,
+                pendingCheckedAt=time.monotonic()
+            )
+            return None, None
+
+        self.delivery_state.update(lecture_key, lastDeliveredAt=now)
+        self.delivery_state.adjust_pending(lecture_key, -1)
+
+        question = StudentQuestion.to_json(next_question)
+
+        # Let every stream following this lecture see the delivery
+        self.notifier.publish(lecture_key, 'question', question)
+        delivery_logger.info("Delivered question %s in lecture %s", question['id'], lecture_key)
+
+        return question, None
+
+    def _claim_next_question(self, lecture_key, now):
+        """
+        Mark the highest-priority undelivered question of a lecture delivered
+
+        Candidates come from the in-memory priority queue; a candidate that
+        another worker delivered in the meantime is dropped and the next one
+        is tried. The database sort on the priority index is the fallback.
+
+        Args:
+            lecture_key: Lecture Key (string)
+            now: Delivery time
+
+        Returns:
+            The delivered question document or None
+        """
+        if self.question_queue.needs_load(lecture_key):
+            self._load_question_queue(lecture_key)
+
+        for _ in range(self.QUEUE_CLAIM_ATTEMPTS):
+            candidate_id = self.question_queue.peek(lecture_key)
+            if candidate_id is None:
+                break
+
+            question = self.question_store.claim(lecture_key, now, question_id=candidate_id)
+            self.question_queue.remove(lecture_key, candidate_id)
+            if question is not None:
+                return question
+
+        question = self.question_store.claim(lecture_key, now)
+        if question is not None:
+            self.question_queue.remove(lecture_key, question['_id'])
+        return question
+
+    def _load_question_queue(self, lecture_key):
+        """
+        Load the priority queue of a lecture from the database
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        pending = self.question_store.find_undelivered(lecture_key, self.QUEUE_LOAD_LIMIT)
+
+        self.question_queue.load(lecture_key, (
+            (
+                question['_id'],
+                question['priority'] if 'priority' in question
+                else StudentQuestion.priority(0, question['createdAt'])
+            )
+            for question in pending
+        ))
+
+    def upvote_question(self, lecture_key, question_id, voter):
+        """
+        Upvote a question that has not been delivered yet
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_id: Question ID (string)
+            voter: Fingerprint of the voting client; one vote each
+
+        Returns:
+            New number of upvotes or None if the question is not pending
+
+        Raises:
+            DuplicateVote: If the voter already voted for the question
+        """
+        try:
+            now = datetime.utcnow()
+            question_id = ObjectId(question_id)
+            question = self.question_store.upvote(lecture_key, question_id, voter, now)
+            if question is None:
+                # Only read back on a refused vote, to tell a repeat from a miss
+                existing = self.question_store.find_by_ids(
+                    lecture_key, [question_id], ['isDelivered', 'voters']
+                ).get(question_id)
+                if existing is not None and not existing.get('isDelivered') \
+                        and voter in (existing.get('voters') or []):
+                    raise DuplicateVote(str(question_id))
+                return None
+
+            if question.get('isDuplicate'):
+                # Votes on a duplicate count for its representative
+                representative = self.question_store.bump_priority(question['clusterId'], now)
+                if representative is not None and not representative.get('isDelivered'):
+                    self.question_queue.push(lecture_key, representative['_id'], representative['priority'])
+            else:
+                self.question_queue.push(lecture_key, question['_id'], question['priority'])
+
+            return question['upvotes']
+
+        except DuplicateVote:
+            raise
+        except Exception as e:
+            logger.error("Error upvoting question %s: %s", question_id, e)
+            raise
+
+    def _load_delivery_state(self, lecture_key):
+        """
+        Seed the delivery state of a lecture from the database
+
+        Args:
+            lecture_key: Lecture Key (string)
+
+        Returns:
+            The seeded state dictionary
+        """
+        lecture = self.lectures.find_delivery_state(lecture_key)
+        last_delivered_at = lecture.get('lastQuestionDeliveredAt') if lecture else None
+
+        if lecture is not None and 'lastQuestionDeliveredAt' not in lecture:
+            # Lectures created before the field existed: fall back to the questions
+            last_delivered_at = self.question_store.last_delivered_at(lecture_key)
+
+        self.delivery_state.update(lecture_key, lastDeliveredAt=last_delivered_at)
+        return self.delivery_state.get(lecture_key)
+
+    def _pending_hint_expired(self, state):
+        """Check whether a pending hint is too old to be trusted"""
+        checked_at = state['pendingCheckedAt']
+        return checked_at is None or time.monotonic() - checked_at > self.PENDING_HINT_TTL_SECONDS
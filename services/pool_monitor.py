@@ -0,0 +1,113 @@
+"""
+Pool Monitor
+Connection pool listener measuring checkout wait and connection churn
+"""
+import threading
+import time
+
+from pymongo import monitoring
+
+# Upper bounds (ms) of the checkout wait histogram
+CHECKOUT_WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts pool events of one MongoClient (register via event_listeners)"""
+
+    def __init__(self):
+        """Initialize pool monitor"""
+        self._lock = threading.Lock()
+        # Checkout started and completed are published on the requesting thread
+        self._pending = threading.local()
+        self._checkouts = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._wait_buckets = [0] * (len(CHECKOUT_WAIT_BUCKETS_MS) + 1)
+        self._checkout_failures = {}
+        self._checked_out = 0
+        self._open = 0
+        self._created = 0
+        self._closed = {}
+        self._cleared = 0
+
+    def connection_check_out_started(self, event):
+        self._pending.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._pending, 'started', None)
+        self._pending.started = None
+        wait_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        bucket = len(CHECKOUT_WAIT_BUCKETS_MS)
+        for index, bound in enumerate(CHECKOUT_WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                bucket = index
+                break
+        with self._lock:
+            self._checkouts += 1
+            self._checked_out += 1
+            self._wait_total_ms += wait_ms
+            self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+            self._wait_buckets[bucket] += 1
+
+    def connection_check_out_failed(self, event):
+        self._pending.started = None
+        with self._lock:
+            self._checkout_failures[event.reason] = self._checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._checked_out = max(self._checked_out - 1, 0)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._created += 1
+            self._open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._open = max(self._open - 1, 0)
+            self._closed[event.reason] = self._closed.get(event.reason, 0) + 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self):
+        """
+        Get pool counters
+
+        Returns:
+            Dictionary with checkout counts, wait time (mean, max and a
+            histogram keyed by upper bound in ms), failures by reason, open
+            and checked-out connections, created and closed (by reason)
+            totals, and how often the pool was cleared
+        """
+        with self._lock:
+            buckets = {f'le{bound}': count for bound, count in zip(CHECKOUT_WAIT_BUCKETS_MS, self._wait_buckets)}
+            buckets['inf'] = self._wait_buckets[-1]
+            return {
+                'checkouts': self._checkouts,
+                'checkoutWaitMs': {
+                    'mean': round(self._wait_total_ms / self._checkouts, 3) if self._checkouts else 0.0,
+                    'max': round(self._wait_max_ms, 3),
+                    'buckets': buckets
+                },
+                'checkoutFailures': dict(self._checkout_failures),
+                'checkedOut': self._checked_out,
+                'open': self._open,
+                'created': self._created,
+                'closed': dict(self._closed),
+                'cleared': self._cleared
+            }
@@ -0,0 +1,255 @@
+"""
+Question Clustering
+Incremental near-duplicate detection for student questions using MinHash/LSH
+"""
+from collections import OrderedDict
+import random
+import re
+import threading
+import zlib
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD = re.compile(r'[^a-z0-9\s]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_question(text):
+    """Lowercase a question and strip punctuation and repeated whitespace"""
+    text = _NON_WORD.sub(' ', (text or '').lower())
+    return _SPACES.sub(' ', text).strip()
+
+
+class MinHasher:
+    """Computes fixed-size MinHash signatures over character shingles"""
+
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        """
+        Initialize MinHasher
+
+        Args:
+            num_perm: Number of hash permutations (signature length)
+            shingle_size: Number of characters per shingle
+            seed: Seed of the permutation parameters
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = random.Random(seed)
+        self._permutations = [
+            (generator.randrange(1, _MERSENNE_PRIME), generator.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def shingles(self, text):
+        """Get the set of hashed character shingles of a normalized text"""
+        size = self.shingle_size
+        if len(text) <= size:
+            return {zlib.crc32(text.encode('utf-8'))}
+        return {
+            zlib.crc32(text[i:i + size].encode('utf-8'))
+            for i in range(len(text) - size + 1)
+        }
+
+    def signature(self, text):
+        """
+        Compute the MinHash signature of a normalized text
+
+        Args:
+            text: Normalized question text
+
+        Returns:
+            Tuple of num_perm integers
+        """
+        hashes = self.shingles(text)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._permutations
+        )
+
+
+def estimate_similarity(first, second):
+    """Estimate the Jaccard similarity of two MinHash signatures"""
+    matches = sum(1 for x, y in zip(first, second) if x == y)
+    return matches / len(first)
+
+
+class LectureClusterIndex:
+    """
+    LSH index over the cluster representatives of one lecture.
+
+    Representatives are kept in insertion order and the oldest one is evicted
+    once max_clusters is reached, which bounds memory per lecture.
+    """
+
+    def __init__(self, bands, rows, max_clusters):
+        self.bands = bands
+        self.rows = rows
+        self.max_clusters = max_clusters
+        self.signatures = OrderedDict()
+        self.buckets = {}
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, hash(signature[start:start + self.rows])
+
+    def candidates(self, signature):
+        """Get representative IDs sharing at least one band with signature"""
+        found = set()
+        for key in self._band_keys(signature):
+            found.update(self.buckets.get(key, ()))
+        return found
+
+    def add(self, question_id, signature):
+        """Index a new cluster representative"""
+        if question_id in self.signatures:
+            return
+        while len(self.signatures) >= self.max_clusters:
+            oldest_id, oldest_signature = self.signatures.popitem(last=False)
+            self._unbucket(oldest_id, oldest_signature)
+        self.signatures[question_id] = signature
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(question_id)
+
+    def remove(self, question_id):
+        """Drop a representative from the index"""
+        signature = self.signatures.pop(question_id, None)
+        if signature is not None:
+            self._unbucket(question_id, signature)
+
+    def _unbucket(self, question_id, signature):
+        for key in self._band_keys(signature):
+            members = self.buckets.get(key)
+            if members is not None:
+                members.discard(question_id)
+                if not members:
+                    del self.buckets[key]
+
+
+class QuestionClusterer:
+    """
+    Per-lecture MinHash/LSH indexes of open question clusters.
+
+    With b bands of r rows, two questions become candidates with probability
+    1 - (1 - s^r)^b for Jaccard similarity s; candidates are then confirmed
+    against the similarity threshold. Indexes are kept for at most
+    max_lectures lectures, least recently used first out, and can be rebuilt
+    from the stored questions after a restart.
+    """
+
+    def __init__(self, threshold=0.6, num_perm=64, bands=16, max_clusters=500,
+                 max_lectures=200):
+        """
+        Initialize question clusterer
+
+        Args:
+            threshold: Minimum estimated similarity to join a cluster
+            num_perm: MinHash signature length, must be divisible by bands
+            bands: Number of LSH bands
+            max_clusters: Maximum number of representatives per lecture
+            max_lectures: Maximum number of lecture indexes kept in memory
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_clusters = max_clusters
+        self.max_lectures = max_lectures
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def signature(self, text):
+        """Compute the signature of a raw question text"""
+        return self.hasher.signature(normalize_question(text))
+
+    def is_loaded(self, lecture_key):
+        """Check whether a lecture index is in memory"""
+        with self._lock:
+            return lecture_key in self._indexes
+
+    def match(self, lecture_key, signature):
+        """
+        Find the cluster a question belongs to
+
+        Args:
+            lecture_key: Lecture Key (string)
+            signature: MinHash signature of the question
+
+        Returns:
+            Representative question ID of the best matching cluster, or None
+        """
+        with self._lock:
+            index = self._index(lecture_key)
+            best_id, best_score = None, self.threshold
+            for candidate_id in index.candidates(signature):
+                score = estimate_similarity(signature, index.signatures[candidate_id])
+                if score >= best_score:
+                    best_id, best_score = candidate_id, score
+            return best_id
+
+    def add(self, lecture_key, question_id, signature):
+        """
+        Register a question as the representative of a new cluster
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_id: ID of the representative question
+            signature: MinHash signature of the question
+        """
+        with self._lock:
+            self._index(lecture_key).add(question_id, signature)
+
+    def remove(self, lecture_key, question_id):
+        """
+        Close the cluster of a representative, e.g. once it is answered
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_id: ID of the representative question
+        """
+        with self._lock:
+            index = self._indexes.get(lecture_key)
+            if index is not None:
+                index.remove(question_id)
+
+    def rebuild(self, lecture_key, questions):
+        """
+        Replace a lecture index with the given representatives
+
+        Args:
+            lecture_key: Lecture Key (string)
+            questions: Iterable of question documents, oldest first
+        """
+        index = LectureClusterIndex(self.bands, self.rows, self.max_clusters)
+        for question in questions:
+            index.add(question['_id'], self.signature(question.get('question')))
+
+        with self._lock:
+            self._indexes[lecture_key] = index
+            self._indexes.move_to_end(lecture_key)
+            self._evict()
+
+    def discard(self, lecture_key):
+        """Forget the index of a lecture"""
+        with self._lock:
+            self._indexes.pop(lecture_key, None)
+
+    def _index(self, lecture_key):
+        """Get or create a lecture index (caller holds the lock)"""
+        index = self._indexes.get(lecture_key)
+        if index is None:
+            index = self._indexes[lecture_key] = LectureClusterIndex(
+                self.bands, self.rows, self.max_clusters
+            )
+            self._evict()
+        self._indexes.move_to_end(lecture_key)
+        return index
+
+    def _evict(self):
+        """Drop least recently used lecture indexes (caller holds the lock)"""
+        while len(self._indexes) > self.max_lectures:
+            self._indexes.popitem(last=False)
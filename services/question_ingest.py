@@ -0,0 +1,185 @@
+"""
+Question Ingest Buffer
+Coalesces concurrent student question inserts into insert_many batches
+"""
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBufferFull(Exception):
+    """Raised when the ingest buffer cannot accept a document in time"""
+
+
+class _PendingInsert:
+    """A document waiting for its batch to be written"""
+
+    __slots__ = ('document', 'done', 'error')
+
+    def __init__(self, document):
+        self.document = document
+        self.done = threading.Event()
+        self.error = None
+
+
+class QuestionIngestBuffer:
+    """
+    Write-coalescing buffer in front of a collection.
+
+    Callers block in submit() until the batch holding their document has been
+    acknowledged by the database. A background thread flushes the buffer when
+    it holds max_batch documents or its oldest document waited max_delay_ms.
+    When max_pending documents are queued, submit() waits for room and gives
+    up with IngestBufferFull after submit_timeout seconds.
+    """
+
+    def __init__(self, collection, max_batch=100, max_delay_ms=5, max_pending=1000,
+                 submit_timeout=1.0):
+        """
+        Initialize ingest buffer
+
+        Args:
+            collection: PyMongo collection or question store to insert into
+            max_batch: Maximum number of documents per insert_many
+            max_delay_ms: Maximum time a document waits before a flush
+            max_pending: Maximum number of queued documents (backpressure)
+            submit_timeout: Seconds submit() waits for room in a full buffer
+        """
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+
+        self._condition = threading.Condition()
+        self._queue = []
+        self._oldest_at = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        self._batches = 0
+        self._documents = 0
+        self._rejected = 0
+
+    def submit(self, document):
+        """
+        Queue a document and wait until it is durable
+
+        Args:
+            document: Document to insert; an _id is assigned if missing
+
+        Returns:
+            The inserted document ID
+
+        Raises:
+            IngestBufferFull: The buffer stayed full for submit_timeout seconds
+            Exception: The write of the batch holding the document failed
+        """
+        document.setdefault('_id', ObjectId())
+        pending = _PendingInsert(document)
+
+        with self._condition:
+            self._ensure_flusher()
+
+            deadline = time.monotonic() + self.submit_timeout
+            while len(self._queue) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._rejected += 1
+                    raise IngestBufferFull('Question ingest buffer is full')
+                self._condition.wait(remaining)
+
+            if not self._queue:
+                self._oldest_at = time.monotonic()
+            self._queue.append(pending)
+            self._condition.notify_all()
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return document['_id']
+
+    def stats(self):
+        """
+        Get buffer counters
+
+        Returns:
+            Dictionary with queued, batches, documents and rejected counts
+        """
+        with self._condition:
+            return {
+                'queued': len(self._queue),
+                'batches': self._batches,
+                'documents': self._documents,
+                'rejected': self._rejected
+            }
+
+    def close(self):
+        """Flush the remaining documents and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _ensure_flusher(self):
+        """Start the flush thread, again after a fork (caller holds the lock)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='question-ingest-flusher',
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        """Background loop taking batches off the queue"""
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue and self._closed:
+                    return
+
+                # Give the batch a chance to fill up
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = self._oldest_at + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+                self._oldest_at = time.monotonic() if self._queue else None
+                self._condition.notify_all()
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        """Write one batch and release its submitters"""
+        try:
+            self.collection.insert_many([item.document for item in batch], ordered=False)
+        except BulkWriteError as e:
+            # Only the failed documents get an error, the rest were written
+            for write_error in e.details.get('writeErrors', []):
+                batch[write_error['index']].error = Exception(write_error.get('errmsg', 'Write failed'))
+        except Exception as e:
+            logger.error("Error flushing question batch of %s: %s", len(batch), e)
+            for item in batch:
+                item.error = e
+
+        with self._condition:
+            self._batches += 1
+            self._documents += len(batch)
+
+        for item in batch:
+            item.done.set()
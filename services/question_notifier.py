@@ -0,0 +1,334 @@
+"""
+Question Notifier
+In-process wakeup mechanism and event log for lecturers following questions
+"""
+from collections import OrderedDict, deque, namedtuple
+import asyncio
+import threading
+import time
+
+
+class Wait(namedtuple('Wait', ['lecture_key', 'seen_version', 'timeout'])):
+    """
+    Step of a wait plan: suspend until the lecture moves past seen_version
+
+    The driver sends the lecture version after the wait back into the plan.
+    """
+    __slots__ = ()
+
+
+class QuestionNotifier:
+    """
+    Per-lecture change counters guarded by a single condition variable.
+
+    Waiters remember the version they last saw and sleep until the version
+    for their lecture moves on or their timeout expires. Published events are
+    kept in a bounded per-lecture backlog so event streams can resume from a
+    Last-Event-ID. Notifications are only visible inside the current process.
+
+    State is kept for at most max_lectures lectures, least recently used
+    first out. Versions come from one process-wide sequence, so a lecture
+    that is evicted or discarded and notified again never returns to a
+    version a waiter has already seen.
+    """
+    EVENT_BACKLOG = 100
+    MAX_LECTURES = 1000
+
+    def __init__(self, event_backlog=None, max_lectures=None):
+        self._condition = threading.Condition()
+        self._versions = OrderedDict()
+        self._events = {}
+        self._sequence = 0
+        self._last_event_id = 0
+        self._event_backlog = event_backlog or self.EVENT_BACKLOG
+        self._max_lectures = max_lectures or self.MAX_LECTURES
+
+    def version(self, lecture_key):
+        """
+        Get the current change version of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+
+        Returns:
+            Integer version, 0 if the lecture was never notified
+        """
+        with self._condition:
+            return self._versions.get(lecture_key, 0)
+
+    def notify(self, lecture_key):
+        """
+        Wake every waiter of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        with self._condition:
+            self._bump(lecture_key)
+            self._condition.notify_all()
+
+    def discard(self, lecture_key):
+        """
+        Forget the versions and events of a lecture, e.g. once it is deleted
+
+        Waiters of the lecture are woken and see version 0.
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        with self._condition:
+            self._versions.pop(lecture_key, None)
+            self._events.pop(lecture_key, None)
+            self._condition.notify_all()
+
+    def _bump(self, lecture_key):
+        """Move a lecture to a new version (caller holds the condition)"""
+        self._sequence += 1
+        self._versions[lecture_key] = self._sequence
+        self._versions.move_to_end(lecture_key)
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently changed lectures (caller holds the condition)"""
+        while len(self._versions) > self._max_lectures:
+            lecture_key, _ = self._versions.popitem(last=False)
+            self._events.pop(lecture_key, None)
+
+    def wait(self, lecture_key, seen_version, timeout):
+        """
+        Block until the lecture changes past seen_version or timeout expires
+
+        Args:
+            lecture_key: Lecture Key (string)
+            seen_version: Version the caller has already handled
+            timeout: Maximum number of seconds to block
+
+        Returns:
+            The current version of the lecture
+        """
+        deadline = time.monotonic() + max(timeout, 0)
+        with self._condition:
+            while self._versions.get(lecture_key, 0) == seen_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._versions.get(lecture_key, 0)
+
+    def publish(self, lecture_key, event, data):
+        """
+        Append an event to the lecture backlog and wake every waiter
+
+        Args:
+            lecture_key: Lecture Key (string)
+            event: Event name (string)
+            data: JSON-serializable event payload
+
+        Returns:
+            Integer ID assigned to the event
+        """
+        with self._condition:
+            self._last_event_id += 1
+            backlog = self._events.get(lecture_key)
+            if backlog is None:
+                backlog = self._events[lecture_key] = deque(maxlen=self._event_backlog)
+            backlog.append((self._last_event_id, event, data))
+            self._bump(lecture_key)
+            self._condition.notify_all()
+            return self._last_event_id
+
+    def last_event_id(self, lecture_key):
+        """
+        Get the ID of the newest event published for a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+
+        Returns:
+            Integer event ID, 0 if nothing was published
+        """
+        with self._condition:
+            backlog = self._events.get(lecture_key)
+            return backlog[-1][0] if backlog else 0
+
+    def events_since(self, lecture_key, last_event_id):
+        """
+        Get the retained events of a lecture newer than last_event_id
+
+        Args:
+            lecture_key: Lecture Key (string)
+            last_event_id: ID of the last event the caller has seen
+
+        Returns:
+            List of (event_id, event, data) tuples, oldest first
+        """
+        with self._condition:
+            backlog = self._events.get(lecture_key, ())
+            return [item for item in backlog if item[0] > last_event_id]
+
+    def follow(self, steps):
+        """
+        Run a wait plan on the calling thread
+
+        A wait plan is a generator yielding Wait steps and items for the
+        caller. It never blocks itself: the driver waits, here on the
+        condition and in AsyncQuestionNotifier.follow_async on the event
+        loop, so both serving modes run the same plan.
+
+        Args:
+            steps: Wait plan generator
+
+        Returns:
+            Generator of the plan's items
+        """
+        try:
+            item = next(steps)
+            while True:
+                if isinstance(item, Wait):
+                    item = steps.send(self.wait(*item))
+                else:
+                    yield item
+                    item = next(steps)
+        except StopIteration:
+            return
+        finally:
+            steps.close()
+
+
+class AsyncQuestionNotifier(QuestionNotifier):
+    """
+    QuestionNotifier whose waiters can also be asyncio tasks.
+
+    An idle task waiter is a single future parked on its lecture, so one
+    event loop can hold thousands of long-polls and event streams while the
+    services keep running on worker threads. notify() and publish() may be
+    called from any thread; they hand the wakeup to the waiter's loop.
+    """
+
+    def __init__(self, event_backlog=None, max_lectures=None):
+        super().__init__(event_backlog, max_lectures)
+        self._waiters = {}
+
+    def notify(self, lecture_key):
+        """
+        Wake every waiter of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        with self._condition:
+            super().notify(lecture_key)
+            self._wake(lecture_key)
+
+    def publish(self, lecture_key, event, data):
+        """
+        Append an event to the lecture backlog and wake every waiter
+
+        Returns:
+            Integer ID assigned to the event
+        """
+        with self._condition:
+            event_id = super().publish(lecture_key, event, data)
+            self._wake(lecture_key)
+            return event_id
+
+    def discard(self, lecture_key):
+        """
+        Forget the versions and events of a lecture and wake its waiters
+
+        Args:
+            lecture_key: Lecture Key (string)
+        """
+        with self._condition:
+            super().discard(lecture_key)
+            self._wake(lecture_key)
+
+    def _wake(self, lecture_key):
+        """Resolve the task waiters of a lecture (caller holds the condition)"""
+        for loop, future in self._waiters.pop(lecture_key, ()):
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait_async(self, lecture_key, seen_version, timeout):
+        """
+        Suspend until the lecture changes past seen_version or timeout expires
+
+        Args:
+            lecture_key: Lecture Key (string)
+            seen_version: Version the caller has already handled
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The current version of the lecture
+        """
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            version = self._versions.get(lecture_key, 0)
+            if version != seen_version or timeout <= 0:
+                return version
+            # Registered under the condition, so a notify() racing with
+            # this call either moved the version or finds the waiter
+            waiter = (loop, loop.create_future())
+            self._waiters.setdefault(lecture_key, set()).add(waiter)
+        try:
+            await asyncio.wait((waiter[1],), timeout=timeout)
+        finally:
+            with self._condition:
+                waiters = self._waiters.get(lecture_key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[lecture_key]
+        return self.version(lecture_key)
+
+    async def follow_async(self, steps):
+        """
+        Run a wait plan with its waits on the event loop
+
+        The plan's own steps (database reads and deliveries) run on executor
+        threads; between them the task is suspended in wait_async, so an
+        idle follower holds no thread.
+
+        Args:
+            steps: Wait plan generator, see QuestionNotifier.follow
+
+        Returns:
+            Async generator of the plan's items
+        """
+        try:
+            item = await asyncio.to_thread(_advance, steps, None)
+            while item is not _FINISHED:
+                if isinstance(item, Wait):
+                    version = await self.wait_async(*item)
+                    item = await asyncio.to_thread(_advance, steps, version)
+                else:
+                    yield item
+                    item = await asyncio.to_thread(_advance, steps, None)
+        finally:
+            try:
+                steps.close()
+            except ValueError:
+                # Cancelled while a step still runs on its thread; the plan
+                # is closed when it is collected
+                pass
+
+    def waiting(self):
+        """Number of suspended task waiters"""
+        with self._condition:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+_FINISHED = object()
+
+
+def _advance(steps, value):
+    """Send value into a wait plan, _FINISHED once it is exhausted"""
+    # StopIteration cannot travel through an executor future
+    try:
+        return steps.send(value)
+    except StopIteration:
+        return _FINISHED
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
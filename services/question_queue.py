@@ -0,0 +1,137 @@
+"""
+Question Queue
+Per-lecture priority heaps of questions awaiting delivery
+"""
+from collections import OrderedDict
+import heapq
+import itertools
+import threading
+import time
+
+
+class _LectureHeap:
+    """Max-heap of one lecture with lazy invalidation of outdated entries"""
+
+    __slots__ = ('heap', 'priorities', 'loaded_at')
+
+    def __init__(self):
+        self.heap = []
+        self.priorities = {}
+        self.loaded_at = time.monotonic()
+
+
+class QuestionPriorityQueue:
+    """
+    Highest-priority-first queues of undelivered questions, one per lecture.
+
+    A priority change pushes a new heap entry and leaves the old one behind;
+    outdated entries are skipped when they reach the top, which keeps push,
+    update and pop at O(log n). The queues mirror the priority field of the
+    stored questions and are reloaded from the database after refresh_seconds
+    so changes made by other workers are picked up.
+    """
+
+    def __init__(self, refresh_seconds=60, max_lectures=500):
+        """
+        Initialize priority queue
+
+        Args:
+            refresh_seconds: Age after which a lecture queue is reloaded
+            max_lectures: Maximum number of lecture queues kept in memory
+        """
+        self.refresh_seconds = refresh_seconds
+        self.max_lectures = max_lectures
+        self._lock = threading.Lock()
+        self._lectures = OrderedDict()
+        self._sequence = itertools.count()
+
+    def needs_load(self, lecture_key):
+        """Check whether a lecture queue is missing or due for a reload"""
+        with self._lock:
+            lecture = self._lectures.get(lecture_key)
+            return lecture is None or time.monotonic() - lecture.loaded_at > self.refresh_seconds
+
+    def load(self, lecture_key, entries):
+        """
+        Replace a lecture queue
+
+        Args:
+            lecture_key: Lecture Key (string)
+            entries: Iterable of (question_id, priority) pairs
+        """
+        lecture = _LectureHeap()
+        for question_id, priority in entries:
+            lecture.priorities[question_id] = priority
+            lecture.heap.append((-priority, next(self._sequence), question_id))
+        heapq.heapify(lecture.heap)
+
+        with self._lock:
+            self._lectures[lecture_key] = lecture
+            self._lectures.move_to_end(lecture_key)
+            while len(self._lectures) > self.max_lectures:
+                self._lectures.popitem(last=False)
+
+    def push(self, lecture_key, question_id, priority):
+        """
+        Add a question or change its priority
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_id: Question ID
+            priority: New priority of the question
+        """
+        with self._lock:
+            lecture = self._lectures.get(lecture_key)
+            if lecture is None:
+                # Not loaded yet: the next load reads it from the database
+                return
+            lecture.priorities[question_id] = priority
+            heapq.heappush(lecture.heap, (-priority, next(self._sequence), question_id))
+
+            # Compact once outdated entries dominate the heap
+            if len(lecture.heap) > 2 * len(lecture.priorities) + 64:
+                lecture.heap = [
+                    entry for entry in lecture.heap
+                    if lecture.priorities.get(entry[2]) == -entry[0]
+                ]
+                heapq.heapify(lecture.heap)
+
+    def peek(self, lecture_key):
+        """
+        Get the highest-priority question of a lecture
+
+        Args:
+            lecture_key: Lecture Key (string)
+
+        Returns:
+            Question ID or None if the queue is empty or not loaded
+        """
+        with self._lock:
+            lecture = self._lectures.get(lecture_key)
+            if lecture is None:
+                return None
+            heap = lecture.heap
+            while heap:
+                negative_priority, _, question_id = heap[0]
+                if lecture.priorities.get(question_id) == -negative_priority:
+                    return question_id
+                heapq.heappop(heap)
+            return None
+
+    def remove(self, lecture_key, question_id):
+        """
+        Drop a question, e.g. once it is delivered
+
+        Args:
+            lecture_key: Lecture Key (string)
+            question_id: Question ID
+        """
+        with self._lock:
+            lecture = self._lectures.get(lecture_key)
+            if lecture is not None:
+                lecture.priorities.pop(question_id, None)
+
+    def discard(self, lecture_key):
+        """Forget the queue of a lecture"""
+        with self._lock:
+            self._lectures.pop(lecture_key, None)
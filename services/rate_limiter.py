@@ -0,0 +1,151 @@
+"""
+Rate Limiter
+Token-bucket admission control for anonymous question submission
+"""
+import threading
+import time
+
+
+class InMemoryBucketStore:
+    """
+    Token buckets held in process memory.
+
+    A shared backend for multi-worker deployments (for example Redis with a
+    Lua script) can replace this class by implementing consume() with the
+    same all-or-nothing semantics.
+    """
+    MAX_BUCKETS = 100000
+
+    def __init__(self, max_buckets=None):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.max_buckets = max_buckets or self.MAX_BUCKETS
+
+    def consume(self, limits, now=None):
+        """
+        Take one token from every bucket, or from none of them
+
+        Args:
+            limits: List of (key, rate per second, capacity) tuples
+            now: Monotonic timestamp, defaults to time.monotonic()
+
+        Returns:
+            Tuple of (allowed, index of the first exhausted limit or None,
+            seconds until that limit has a token again)
+        """
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            levels = []
+            for index, (key, rate, capacity) in enumerate(limits):
+                tokens, updated_at = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated_at) * rate)
+                if tokens < 1:
+                    return False, index, (1 - tokens) / rate
+                levels.append((key, tokens))
+
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1, now)
+
+            if len(self._buckets) > self.max_buckets:
+                self._prune(now, limits)
+
+            return True, None, 0
+
+    def _prune(self, now, limits):
+        """Drop buckets idle long enough to be full again (caller holds the lock)"""
+        slowest_refill = max(capacity / rate for _, rate, capacity in limits)
+        for key, (_, updated_at) in list(self._buckets.items()):
+            if now - updated_at > slowest_refill:
+                del self._buckets[key]
+
+
+class QuestionRateLimiter:
+    """
+    Admission control for question submissions and upvotes.
+
+    Each submission needs a token from the client bucket (lecture key plus
+    client fingerprint), the lecture bucket and the global bucket. Upvotes
+    have buckets and limits of their own, so voting cannot use up the
+    submission budget.
+    """
+    # Bucket key prefix per action
+    ACTIONS = {'question': 'q', 'vote': 'v'}
+
+    def __init__(self, store=None, client_rate=1, client_burst=10,
+                 lecture_rate=20, lecture_burst=100, global_rate=200, global_burst=500,
+                 vote_client_rate=2, vote_client_burst=20, vote_lecture_rate=50,
+                 vote_lecture_burst=200, vote_global_rate=500, vote_global_burst=1000):
+        """
+        Initialize rate limiter
+
+        Args:
+            store: Bucket store, defaults to InMemoryBucketStore
+            client_rate: Tokens per second per client and lecture
+            client_burst: Bucket capacity per client and lecture
+            lecture_rate: Tokens per second per lecture
+            lecture_burst: Bucket capacity per lecture
+            global_rate: Tokens per second across all lectures
+            global_burst: Global bucket capacity
+            vote_*: The same limits for upvotes
+        """
+        self.store = store or InMemoryBucketStore()
+        self.limits = {
+            'question': ((client_rate, client_burst), (lecture_rate, lecture_burst), (global_rate, global_burst)),
+            'vote': (
+                (vote_client_rate, vote_client_burst),
+                (vote_lecture_rate, vote_lecture_burst),
+                (vote_global_rate, vote_global_burst)
+            )
+        }
+
+        self._lock = threading.Lock()
+        self._admitted = {action: 0 for action in self.ACTIONS}
+        self._shed = {action: {'client': 0, 'lecture': 0, 'global': 0} for action in self.ACTIONS}
+
+    def check(self, lecture_key, fingerprint, action='question'):
+        """
+        Decide whether a question submission or upvote may proceed
+
+        Args:
+            lecture_key: Lecture Key (string)
+            fingerprint: Stable identifier of the client
+            action: 'question' or 'vote'
+
+        Returns:
+            Tuple of (allowed, seconds to wait before retrying)
+        """
+        scopes = ('client', 'lecture', 'global')
+        prefix = self.ACTIONS[action]
+        client_limit, lecture_limit, global_limit = self.limits[action]
+        allowed, exhausted, retry_after = self.store.consume([
+            (f"{prefix}:c:{lecture_key}:{fingerprint}", *client_limit),
+            (f"{prefix}:l:{lecture_key}", *lecture_limit),
+            (f"{prefix}:g", *global_limit)
+        ])
+
+        with self._lock:
+            if allowed:
+                self._admitted[action] += 1
+            else:
+                self._shed[action][scopes[exhausted]] += 1
+
+        return allowed, retry_after
+
+    def stats(self):
+        """
+        Get admission counters
+
+        Returns:
+            Dictionary with admitted and shed counts per scope for
+            submissions, and the same under votes for upvotes
+        """
+        with self._lock:
+            return {
+                'admitted': self._admitted['question'],
+                'shed': dict(self._shed['question']),
+                'votes': {
+                    'admitted': self._admitted['vote'],
+                    'shed': dict(self._shed['vote'])
+                }
+            }
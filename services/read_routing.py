@@ -0,0 +1,89 @@
+"""
+Read Routing
+Sends designated read-only queries to replica set secondaries
+"""
+from contextlib import contextmanager, nullcontext
+import threading
+
+from pymongo.read_preferences import SecondaryPreferred
+
+# Smallest bound MongoDB accepts for maxStalenessSeconds
+MIN_MAX_STALENESS_SECONDS = 90
+
+
+class ReadRouter:
+    """
+    Read preference and causal sessions for read-only endpoints.
+
+    Routed reads use secondaryPreferred with a staleness bound. With causal
+    reads each routed operation runs in a causally consistent session that
+    first authenticates the caller on the primary; the secondary then waits
+    until it has applied everything the primary had at that point, so a
+    lecturer reading after an update (on any worker) sees the update.
+    Authentication, session management and question delivery never use
+    the router and stay on the primary.
+    """
+
+    def __init__(self, client, max_staleness_seconds=None, causal=True):
+        """
+        Initialize read router
+
+        Args:
+            client: MongoClient the routed sessions are started on
+            max_staleness_seconds: Skip secondaries lagging more than this
+                                   (at least 90), None or 0 for no bound
+            causal: Run routed reads in causally consistent sessions
+        """
+        if max_staleness_seconds and max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+            raise ValueError(
+                f"max_staleness_seconds must be at least {MIN_MAX_STALENESS_SECONDS}, got {max_staleness_seconds}"
+            )
+        self.client = client
+        self.max_staleness_seconds = max_staleness_seconds or None
+        self.read_preference = SecondaryPreferred(max_staleness=max_staleness_seconds or -1)
+        self.causal = causal
+        self._lock = threading.Lock()
+        self._routed = 0
+
+    def store(self, store):
+        """Get a repository or question store whose queries follow the routed read preference"""
+        return store.with_read_preference(self.read_preference)
+
+    @contextmanager
+    def session(self):
+        """
+        Scope of one routed read
+
+        Yields:
+            Causally consistent ClientSession, or None without causal reads
+        """
+        with self._lock:
+            self._routed += 1
+        if not self.causal:
+            yield None
+            return
+        with self.client.start_session(causal_consistency=True) as session:
+            yield session
+
+    def stats(self):
+        """
+        Get routing settings and counters
+
+        Returns:
+            Dictionary with readPreference, maxStalenessSeconds, causal and
+            the number of routed reads
+        """
+        with self._lock:
+            return {
+                'readPreference': self.read_preference.mongos_mode,
+                'maxStalenessSeconds': self.max_staleness_seconds,
+                'causal': self.causal,
+                'routed': self._routed
+            }
+
+
+def routed_session(read_router):
+    """Session scope of a routed read, or an empty scope when routing is off"""
+    if read_router is None:
+        return nullcontext()
+    return read_router.session()
@@ -0,0 +1,113 @@
+"""
+Request Identity
+Session to user resolution, done once per request and shared by all services
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityLookupError(RuntimeError):
+    """A request resolved identities from the database more than once (strict mode)"""
+
+
+class RequestIdentity:
+    """
+    Resolves session IDs to users for the services.
+
+    Within a request (an application context, so one Flask g per request)
+    each session ID is looked up at most once: the user document is kept on
+    g and returned to every later caller, whichever service asks. Services
+    mutating the user document before saving it update the shared copy, so
+    later callers see the change. Outside a request (benchmarks, background
+    threads) every call reads the database.
+
+    More than one lookup in a request (different session IDs) is logged;
+    in strict mode it raises IdentityLookupError, which turns a regression
+    into a failing request during development and testing.
+    """
+
+    MAX_LOOKUPS_PER_REQUEST = 1
+
+    def __init__(self, users, request_globals=None, strict=False):
+        """
+        Initialize request identity
+
+        Args:
+            users: User repository (storage.users)
+            request_globals: The framework's g proxy, None to disable memoization
+            strict: Raise IdentityLookupError on a second lookup in a request
+        """
+        self.users = users
+        self.request_globals = request_globals
+        self.strict = strict
+
+    def _scope(self):
+        """Identities resolved in the current request, None outside a request"""
+        if self.request_globals is None:
+            return None
+        try:
+            return self.request_globals.setdefault('identities', {})
+        except RuntimeError:
+            # Working outside of application context
+            return None
+
+    def current_user(self, session_id, session=None):
+        """
+        Get the user whose active sessions include session_id
+
+        Args:
+            session_id: Session ID (string)
+            session: Optional ClientSession the lookup belongs to. A causal
+                     session joining after the identity was already resolved
+                     in this request starts at its own first read.
+
+        Returns:
+            User document or None
+        """
+        scope = self._scope()
+        if scope is not None and session_id in scope:
+            return scope[session_id]
+        user = self.users.find_by_active_session(session_id, session=session)
+        if scope is not None:
+            scope[session_id] = user
+            if len(scope) > self.MAX_LOOKUPS_PER_REQUEST:
+                self._excess_lookup(scope)
+        return user
+
+    def require_user(self, session_id, session=None):
+        """
+        Get the user of an active session
+
+        Args:
+            session_id: Session ID (string)
+            session: Optional ClientSession the lookup belongs to
+
+        Returns:
+            User document
+
+        Raises:
+            ValueError: If the session is not active
+        """
+        user = self.current_user(session_id, session=session)
+        if user is None:
+            raise ValueError('Session is not active')
+        return user
+
+    def invalidate(self, session_id):
+        """Forget a resolved session after its activation state changed"""
+        scope = self._scope()
+        if scope is not None:
+            scope.pop(session_id, None)
+
+    def lookups(self):
+        """Number of sessions resolved in the current request"""
+        scope = self._scope()
+        return len(scope) if scope is not None else 0
+
+    def _excess_lookup(self, scope):
+        if self.strict:
+            raise IdentityLookupError(
+                f"{len(scope)} identity lookups in one request, at most {self.MAX_LOOKUPS_PER_REQUEST} expected"
+            )
+        logger.warning("%s identity lookups in one request", len(scope))
@@ -0,0 +1,412 @@
+"""
+Request Metrics
+Per-endpoint latency histograms, status counts, in-flight gauges and payload
+sizes in the Prometheus text format, optionally summed over all gunicorn
+workers through a shared directory
+"""
+from bisect import bisect_left
+from collections import deque
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets in seconds; long-polls end after
+# LONG_POLL_MAX_SECONDS (25), event streams run until the client leaves
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds of the request and response size buckets in bytes
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+# Recorded events waiting to be folded into the totals before the
+# recording thread folds them itself
+DRAIN_THRESHOLD = 1000
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+WORKER_FILE_PREFIX = 'worker-'
+ARCHIVE_FILE = 'archive.json'
+ARCHIVE_LOCK_FILE = 'archive.lock'
+
+ROUTE_LABELS = ('blueprint', 'endpoint')
+REQUEST_LABELS = ('blueprint', 'endpoint', 'method', 'status')
+LATENCY_LABELS = ('blueprint', 'endpoint', 'method')
+
+# Metric name, type, help, series, label names, histogram bounds
+METRICS = (
+    ('roomsense_http_requests_total', 'counter',
+     'Completed requests', 'requests', REQUEST_LABELS, None),
+    ('roomsense_http_request_duration_seconds', 'histogram',
+     'Time from the first request hook to the end of the response', 'latency', LATENCY_LABELS, LATENCY_BUCKETS),
+    ('roomsense_http_requests_in_flight', 'gauge',
+     'Requests being served', 'inFlight', ROUTE_LABELS, None),
+    ('roomsense_http_request_size_bytes', 'histogram',
+     'Request body sizes (Content-Length)', 'requestSize', ROUTE_LABELS, SIZE_BUCKETS),
+    ('roomsense_http_response_size_bytes', 'histogram',
+     'Response body sizes, streamed responses excluded', 'responseSize', ROUTE_LABELS, SIZE_BUCKETS)
+)
+COUNTER_SERIES = ('requests', 'latency', 'requestSize', 'responseSize')
+
+
+class RequestMetrics:
+    """
+    Request counters of one process.
+
+    Request threads never take a lock: each request appends a start and a
+    finish event to a deque (atomic in CPython, so safe under gthread and
+    gevent workers). Events are folded into the totals under a lock only
+    when the metrics are read, flushed to the multiprocess directory, or
+    when DRAIN_THRESHOLD events have piled up.
+
+    With a multiprocess directory every worker writes its totals to
+    worker-<pid>.json every flush_seconds, and /metrics on any worker sums
+    the files of all workers. The master (gunicorn.conf.py) folds the
+    counters of exited workers into archive.json so totals stay monotonic
+    across worker recycling.
+    """
+
+    def __init__(self, multiprocess_dir=None, flush_seconds=5):
+        """
+        Initialize request metrics
+
+        Args:
+            multiprocess_dir: Directory shared by the workers, None for
+                              metrics of this process only
+            flush_seconds: Interval of the worker file flush
+        """
+        self.multiprocess_dir = multiprocess_dir or None
+        self.flush_seconds = flush_seconds
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._totals = empty_totals()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def request_started(self, route):
+        """
+        Record a request entering the application
+
+        Args:
+            route: (blueprint, endpoint) tuple
+        """
+        self._events.append((route,))
+
+    def request_finished(self, route, method, status, seconds, request_bytes, response_bytes):
+        """
+        Record a finished request
+
+        Args:
+            route: (blueprint, endpoint) tuple given to request_started
+            method: HTTP method
+            status: Response status code
+            seconds: Time spent serving the request
+            request_bytes: Request Content-Length, None if unknown
+            response_bytes: Response Content-Length, None if streamed
+        """
+        self._events.append((route, method, status, seconds, request_bytes, response_bytes))
+        if len(self._events) > DRAIN_THRESHOLD:
+            self._drain(blocking=False)
+
+    def _drain(self, blocking=True):
+        """Fold recorded events into the totals"""
+        if not self._lock.acquire(blocking):
+            # Another thread is already draining
+            return
+        try:
+            totals = self._totals
+            while True:
+                try:
+                    event = self._events.popleft()
+                except IndexError:
+                    break
+                route = event[0]
+                in_flight = totals['inFlight']
+                if len(event) == 1:
+                    in_flight[route] = in_flight.get(route, 0) + 1
+                    continue
+                _, method, status, seconds, request_bytes, response_bytes = event
+                in_flight[route] = in_flight.get(route, 0) - 1
+                key = route + (method, str(status))
+                totals['requests'][key] = totals['requests'].get(key, 0) + 1
+                observe(totals['latency'], route + (method,), LATENCY_BUCKETS, seconds)
+                if request_bytes is not None:
+                    observe(totals['requestSize'], route, SIZE_BUCKETS, request_bytes)
+                if response_bytes is not None:
+                    observe(totals['responseSize'], route, SIZE_BUCKETS, response_bytes)
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        """
+        Get the totals of this process
+
+        Returns:
+            Dictionary of series name to {label tuple: value}; histogram
+            values are per-bucket counts followed by sum and count
+        """
+        self._drain()
+        with self._lock:
+            return {
+                name: {key: list(value) if isinstance(value, list) else value for key, value in series.items()}
+                for name, series in self._totals.items()
+            }
+
+    def render(self):
+        """
+        Get the metrics in the Prometheus text exposition format
+
+        Returns:
+            Metrics of this process, or of all workers in multiprocess mode
+        """
+        if self.multiprocess_dir is None:
+            return render_totals(self.snapshot())
+        self.flush()
+        return render_totals(read_directory(self.multiprocess_dir))
+
+    def flush(self):
+        """Write the totals of this process to its worker file"""
+        if self.multiprocess_dir is None:
+            return
+        path = os.path.join(self.multiprocess_dir, f'{WORKER_FILE_PREFIX}{os.getpid()}.json')
+        write_totals(path, self.snapshot())
+
+    def start(self):
+        """Start flushing the worker file periodically (multiprocess mode only)"""
+        if self.multiprocess_dir is None or self._thread is not None:
+            return
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='request-metrics-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write the final totals (idempotent)"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.flush_seconds)
+        self._thread = None
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error("Error writing request metrics: %s", e)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error("Error writing request metrics: %s", e)
+
+
+def empty_totals():
+    """Empty series of every metric"""
+    return {series: {} for _, _, _, series, _, _ in METRICS}
+
+
+def observe(histogram_series, key, bounds, value):
+    """Add one observation to a histogram series"""
+    histogram = histogram_series.get(key)
+    if histogram is None:
+        # One count per bucket plus +Inf, then sum and count
+        histogram = histogram_series[key] = [0] * (len(bounds) + 1) + [0, 0]
+    histogram[bisect_left(bounds, value)] += 1
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+def merge_totals(target, totals, gauges=True):
+    """
+    Add totals into target
+
+    Args:
+        target: Totals being accumulated (modified)
+        totals: Totals to add
+        gauges: Include in-flight gauges (not for exited workers)
+    """
+    for series, values in totals.items():
+        if series not in COUNTER_SERIES and not gauges:
+            continue
+        merged = target.setdefault(series, {})
+        for key, value in values.items():
+            if isinstance(value, list):
+                current = merged.get(key)
+                merged[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+
+def write_totals(path, totals):
+    """Atomically replace a metrics file with the given totals"""
+    encoded = {series: [list(key) + [value] for key, value in values.items()] for series, values in totals.items()}
+    temporary = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as handle:
+        json.dump(encoded, handle)
+    os.replace(temporary, path)
+
+
+def read_totals(path):
+    """Read a metrics file written by write_totals"""
+    with open(path) as handle:
+        encoded = json.load(handle)
+    return {series: {tuple(row[:-1]): row[-1] for row in rows} for series, rows in encoded.items()}
+
+
+def read_directory(multiprocess_dir):
+    """
+    Sum the metrics files of a multiprocess directory
+
+    Args:
+        multiprocess_dir: Directory with worker and archive files
+
+    Returns:
+        Totals over all live workers and the archive
+    """
+    totals = empty_totals()
+    for name in sorted(os.listdir(multiprocess_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            merge_totals(totals, read_totals(os.path.join(multiprocess_dir, name)))
+        except (OSError, ValueError):
+            # Removed by the master meanwhile, or not a metrics file
+            continue
+    return totals
+
+
+def clear_directory(multiprocess_dir):
+    """Remove the files of a previous server run (master start)"""
+    os.makedirs(multiprocess_dir, exist_ok=True)
+    for name in os.listdir(multiprocess_dir):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(multiprocess_dir, name))
+
+
+def mark_process_dead(multiprocess_dir, pid):
+    """
+    Fold the counters of an exited worker into the archive file; its
+    in-flight gauges are dropped
+
+    Args:
+        multiprocess_dir: Directory shared by the workers
+        pid: Process ID of the exited worker
+    """
+    path = os.path.join(multiprocess_dir, f'{WORKER_FILE_PREFIX}{pid}.json')
+    try:
+        totals = read_totals(path)
+    except (OSError, ValueError):
+        return
+    archive_path = os.path.join(multiprocess_dir, ARCHIVE_FILE)
+    with open(os.path.join(multiprocess_dir, ARCHIVE_LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = empty_totals()
+        if os.path.exists(archive_path):
+            merge_totals(archive, read_totals(archive_path))
+        merge_totals(archive, totals, gauges=False)
+        write_totals(archive_path, archive)
+        os.remove(path)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_totals(totals):
+    """
+    Format totals in the Prometheus text exposition format
+
+    Args:
+        totals: Totals from RequestMetrics.snapshot or read_directory
+
+    Returns:
+        Exposition text
+    """
+    lines = []
+    for name, kind, description, series, label_names, bounds in METRICS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(totals.get(series, {}).items()):
+            if bounds is None:
+                lines.append(f'{name}{format_labels(label_names, key)} {format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds + (float('inf'),), value):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{format_number(bound)}"'
+                lines.append(f'{name}_bucket{format_labels(label_names, key, le)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(label_names, key)} {format_number(value[-2])}')
+            lines.append(f'{name}_count{format_labels(label_names, key)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_request_metrics(app, metrics, current_request, request_globals, asynchronous=False):
+    """
+    Record every request of the application
+
+    Args:
+        app: Flask or Quart application
+        metrics: RequestMetrics receiving the requests
+        current_request: The framework's request proxy
+        request_globals: The framework's g proxy
+        asynchronous: Register coroutine hooks (Quart runs plain functions
+                      in a thread)
+    """
+    def start_request():
+        route = (current_request.blueprint or '', current_request.endpoint or 'unmatched')
+        request_globals.metrics_route = route
+        request_globals.metrics_started = time.perf_counter()
+        metrics.request_started(route)
+
+    def record_response(response):
+        request_globals.metrics_status = response.status_code
+        # None for streamed responses
+        request_globals.metrics_response_bytes = response.content_length
+        return response
+
+    def finish_request(exception=None):
+        route = request_globals.pop('metrics_route', None)
+        if route is None:
+            # An earlier before_request hook answered the request
+            return
+        metrics.request_finished(
+            route,
+            current_request.method,
+            request_globals.get('metrics_status', 500),
+            time.perf_counter() - request_globals.metrics_started,
+            current_request.content_length,
+            request_globals.get('metrics_response_bytes')
+        )
+
+    if not asynchronous:
+        app.before_request(start_request)
+        app.after_request(record_response)
+        # Teardown runs for every request, after streamed responses finish
+        app.teardown_request(finish_request)
+        return
+
+    @app.before_request
+    async def start_request_async():
+        start_request()
+
+    @app.after_request
+    async def record_response_async(response):
+        return record_response(response)
+
+    @app.teardown_request
+    async def finish_request_async(exception=None):
+        finish_request(exception)
@@ -0,0 +1,360 @@
+"""
+Request Profiler
+Opt-in profiling of single requests, triggered by a signed header or a
+sampling rate, with the profiles kept in a bounded directory
+"""
+import cProfile
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+ADMIN_HEADER = 'X-Profile-Token'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# Token scopes: profiling a request, and reading the stored profiles
+PROFILE_SCOPE = 'profile'
+ADMIN_SCOPE = 'admin'
+
+# 'deterministic' (cProfile, pstats file) or 'sampling' (wall-clock stack
+# samples, speedscope JSON)
+PROFILER_MODES = {'deterministic': '.prof', 'sampling': '.speedscope.json'}
+
+PROFILE_NAME_PATTERN = re.compile(r'^\d+-\d+-[A-Z]+-[A-Za-z0-9_.]+$')
+
+
+def sign_token(secret, scope, expires):
+    """
+    Create a token for the X-Profile or X-Profile-Token header
+
+    Args:
+        secret: PROFILING_SECRET
+        scope: PROFILE_SCOPE or ADMIN_SCOPE
+        expires: Unix time after which the token is rejected
+
+    Returns:
+        Token string '<expires>.<signature>'
+    """
+    expires = int(expires)
+    signature = hmac.new(secret.encode(), f'{scope}:{expires}'.encode(), hashlib.sha256).hexdigest()
+    return f'{expires}.{signature}'
+
+
+def verify_token(secret, scope, token):
+    """Check a token created by sign_token for scope; expired tokens fail"""
+    if not secret or not token:
+        return False
+    expires, _, _ = token.partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(token, sign_token(secret, scope, int(expires)))
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval (wall clock)"""
+
+    def __init__(self, thread_id, interval_seconds):
+        """
+        Initialize stack sampler
+
+        Args:
+            thread_id: Identifier of the thread serving the request
+            interval_seconds: Time between two samples
+        """
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.frames = []
+        self._frame_index = {}
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler-sampler', daemon=True)
+        self.started = None
+        self.ended = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.ended = time.perf_counter()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                index = self._frame_index.get(key)
+                if index is None:
+                    index = self._frame_index[key] = len(self.frames)
+                    self.frames.append({'name': code.co_name, 'file': code.co_filename, 'line': code.co_firstlineno})
+                stack.append(index)
+                frame = frame.f_back
+            # Outermost frame first
+            stack.reverse()
+            self.samples.append(stack)
+
+    def speedscope(self, name):
+        """The samples as a speedscope file (https://www.speedscope.app)"""
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': round(self.ended - self.started, 6),
+                'samples': self.samples,
+                'weights': [self.interval_seconds] * len(self.samples)
+            }],
+            'name': name,
+            'exporter': 'roomsense'
+        }
+
+
+class RequestProfiler:
+    """
+    Profiles requests that ask for it and stores the profiles.
+
+    A request is profiled when it carries a valid X-Profile token (see
+    sign_token) or is picked by the sampling rate. Profiles are written to
+    a directory holding at most max_profiles files; the oldest are removed
+    first. Without PROFILING_ENABLED no hooks are registered at all.
+    """
+
+    def __init__(self, directory, secret=None, sample_rate=0.0, mode='deterministic',
+                 max_profiles=50, sample_interval_ms=5):
+        """
+        Initialize request profiler
+
+        Args:
+            directory: Directory of the stored profiles
+            secret: Key of the X-Profile and admin tokens, None to accept none
+            sample_rate: Fraction of all requests profiled without a token
+            mode: 'deterministic' (cProfile) or 'sampling' (stack samples)
+            max_profiles: Profiles kept in the directory
+            sample_interval_ms: Interval of the sampling profiler
+        """
+        if mode not in PROFILER_MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"Profiling sample rate must be between 0 and 1, got {sample_rate}")
+        if max_profiles < 1:
+            raise ValueError(f"max_profiles must be at least 1, got {max_profiles}")
+        self.directory = directory
+        self.secret = secret or None
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.max_profiles = max_profiles
+        self.sample_interval_seconds = sample_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._profiled = 0
+        self._rejected = 0
+
+    def wants_profile(self, token):
+        """
+        Decide whether to profile a request
+
+        Args:
+            token: Value of the X-Profile header, None if absent
+
+        Returns:
+            True if the request should be profiled
+        """
+        if token:
+            if verify_token(self.secret, PROFILE_SCOPE, token):
+                return True
+            with self._lock:
+                self._rejected += 1
+            return False
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def is_admin(self, token):
+        """Check the X-Profile-Token of an admin request"""
+        return verify_token(self.secret, ADMIN_SCOPE, token)
+
+    def start(self):
+        """
+        Start profiling the calling thread
+
+        Returns:
+            Opaque profile handle for finish()
+        """
+        if self.mode == 'deterministic':
+            profile = cProfile.Profile()
+            profile.enable()
+            return profile
+        sampler = StackSampler(threading.get_ident(), self.sample_interval_seconds)
+        sampler.start()
+        return sampler
+
+    def new_name(self, method, endpoint):
+        """
+        Name of the profile of a request being started
+
+        Args:
+            method: HTTP method
+            endpoint: Endpoint of the request
+
+        Returns:
+            File name: creation time (ns), process, method, endpoint
+        """
+        endpoint = re.sub(r'[^A-Za-z0-9_.]', '_', endpoint)
+        return f'{time.time_ns()}-{os.getpid()}-{method}-{endpoint}{PROFILER_MODES[self.mode]}'
+
+    def finish(self, handle, name):
+        """
+        Stop profiling and store the profile
+
+        Args:
+            handle: Value returned by start()
+            name: Name from new_name()
+        """
+        if self.mode == 'deterministic':
+            handle.disable()
+        else:
+            handle.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        if self.mode == 'deterministic':
+            handle.dump_stats(path)
+        else:
+            with open(path, 'w') as output:
+                json.dump(handle.speedscope(name), output)
+        with self._lock:
+            self._profiled += 1
+        self._trim()
+        logger.info("Stored profile %s", name)
+
+    def _trim(self):
+        """Remove the oldest profiles beyond max_profiles"""
+        names = self.list_names()
+        for name in names[:-self.max_profiles]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                # Removed by another worker meanwhile
+                pass
+
+    def list_names(self):
+        """Stored profile names, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # Same-width nanosecond prefixes: name order is creation order
+        return sorted(name for name in names if PROFILE_NAME_PATTERN.match(name))
+
+    def profiles(self):
+        """
+        Describe the stored profiles
+
+        Returns:
+            List of dictionaries with name, method, endpoint, process,
+            creation time, duration (until the profile was written) and
+            size, newest first
+        """
+        listing = []
+        for name in reversed(self.list_names()):
+            created_ns, pid, method, endpoint = name.split('-', 3)
+            endpoint = endpoint[:-len(PROFILER_MODES['sampling'])] if endpoint.endswith(
+                PROFILER_MODES['sampling']) else endpoint[:-len(PROFILER_MODES['deterministic'])]
+            try:
+                status = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            created = int(created_ns) / 1e9
+            listing.append({
+                'name': name,
+                'method': method,
+                'endpoint': endpoint,
+                'pid': int(pid),
+                'createdAt': datetime.fromtimestamp(created, timezone.utc).isoformat(timespec='milliseconds'),
+                'durationMs': round((status.st_mtime - created) * 1000, 1),
+                'sizeBytes': status.st_size
+            })
+        return listing
+
+    def profile_path(self, name):
+        """Path of a stored profile, None if the name is invalid or unknown"""
+        if not PROFILE_NAME_PATTERN.match(name) or name not in self.list_names():
+            return None
+        return os.path.join(self.directory, name)
+
+    def stats(self):
+        """
+        Get profiler settings and counters
+
+        Returns:
+            Dictionary with mode, sample rate, stored and profiled counts
+            and rejected tokens
+        """
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'sampleRate': self.sample_rate,
+                'stored': len(self.list_names()),
+                'profiled': self._profiled,
+                'rejectedTokens': self._rejected
+            }
+
+
+def init_request_profiler(app, profiler, current_request, request_globals):
+    """
+    Profile the requests selected by the profiler
+
+    Args:
+        app: Flask application
+        profiler: RequestProfiler deciding which requests to profile
+        current_request: The framework's request proxy
+        request_globals: The framework's g proxy
+    """
+    def start_profile():
+        if not profiler.wants_profile(current_request.headers.get(PROFILE_HEADER)):
+            return
+        try:
+            handle = profiler.start()
+        except ValueError as e:
+            # Another profiler is active on this thread
+            logger.warning("Request not profiled: %s", e)
+            return
+        request_globals.profile_name = profiler.new_name(
+            current_request.method, current_request.endpoint or 'unmatched'
+        )
+        request_globals.profile_handle = handle
+
+    def announce_profile(response):
+        name = request_globals.get('profile_name')
+        if name is not None:
+            # Stored when the request ends, after streamed responses
+            response.headers[PROFILE_ID_HEADER] = name
+        return response
+
+    def finish_profile(exception=None):
+        handle = request_globals.pop('profile_handle', None)
+        if handle is None:
+            return
+        try:
+            profiler.finish(handle, request_globals.profile_name)
+        except OSError as e:
+            logger.error("Error storing profile: %s", e)
+
+    app.before_request(start_profile)
+    app.after_request(announce_profile)
+    app.teardown_request(finish_profile)
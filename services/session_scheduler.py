@@ -0,0 +1,259 @@
+"""
+Session Scheduler
+Starts and ends sessions at their expected times
+"""
+from datetime import datetime, timedelta
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SessionScheduler:
+    """
+    Flips session_is_active at session_expected_start_time and
+    session_expected_end_time.
+
+    One worker at a time drives the schedule: it holds a lease (a document
+    in scheduler_leases with MongoDB) and renews it while running. The
+    leader keeps the transitions due within lookahead_seconds in a min-heap,
+    fires all due starts (and all due ends) with one batch update, and
+    reloads the heap with indexed range queries every reload_seconds, after
+    winning the lease and when request_reload() is called. Sessions whose
+    start was missed by more than recovery_seconds (e.g. during an outage)
+    are not started late; overdue ends are always applied.
+    """
+    LEASE_NAME = 'session_scheduler'
+
+    def __init__(self, storage, lease_seconds=30, lookahead_seconds=3600, reload_seconds=60,
+                 recovery_seconds=86400, owner=None):
+        """
+        Initialize session scheduler
+
+        Args:
+            storage: MongoStorage or MemoryStorage holding sessions and leases
+            lease_seconds: Lifetime of the leader lease, renewed at a third of it
+            lookahead_seconds: How far ahead transitions are loaded into the heap
+            reload_seconds: Interval between schedule reloads
+            recovery_seconds: How late a missed start is still applied
+            owner: Lease owner ID, defaults to host and pid
+        """
+        self.sessions = storage.sessions
+        self.leases = storage.leases
+        self.lease_seconds = lease_seconds
+        self.lookahead_seconds = lookahead_seconds
+        self.reload_seconds = reload_seconds
+        self.recovery_seconds = recovery_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._heap = []
+        self._end_times = {}
+        self._is_leader = False
+        self._loaded_at = None
+        self._lease_renewed_at = None
+        self._started = 0
+        self._ended = 0
+
+    def ensure_indexes(self):
+        """Create the index backing the start range query"""
+        self.sessions.ensure_schedule_indexes()
+
+    # Lifecycle
+
+    def start(self):
+        """Start the scheduler thread (no-op if it is already running)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='session-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread and give up the lease"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._is_leader:
+            self.leases.release(self.LEASE_NAME, self.owner)
+            self._is_leader = False
+
+    def request_reload(self):
+        """Reload the schedule soon, e.g. after a session was created or moved"""
+        with self._lock:
+            self._loaded_at = None
+        self._wakeup.set()
+
+    def add_listener(self, listener):
+        """
+        Register a callback for scheduled transitions
+
+        Args:
+            listener: Callable taking (action, session_ids) with action
+                      'started' or 'ended'; session_ids are the sessions the
+                      transition was applied to or already had
+        """
+        self.listeners.append(listener)
+
+    def stats(self):
+        """
+        Get scheduler counters
+
+        Returns:
+            Dictionary with leadership, scheduled, started and ended counts
+        """
+        with self._lock:
+            return {
+                'leader': self._is_leader,
+                'scheduled': len(self._heap),
+                'started': self._started,
+                'ended': self._ended
+            }
+
+    # Loop
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                wait_seconds = self._tick()
+            except Exception as e:
+                logger.error("Session scheduler error: %s", e)
+                wait_seconds = self.lease_seconds / 3
+
+            self._wakeup.wait(wait_seconds)
+            self._wakeup.clear()
+
+    def _tick(self):
+        """
+        Run one scheduling round
+
+        Returns:
+            Seconds until the next round is needed
+        """
+        monotonic_now = time.monotonic()
+        renew_every = self.lease_seconds / 3
+
+        if self._lease_renewed_at is None or monotonic_now - self._lease_renewed_at >= renew_every:
+            was_leader = self._is_leader
+            self._is_leader = self._acquire_lease()
+            self._lease_renewed_at = monotonic_now
+            if self._is_leader and not was_leader:
+                logger.info("Session scheduler leadership acquired by %s", self.owner)
+                self._loaded_at = None
+            elif was_leader and not self._is_leader:
+                logger.info("Session scheduler leadership lost by %s", self.owner)
+                with self._lock:
+                    self._heap = []
+                    self._end_times = {}
+
+        if not self._is_leader:
+            return renew_every
+
+        if self._loaded_at is None or monotonic_now - self._loaded_at >= self.reload_seconds:
+            self._load()
+            self._loaded_at = monotonic_now
+
+        self._fire_due(datetime.utcnow())
+
+        wait_seconds = min(renew_every, self.reload_seconds)
+        with self._lock:
+            if self._heap:
+                until_next = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+                wait_seconds = min(wait_seconds, max(until_next, 0))
+        return wait_seconds
+
+    def _acquire_lease(self):
+        """Take or renew the leader lease; True if this worker holds it"""
+        now = datetime.utcnow()
+        return self.leases.acquire(
+            self.LEASE_NAME, self.owner, now, now + timedelta(seconds=self.lease_seconds)
+        )
+
+    def _load(self):
+        """Rebuild the heap from the sessions due within the lookahead window"""
+        now = datetime.utcnow()
+        horizon = now + timedelta(seconds=self.lookahead_seconds)
+        earliest = now - timedelta(seconds=self.recovery_seconds)
+
+        heap = []
+        end_times = {}
+
+        # Sessions that have not started yet (range on the start time index)
+        for session in self.sessions.find_pending_starts(earliest, horizon):
+            start_at = session.get('expectedStartAt')
+            if start_at is None:
+                continue
+            heap.append((start_at, 'start', session['sessionId']))
+            end_at = session.get('expectedEndAt')
+            if end_at is not None:
+                end_times[session['sessionId']] = end_at
+
+        # Running sessions that are due to end
+        for session in self.sessions.find_running_ends(horizon):
+            end_at = session.get('expectedEndAt')
+            if end_at is not None:
+                heap.append((end_at, 'end', session['sessionId']))
+
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+            self._end_times = end_times
+
+    def _fire_due(self, now):
+        """Apply every due transition, with one update_many per action"""
+        while True:
+            starts, ends = [], []
+            with self._lock:
+                while self._heap and self._heap[0][0] <= now:
+                    _, action, session_id = heapq.heappop(self._heap)
+                    (starts if action == 'start' else ends).append(session_id)
+
+            if not starts and not ends:
+                return
+            # Starting may schedule ends that are already due, hence the loop
+            if starts:
+                self._start_sessions(starts, now)
+            if ends:
+                self._end_sessions(ends, now)
+
+    def _start_sessions(self, session_ids, now):
+        # Sessions ended by hand before their start stay ended
+        started = self.sessions.start_many(session_ids, now)
+
+        with self._lock:
+            self._started += started
+            # Follow up with the end of the sessions just started
+            for session_id in session_ids:
+                end_at = self._end_times.pop(session_id, None)
+                if end_at is not None:
+                    heapq.heappush(self._heap, (end_at, 'end', session_id))
+
+        logger.info("Scheduler started %s of %s sessions", started, len(session_ids))
+        self._notify('started', session_ids)
+
+    def _end_sessions(self, session_ids, now):
+        ended = self.sessions.end_many(session_ids, now)
+
+        with self._lock:
+            self._ended += ended
+
+        logger.info("Scheduler ended %s of %s sessions", ended, len(session_ids))
+        self._notify('ended', session_ids)
+
+    def _notify(self, action, session_ids):
+        for listener in self.listeners:
+            try:
+                listener(action, session_ids)
+            except Exception as e:
+                logger.error("Error in session scheduler listener: %s", e)
@@ -1,14 +1,52 @@
 import uuid
 import logging
-from models.sessions import SessionModel
-from models.user import User
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from models.sessions import SessionModel, parse_session_time
+from services.request_identity import RequestIdentity
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+
+class DuplicateSessionIdsError(RuntimeError):
+    """Stored sessions share a sessionId, so the unique index cannot be built"""
+
+
 class SessionsService:
-    def __init__(self, db):
-        self.db = db
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+
+    def __init__(self, storage, scheduler=None, active_sessions=None, identity=None):
+        # Repositories of the configured backend (MongoStorage or MemoryStorage)
+        self.sessions = storage.sessions
+        self.users = storage.users
+        # Session to user resolution shared with the other services
+        self.identity = identity or RequestIdentity(storage.users)
+        # Optional SessionScheduler, told to reload when session times change
+        self.scheduler = scheduler
+        # Optional ActiveSessionRegistry kept in step with start/end/delete
+        self.active_sessions = active_sessions
+        # Set once the unique sessionId index exists; until then create_session
+        # looks for an existing session first
+        self.unique_ids_enforced = False
+
+    def ensure_indexes(self):
+        """
+        Create the unique sessionId index and the per-user listing index
+
+        Raises:
+            DuplicateSessionIdsError: If stored sessions share a sessionId
+                (see "Duplicate session IDs" in INTEGRATION_GUIDE.md)
+        """
+        try:
+            self.sessions.ensure_indexes()
+        except DuplicateKeyError as e:
+            duplicates = self.sessions.find_duplicate_session_ids()
+            raise DuplicateSessionIdsError(
+                f"Cannot build the unique sessionId index, these sessionIds are stored more than once: {duplicates}"
+            ) from e
+        self.unique_ids_enforced = True
 
     def create_session(self, payload):
         """Create a new session"""
@@ -36,32 +74,30 @@ class SessionsService:
         }
         """
 
-        # Ensure payload is dict
-        if payload is None:
-            return {"success": False, "message": "No JSON body received"}
+        error = SessionModel.validatePayload(payload)
+        if error is not None:
+            return {"success": False, "message": error}
 
         uniqueNumber = payload.get("uniqueNumber")
         # print("------------------------------")
         # print(uniqueNumber, type(uniqueNumber))
         # print("------------------------------")
         
-        if not uniqueNumber or str(uniqueNumber).strip() == "":
-            return {"success": False, "message": "userUniqueId is required"}
-        
-        user= User.find_by_unique_number(self.db, uniqueNumber)
+        user= self.users.find_by_unique_number(uniqueNumber)
         if not user:
             return {"success": False, "message": "User not found"}
         
         session_id=payload.get("sessionId") or str(uuid.uuid4())
 
-        if SessionModel.findSessionBySessionId(self.db, session_id):
-            return {"success": False, "message": "Session ID already exists"}
-        
         payload["sessionId"] = session_id
         payload["session_is_active"] = False
 
         try:
-            saved_session = SessionModel.createSession(self.db, payload)
+            if not self.unique_ids_enforced and self.sessions.find_by_session_id(session_id):
+                # No unique index yet: racy, but keeps repeated IDs out
+                return {"success": False, "message": "Session ID already exists"}
+
+            saved_session = self.sessions.create(payload)
             """
             Saved session structure:
             {
@@ -91,41 +127,91 @@ class SessionsService:
             """
 
 
+            if self.scheduler is not None:
+                self.scheduler.request_reload()
+
             return {
                 "success": True,
                 "message": "Session created successfully",
                 "session": saved_session
             }
+
+        except DuplicateKeyError:
+            # The unique sessionId index rejects the insert
+            return {"success": False, "message": "Session ID already exists"}
         
         except Exception as e:
-            logger.error(f"Error creating session: {str(e)}")
+            logger.error("Error creating session: %s", e)
             return {
                 "success": False,
                 "message": "Failed to create session"
             }
     
-    def get_all_session_by_user_id(self, uniqueNumber):
-        """Retrieve sessions by user unique ID"""
+    def get_all_session_by_user_id(self, uniqueNumber, limit=None, cursor=None):
+        """
+        Retrieve sessions by user unique ID, newest expected start first
+
+        Args:
+            uniqueNumber: User unique number
+            limit: Page size (default DEFAULT_PAGE_SIZE, at most MAX_PAGE_SIZE)
+            cursor: nextCursor of the previous page, None for the first page
+
+        Returns:
+            Dictionary with the sessions of the page and nextCursor (None on
+            the last page)
+        """
+        try:
+            limit = min(int(limit or self.DEFAULT_PAGE_SIZE), self.MAX_PAGE_SIZE)
+            before = self.parse_cursor(cursor) if cursor else None
+        except ValueError:
+            return {
+                "success": False,
+                "message": "Invalid limit or cursor"
+            }
+
         try:
-            sessions = SessionModel.findSessionsByUserUniqueId(self.db, uniqueNumber)
+            sessions = self.sessions.find_by_user(uniqueNumber, limit, before)
             # print("===================")
             # print("sessions = ", sessions)
             # print("===================")
             return {
                 "success": True,
-                "sessions": sessions
+                "sessions": sessions,
+                "nextCursor": self.next_cursor(sessions, limit)
             }
         except Exception as e:
-            logger.error(f"Error retrieving sessions: {str(e)}")
+            logger.error("Error retrieving sessions: %s", e)
             return {
                 "success": False,
                 "message": "Failed to retrieve sessions"
             }
     
+    @staticmethod
+    def next_cursor(sessions, limit):
+        """Cursor of the page after sessions, None if it was the last page"""
+        if len(sessions) < limit:
+            return None
+        last = sessions[-1]
+        start_at = last.get('expectedStartAt')
+        return f"{start_at.isoformat() if start_at else ''}|{last['_id']}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """Split a listing cursor into (expectedStartAt or None, ObjectId)"""
+        start_time, separator, object_id = cursor.rpartition("|")
+        if not separator or not ObjectId.is_valid(object_id):
+            raise ValueError("Invalid cursor")
+        if not start_time:
+            return None, ObjectId(object_id)
+        start_at = parse_session_time(start_time)
+        if start_at is None:
+            raise ValueError("Invalid cursor")
+        return start_at, ObjectId(object_id)
+
     def get_session_by_sessionId(self, sessionId):
         """Retrieve a session by session ID"""
         try:
-            session = SessionModel.findSessionBySessionId(self.db, sessionId)
+            session = self.sessions.find_by_session_id(sessionId)
             if session:
                 return {
                     "success": True,
@@ -137,7 +223,7 @@ class SessionsService:
                     "message": "Session not found"
                 }
         except Exception as e:
-            logger.error(f"Error retrieving session: {str(e)}")
+            logger.error("Error retrieving session: %s", e)
             return {
                 "success": False,
                 "message": "Failed to retrieve session"
@@ -145,10 +231,19 @@ class SessionsService:
     
     def update_session(self, sessionId, updateData):
         """Update an existing session"""
+        error = SessionModel.validateTimes(updateData)
+        if error is not None:
+            return {"success": False, "message": error}
+
         try:
-            result = SessionModel.updateSession(self.db, sessionId, updateData)
+            modified = self.sessions.update(sessionId, updateData)
+
+            if self.scheduler is not None and (
+                "session_expected_start_time" in updateData or "session_expected_end_time" in updateData
+            ):
+                self.scheduler.request_reload()
             
-            return result.modified_count >= 1
+            return modified >= 1
             # if result.modified_count >= 1:
             #     return {
             #         "success": True,
@@ -160,7 +255,7 @@ class SessionsService:
             #         "message": "No changes made to the session"
             #     }
         except Exception as e:
-            logger.error(f"Error updating session: {str(e)}")
+            logger.error("Error updating session: %s", e)
             return {
                 "success": False,
                 "message": "Failed to update session"
@@ -173,9 +268,13 @@ class SessionsService:
                 "session_is_active": True,
                 "session_actual_start_time": datetime.utcnow()
             }
-            result = SessionModel.updateSession(self.db, sessionId, updateData)
+            modified = self.sessions.update(sessionId, updateData)
             
-            if result.modified_count == 1:
+            if modified == 1:
+                if self.active_sessions is not None:
+                    session = self.sessions.find_by_session_id(sessionId)
+                    if session is not None:
+                        self.active_sessions.add(session)
                 return {
                     "success": True,
                     "message": "Session started successfully"
@@ -186,7 +285,7 @@ class SessionsService:
                     "message": "No changes made to the session"
                 }
         except Exception as e:
-            logger.error(f"Error starting session: {str(e)}")
+            logger.error("Error starting session: %s", e)
             return {
                 "success": False,
                 "message": "Failed to start session"
@@ -199,9 +298,11 @@ class SessionsService:
                 "session_is_active": False,
                 "session_actual_end_time": datetime.utcnow()
             }
-            result = SessionModel.updateSession(self.db, sessionId, updateData)
+            modified = self.sessions.update(sessionId, updateData)
             
-            if result.modified_count == 1:
+            if modified == 1:
+                if self.active_sessions is not None:
+                    self.active_sessions.remove(sessionId)
                 return {
                     "success": True,
                     "message": "Session ended successfully"
@@ -212,7 +313,7 @@ class SessionsService:
                     "message": "No changes made to the session"
                 }
         except Exception as e:
-            logger.error(f"Error ending session: {str(e)}")
+            logger.error("Error ending session: %s", e)
             return {
                 "success": False,
                 "message": "Failed to end session"
@@ -221,9 +322,11 @@ class SessionsService:
     def delete_session(self, sessionId):
         """Delete a session"""
         try:
-            result = SessionModel.deleteSession(self.db, sessionId)
+            deleted = self.sessions.delete(sessionId)
             
-            if result.deleted_count == 1:
+            if deleted == 1:
+                if self.active_sessions is not None:
+                    self.active_sessions.remove(sessionId)
                 return {
                     "success": True,
                     "message": "Session deleted successfully"
@@ -234,8 +337,44 @@ class SessionsService:
                     "message": "Session not found"
                 }
         except Exception as e:
-            logger.error(f"Error deleting session: {str(e)}")
+            logger.error("Error deleting session: %s", e)
             return {
                 "success": False,
                 "message": "Failed to delete session"
-            }
\ No newline at end of file
+            }
+
+    def get_active_sessions(self, session_id, uniqueNumber=None):
+        """
+        Retrieve the sessions that are live right now
+
+        Args:
+            session_id: Active login session of the caller
+            uniqueNumber: User unique number, None for every user
+
+        Returns:
+            Dictionary with the live session summaries
+
+        Raises:
+            ValueError: If the caller's session is not active
+        """
+        self.identity.require_user(session_id)
+        if self.active_sessions is None:
+            return {
+                "success": False,
+                "message": "Active session registry is disabled"
+            }
+        try:
+            if uniqueNumber is None:
+                sessions = self.active_sessions.all()
+            else:
+                sessions = self.active_sessions.for_user(uniqueNumber)
+            return {
+                "success": True,
+                "sessions": sessions
+            }
+        except Exception as e:
+            logger.error("Error retrieving active sessions: %s", e)
+            return {
+                "success": False,
+                "message": "Failed to retrieve active sessions"
+            }
@@ -0,0 +1,57 @@
+"""
+Stream Limiter
+Bounds the number of concurrent event streams served by one worker
+"""
+import threading
+
+
+class StreamLimiter:
+    """Counting gate for long-lived streaming responses"""
+
+    def __init__(self, max_streams):
+        """
+        Initialize stream limiter
+
+        Args:
+            max_streams: Maximum number of concurrent streams
+        """
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._active = 0
+        self._opened = 0
+        self._rejected = 0
+
+    def acquire(self):
+        """
+        Reserve a stream slot
+
+        Returns:
+            True if a slot was reserved, False if the limit is reached
+        """
+        with self._lock:
+            if self._active >= self.max_streams:
+                self._rejected += 1
+                return False
+            self._active += 1
+            self._opened += 1
+            return True
+
+    def release(self):
+        """Free a previously reserved stream slot"""
+        with self._lock:
+            self._active = max(self._active - 1, 0)
+
+    def stats(self):
+        """
+        Get stream counters
+
+        Returns:
+            Dictionary with active, max, opened and rejected counts
+        """
+        with self._lock:
+            return {
+                'active': self._active,
+                'max': self.max_streams,
+                'opened': self._opened,
+                'rejected': self._rejected
+            }
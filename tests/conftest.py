@@ -0,0 +1,57 @@
+"""
+Shared fixtures: the app on the in-memory storage backend
+"""
+import pytest
+
+from app import create_app
+
+
+class FakeEmailService:
+    """Records verification emails instead of calling SendGrid"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_verification_email(self, email, session_id):
+        self.sent.append((email, session_id))
+
+
+@pytest.fixture
+def app():
+    """Testing app on a fresh in-memory store, no background scheduler"""
+    app = create_app('testing', settings={
+        'SECRET_KEY': 'tests',
+        'STORAGE_BACKEND': 'memory',
+        'STORAGE_MEMORY_LOG': '',
+        'SESSION_SCHEDULER_ENABLED': False,
+        'LOG_LEVEL': 'WARNING'
+    }, email_service=FakeEmailService())
+    yield app
+    app.extensions['roomsense_shutdown']()
+
+
+@pytest.fixture
+def storage(app):
+    return app.extensions['roomsense_storage']
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def lecturer(app, storage):
+    """Session ID and lecture key of a logged-in lecturer with one lecture"""
+    session_id = 'tests-lecturer'
+    storage.users.insert({
+        'email': 'lecturer@example.com',
+        'uniqueNumber': '1001',
+        'activeSessionIds': [session_id],
+        'pendingSessionIds': [],
+        'inactiveSessionIds': []
+    })
+    lecture = app.extensions['roomsense_lectures'].create_lecture(
+        session_id, 'CS 101', '2024-01-15', '2024-05-15', [], []
+    )
+    return session_id, lecture['key']
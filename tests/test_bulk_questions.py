@@ -0,0 +1,56 @@
+"""
+Bulk question updates report what the update actually changed
+"""
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def questions(app, lecturer):
+    _, lecture_key = lecturer
+    lectures = app.extensions['roomsense_lectures']
+    return [
+        lectures.create_question(lecture_key=lecture_key, student_name='Ada', question_text=text)['id']
+        for text in ('What is recursion?', 'How do threads work in Python?')
+    ]
+
+
+@pytest.fixture
+def racing_lectures(app, monkeypatch):
+    """Lecture service whose bulk updates lose the first question to a concurrent request"""
+    lectures = app.extensions['roomsense_lectures']
+    set_flag_many = lectures.question_store.set_flag_many
+
+    def racing_set_flag_many(question_ids, flag, now):
+        set_flag_many(question_ids[:1], flag, datetime.utcnow())
+        return set_flag_many(question_ids, flag, now)
+
+    monkeypatch.setattr(lectures.question_store, 'set_flag_many', racing_set_flag_many)
+    return lectures
+
+
+def test_answers_lost_to_a_concurrent_request_are_reported(racing_lectures, lecturer, questions):
+    session_id, lecture_key = lecturer
+    last_event_id = racing_lectures.notifier.last_event_id(lecture_key)
+
+    result = racing_lectures.bulk_mark_answered(session_id, lecture_key, question_ids=questions)
+
+    assert result == {
+        'results': {questions[0]: 'already_answered', questions[1]: 'answered'},
+        'updated': 1
+    }
+    answered = [data for _, event, data in racing_lectures.notifier.events_since(lecture_key, last_event_id)
+                if event == 'answered']
+    assert answered == [{'id': questions[1], 'ids': [questions[1]]}]
+
+
+def test_deliveries_lost_to_a_concurrent_request_are_reported(racing_lectures, lecturer, questions):
+    session_id, lecture_key = lecturer
+
+    result = racing_lectures.bulk_mark_delivered(session_id, lecture_key, question_ids=questions)
+
+    assert result == {
+        'results': {questions[0]: 'already_delivered', questions[1]: 'delivered'},
+        'updated': 1
+    }
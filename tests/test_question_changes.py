@@ -0,0 +1,26 @@
+"""
+Question delta sync: the since cursor
+"""
+import pytest
+
+
+def test_since_returns_only_newer_changes(app, client, lecturer):
+    session_id, lecture_key = lecturer
+    lectures = app.extensions['roomsense_lectures']
+    lectures.create_question(lecture_key=lecture_key, student_name='Ada', question_text='What is recursion?')
+    url = f'/api/lectures/{session_id}/{lecture_key}/questions'
+
+    first = client.get(url).get_json()
+    assert len(first['questions']) == 1
+
+    later = client.get(url, query_string={'since': first['cursor'] + 60000}).get_json()
+    assert later['questions'] == []
+
+
+@pytest.mark.parametrize('since', ['-1', 'yesterday', '1.5'])
+def test_invalid_since_is_rejected(client, lecturer, since):
+    session_id, lecture_key = lecturer
+
+    response = client.get(f'/api/lectures/{session_id}/{lecture_key}/questions', query_string={'since': since})
+
+    assert response.status_code == 400
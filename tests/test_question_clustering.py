@@ -0,0 +1,43 @@
+"""
+Near-duplicate clustering is opt-in
+"""
+import pytest
+
+from app import create_app
+from tests.conftest import FakeEmailService
+
+
+@pytest.fixture
+def clustering_app():
+    app = create_app('testing', settings={
+        'SECRET_KEY': 'tests',
+        'STORAGE_BACKEND': 'memory',
+        'STORAGE_MEMORY_LOG': '',
+        'SESSION_SCHEDULER_ENABLED': False,
+        'QUESTION_CLUSTERING_ENABLED': True,
+        'LOG_LEVEL': 'WARNING'
+    }, email_service=FakeEmailService())
+    yield app
+    app.extensions['roomsense_shutdown']()
+
+
+def ask_twice(app):
+    storage = app.extensions['roomsense_storage']
+    lectures = app.extensions['roomsense_lectures']
+    storage.users.insert({'email': 'lecturer@example.com', 'activeSessionIds': ['tests-lecturer']})
+    key = lectures.create_lecture('tests-lecturer', 'CS 101', '2024-01-15', '2024-05-15', [], [])['key']
+    return [
+        lectures.create_question(lecture_key=key, student_name=name, question_text='What is recursion?')
+        for name in ('Ada', 'Grace')
+    ]
+
+
+def test_questions_stand_alone_by_default(app):
+    assert not any(question['isDuplicate'] for question in ask_twice(app))
+
+
+def test_enabled_clustering_merges_repeated_questions(clustering_app):
+    first, second = ask_twice(clustering_app)
+
+    assert (first['isDuplicate'], second['isDuplicate']) == (False, True)
+    assert second['clusterId'] == first['id']
@@ -0,0 +1,55 @@
+"""
+Question notifier: per-lecture state is bounded and dropped with the lecture
+"""
+import threading
+
+from services.question_notifier import QuestionNotifier
+
+
+def test_least_recently_changed_lectures_are_evicted():
+    notifier = QuestionNotifier(max_lectures=2)
+    notifier.publish('a', 'question', {})
+    notifier.publish('b', 'question', {})
+    notifier.notify('a')
+    notifier.publish('c', 'question', {})
+
+    assert notifier.version('b') == 0
+    assert notifier.events_since('b', 0) == []
+    assert [event for _, event, _ in notifier.events_since('a', 0)] == ['question']
+    assert notifier.version('c') > notifier.version('a') > 0
+
+
+def test_versions_never_repeat_after_eviction():
+    notifier = QuestionNotifier(max_lectures=1)
+    notifier.notify('a')
+    seen = notifier.version('a')
+    notifier.notify('b')
+    notifier.notify('a')
+
+    assert notifier.version('a') not in (0, seen)
+
+
+def test_discard_forgets_the_lecture_and_wakes_its_waiters():
+    notifier = QuestionNotifier()
+    notifier.publish('a', 'question', {})
+    seen = notifier.version('a')
+    woken = []
+    waiter = threading.Thread(target=lambda: woken.append(notifier.wait('a', seen, 5)))
+    waiter.start()
+    notifier.discard('a')
+    waiter.join(1)
+
+    assert woken == [0]
+    assert notifier.last_event_id('a') == 0
+
+
+def test_deleting_a_lecture_discards_its_events(app, client, lecturer):
+    session_id, lecture_key = lecturer
+    lectures = app.extensions['roomsense_lectures']
+    lectures.create_question(lecture_key=lecture_key, student_name='Ada', question_text='What is recursion?')
+    lectures.get_next_question_for_lecture(session_id, lecture_key)
+    assert lectures.notifier.events_since(lecture_key, 0)
+
+    assert client.delete(f'/api/lectures/{session_id}/{lecture_key}').status_code == 200
+    assert lectures.notifier.version(lecture_key) == 0
+    assert lectures.notifier.events_since(lecture_key, 0) == []
@@ -0,0 +1,27 @@
+"""
+Lecture event stream: wait plans never sleep through a change
+"""
+from services.question_notifier import Wait
+
+
+def test_question_created_while_delivering_ends_the_wait(app, lecturer):
+    session_id, lecture_key = lecturer
+    lectures = app.extensions['roomsense_lectures']
+    deliver_next_question = lectures._deliver_next_question
+
+    def deliver_racing_a_student(key):
+        result = deliver_next_question(key)
+        lectures.create_question(lecture_key=key, student_name='Ada', question_text='What is recursion?')
+        return result
+
+    lectures._deliver_next_question = deliver_racing_a_student
+    steps = lectures.lecture_event_steps(session_id, lecture_key, heartbeat_seconds=60)
+    try:
+        step = next(steps)
+        while not isinstance(step, Wait):
+            step = next(steps)
+    finally:
+        steps.close()
+
+    # The plan waits from a version older than the new question's
+    assert step.seen_version < lectures.notifier.version(lecture_key)
@@ -0,0 +1,63 @@
+"""
+Request identity: an authenticated request resolves its session once
+"""
+import pytest
+
+
+AUTHENTICATED_REQUESTS = [
+    ('GET', '/api/lectures/lecturer/{session_id}', None),
+    ('GET', '/api/lectures/lecturer/{session_id}/dashboard', None),
+    ('GET', '/api/lectures/{session_id}/{lecture_key}', None),
+    ('PUT', '/api/lectures/{session_id}/{lecture_key}', {'courseName': 'CS 102'}),
+    ('GET', '/api/lectures/{session_id}/{lecture_key}/questions', None),
+    ('GET', '/api/lectures/{session_id}/{lecture_key}/questions/next', None),
+    ('PUT', '/api/lectures/{session_id}/{lecture_key}/questions/answer', {'scope': 'all'}),
+    ('GET', '/api/lectures/lecturer/{session_id}/questions/unanswered/count', None),
+    ('POST', '/auth/status', {'sessionId': '{session_id}'}),
+    ('GET', '/api/sessions/active?sessionId={session_id}', None),
+]
+
+
+@pytest.fixture
+def lookups(storage, monkeypatch):
+    """Session IDs looked up in the user repository, in call order"""
+    calls = []
+    find_by_active_session = storage.users.find_by_active_session
+
+    def counting_lookup(session_id, session=None):
+        calls.append(session_id)
+        return find_by_active_session(session_id, session=session)
+
+    monkeypatch.setattr(storage.users, 'find_by_active_session', counting_lookup)
+    return calls
+
+
+def fill(value, session_id, lecture_key):
+    if isinstance(value, dict):
+        return {key: fill(item, session_id, lecture_key) for key, item in value.items()}
+    if isinstance(value, str):
+        return value.format(session_id=session_id, lecture_key=lecture_key)
+    return value
+
+
+@pytest.mark.parametrize('method, path, body', AUTHENTICATED_REQUESTS)
+def test_authenticated_request_looks_up_session_once(client, lecturer, lookups, method, path, body):
+    session_id, lecture_key = lecturer
+
+    response = client.open(
+        fill(path, session_id, lecture_key),
+        method=method,
+        json=fill(body, session_id, lecture_key)
+    )
+
+    assert response.status_code == 200, response.get_json()
+    assert lookups == [session_id]
+
+
+def test_every_request_resolves_its_own_identity(client, lecturer, lookups):
+    session_id, _ = lecturer
+
+    for _ in range(2):
+        assert client.get(f'/api/lectures/lecturer/{session_id}').status_code == 200
+
+    assert lookups == [session_id, session_id]
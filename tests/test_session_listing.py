@@ -0,0 +1,41 @@
+"""
+Session listing: pages follow the parsed expected start, cursors round-trip
+"""
+from services.sessions_service import SessionsService
+
+
+def create(service, session_id, start):
+    result = service.create_session({
+        'sessionId': session_id,
+        'uniqueNumber': '1001',
+        'session_expected_start_time': start,
+        'session_expected_end_time': None,
+        'session_is_active': False
+    })
+    assert result['success'], result
+
+
+def test_pages_follow_the_parsed_start_time(storage, lecturer):
+    service = SessionsService(storage)
+    create(service, 'utc', '2025-01-16T10:00:00Z')
+    create(service, 'offset', '2025-01-16T09:30:00-02:00')
+    create(service, 'unscheduled', None)
+    create(service, 'later', '2025-01-17T08:00:00.250+00:00')
+
+    listed, cursor = [], None
+    while True:
+        page = service.get_all_session_by_user_id('1001', limit=1, cursor=cursor)
+        assert page['success'], page
+        listed.extend(session['sessionId'] for session in page['sessions'])
+        cursor = page['nextCursor']
+        if cursor is None:
+            break
+
+    assert listed == ['later', 'offset', 'utc', 'unscheduled']
+
+
+def test_malformed_cursors_are_rejected(storage):
+    service = SessionsService(storage)
+
+    for cursor in ('yesterday|0123456789abcdef01234567', '0123456789abcdef01234567', '2025-01-16|x'):
+        assert service.get_all_session_by_user_id('1001', cursor=cursor)['success'] is False
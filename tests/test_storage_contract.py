@@ -0,0 +1,340 @@
+"""
+Storage backend contract: every repository method gives the same result on
+the in-memory backend and on MongoDB (both question storage modes).
+
+The Mongo runs use MONGO_URI (default mongodb://localhost:27017) and are
+skipped when no server answers. They drop the test database before and
+after each test.
+"""
+from datetime import datetime, timedelta
+import os
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, PyMongoError
+import pytest
+
+from models.lecture import Lecture, StudentQuestion
+from models.memory_store import MemoryStorage
+from models.repositories import MONGO_DASHBOARD_MIN_VERSION, MongoStorage
+
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
+DATABASE = 'roomsense_contract_tests'
+
+
+@pytest.fixture(scope='module')
+def mongo_client():
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f'no MongoDB at {MONGO_URI} ({type(e).__name__})')
+    yield client
+    client.close()
+
+
+@pytest.fixture(params=['memory', 'mongo-documents', 'mongo-buckets'])
+def storage(request):
+    """An empty storage of each backend"""
+    if request.param == 'memory':
+        storage = MemoryStorage()
+        storage.lectures.ensure_indexes()
+        yield storage
+        storage.close()
+        return
+
+    client = request.getfixturevalue('mongo_client')
+    client.drop_database(DATABASE)
+    storage = MongoStorage(client[DATABASE], request.param.split('-')[1])
+    storage.lectures.ensure_indexes()
+    yield storage
+    client.drop_database(DATABASE)
+
+
+def moment(seconds):
+    """A fixed time (millisecond precision, like BSON dates) plus seconds"""
+    return datetime(2025, 1, 16, 10, 0, 0) + timedelta(seconds=seconds)
+
+
+def question(lecture_key, text, priority, created_at):
+    document = StudentQuestion.create(lecture_key, 'Student', text)
+    document.update({'priority': priority, 'createdAt': created_at, 'updatedAt': created_at})
+    return document
+
+
+def new_session(session_id, start, end):
+    return {
+        'sessionId': session_id,
+        'name': f'Session {session_id}',
+        'uniqueNumber': '1001',
+        'session_expected_start_time': start,
+        'session_expected_end_time': end,
+        'session_actual_start_time': None,
+        'session_actual_end_time': None,
+        'session_is_active': False
+    }
+
+
+def insert_lecturer(storage):
+    return storage.users.insert({
+        'email': 'contract@example.com',
+        'uniqueNumber': '1001',
+        'activeSessionIds': ['s-active'],
+        'pendingSessionIds': ['s-pending'],
+        'inactiveSessionIds': [],
+        'options': {}
+    })
+
+
+def test_users(storage):
+    users = storage.users
+    user_id = insert_lecturer(storage)
+
+    assert users.find_by_email('contract@example.com')['_id'] == user_id
+    assert users.find_by_active_session('s-active')['_id'] == user_id
+    assert users.find_by_active_session('s-pending') is None
+    assert users.find_by_active_or_pending_session('s-pending')['_id'] == user_id
+    assert users.find_by_unique_number('1001')['_id'] == user_id
+
+    assert users.activate_session(user_id, 's-pending')['success'] is True
+    assert users.activate_session(user_id, 's-pending')['success'] is False
+    assert users.find_by_active_session('s-pending')['_id'] == user_id
+    assert users.inactivate_session(user_id, 's-active')['success'] is True
+    assert users.find_by_active_session('s-active') is None
+    assert users.find_by_active_or_pending_session('s-active') is None
+
+    created = users.create('created@example.com')
+    assert users.find_by_email('created@example.com')['_id'] == created['_id']
+    created['pendingSessionIds'].append('s-created')
+    assert users.update(created) is True
+    assert users.find_by_active_or_pending_session('s-created')['email'] == 'created@example.com'
+    assert users.delete_by_email('created@example.com') is True
+    assert users.delete_by_email('created@example.com') is False
+    assert users.find_by_active_or_pending_session('s-created') is None
+
+
+def test_verifications(storage):
+    verifications = storage.verifications
+    verification = verifications.create('contract@example.com', 'token-1')
+    assert verifications.find_by_token('token-1')['_id'] == verification['_id']
+
+    verifications.mark_as_verified(verification['_id'])
+    assert verifications.find_by_token('token-1') is None
+
+    verifications.create('contract@example.com', 'token-2')
+    assert verifications.delete_by_email('contract@example.com') == 2
+    assert verifications.find_by_token('token-2') is None
+
+
+def test_lectures(storage):
+    lectures = storage.lectures
+    user_id = insert_lecturer(storage)
+    other_id = ObjectId()
+    lectures.insert(Lecture.create('lec-old', user_id, 'Old Course', '2024-01-15', '2024-05-15', [], []))
+    lectures.insert(Lecture.create('lec-new', user_id, 'New Course', '2024-09-01', '2024-12-15', [], []))
+    lectures.insert(Lecture.create('lec-other', other_id, 'Other Course', '2024-09-01', '2024-12-15', [], []))
+
+    assert lectures.find_by_key('lec-old')['courseName'] == 'Old Course'
+    assert lectures.find_by_key('missing') is None
+    assert lectures.owns('lec-old', user_id) is True
+    assert lectures.owns('lec-other', user_id) is False
+    assert sorted(lectures.find_keys_by_lecturer(user_id)) == ['lec-new', 'lec-old']
+    assert len(lectures.find_by_lecturer(user_id)) == 2
+    assert lectures.update('lec-old', {'courseName': 'Renamed'})['courseName'] == 'Renamed'
+    assert lectures.update('missing', {'courseName': 'Renamed'}) is None
+
+    assert lectures.delete('lec-other', user_id) is False
+    assert lectures.delete('lec-other', other_id) is True
+    assert lectures.find_by_key('lec-other') is None
+
+
+def test_lecture_delivery_slot(storage):
+    lectures = storage.lectures
+    lectures.insert(Lecture.create('lec-old', ObjectId(), 'Old Course', '2024-01-15', '2024-05-15', [], []))
+
+    assert lectures.find_delivery_state('lec-old').get('lastQuestionDeliveredAt') is None
+    claimed = lectures.claim_delivery_slot('lec-old', moment(10), moment(0))
+    assert claimed.get('lastQuestionDeliveredAt') is None
+    assert lectures.claim_delivery_slot('lec-old', moment(11), moment(1)) is None
+
+    lectures.release_delivery_slot('lec-old', moment(10), None)
+    assert lectures.find_delivery_state('lec-old').get('lastQuestionDeliveredAt') is None
+
+    # Releasing with a stale claim time leaves a newer claim in place
+    lectures.claim_delivery_slot('lec-old', moment(12), moment(2))
+    lectures.release_delivery_slot('lec-old', moment(99), None)
+    assert lectures.find_delivery_state('lec-old')['lastQuestionDeliveredAt'] == moment(12)
+
+
+def test_questions(storage):
+    questions = storage.questions
+    first = questions.insert(question('lec-new', 'first', 10, moment(0)))
+    second = questions.insert(question('lec-new', 'second', 30, moment(1)))
+    third = questions.insert(question('lec-new', 'third', 20, moment(2)))
+    questions.insert_many([
+        question('lec-new', 'fourth', 5, moment(3)),
+        question('lec-old', 'elsewhere', 50, moment(4))
+    ])
+    fourth = [
+        question_id for question_id in questions.find_ids('lec-new', {'isDelivered': False}, 10)
+        if question_id not in (first, second, third)
+    ][0]
+
+    assert len(questions.find_by_lecture('lec-new')) == 4
+    assert questions.count_undelivered('lec-new') == 4
+    assert [entry['_id'] for entry in questions.find_undelivered('lec-new', 3)] == [second, third, first]
+    assert questions.last_delivered_at('lec-new') is None
+
+    claimed = questions.claim('lec-new', moment(10))
+    assert (claimed['_id'], claimed['isDelivered'], claimed['deliveredAt']) == (second, True, moment(10))
+    assert questions.claim('lec-new', moment(11), question_id=first)['_id'] == first
+    assert questions.claim('lec-new', moment(12), question_id=first) is None
+    assert questions.last_delivered_at('lec-new') == moment(11)
+    assert questions.count_undelivered('lec-new') == 2
+
+    upvoted = questions.upvote('lec-new', third, 'voter-a', moment(13))
+    assert (upvoted['upvotes'], upvoted['priority']) == (1, 20 + StudentQuestion.VOTE_WEIGHT_SECONDS)
+    assert questions.upvote('lec-new', third, 'voter-a', moment(13)) is None
+    assert questions.upvote('lec-new', third, 'voter-b', moment(13))['upvotes'] == 2
+    assert questions.upvote('lec-new', first, 'voter-a', moment(13)) is None
+    assert questions.upvote('lec-old', third, 'voter-c', moment(13)) is None
+    bumped = questions.bump_priority(fourth, moment(14), duplicate=True)
+    assert (bumped['priority'], bumped['isDelivered']) == (5 + StudentQuestion.VOTE_WEIGHT_SECONDS, False)
+
+    assert questions.mark_answered(first, moment(15))['lectureKey'] == 'lec-new'
+    assert questions.mark_answered(first, moment(15)) is None
+    assert questions.set_flag_many([first, second, third], 'isAnswered', moment(16)) == [second, third]
+    assert questions.set_flag_many([third], 'isDelivered', moment(17)) == [third]
+    assert questions.count_unanswered(['lec-new', 'lec-old']) == 2
+    assert questions.find_ids('lec-new', {'isAnswered': False}, 10) == [fourth]
+    found = questions.find_by_ids('lec-new', [first, fourth], ['question'])
+    assert {key: value['question'] for key, value in found.items()} == {first: 'first', fourth: 'fourth'}
+    changed = questions.find_changed_since('lec-new', moment(14))
+    assert [entry['_id'] for entry in changed] == [first, second, third]
+
+    duplicate = question('lec-new', 'fourth again', 0, moment(18))
+    duplicate.update({'clusterId': fourth, 'isDuplicate': True})
+    duplicate_id = questions.insert(duplicate)
+    assert [entry['question'] for entry in questions.find_open_representatives('lec-new', 5)] == ['fourth']
+    assert questions.count_undelivered('lec-new') == 1
+    questions.answer_duplicates([fourth], moment(19))
+    assert questions.find_by_ids('lec-new', [duplicate_id], ['isAnswered'])[duplicate_id]['isAnswered'] is True
+
+    questions.delete_by_lecture('lec-new')
+    assert questions.find_by_lecture('lec-new') == []
+    assert len(questions.find_by_lecture('lec-old')) == 1
+
+
+def test_dashboard(storage, request):
+    if isinstance(storage, MongoStorage):
+        version = tuple(request.getfixturevalue('mongo_client').server_info()['versionArray'][:2])
+        if version < MONGO_DASHBOARD_MIN_VERSION:
+            pytest.skip(f'the dashboard needs MongoDB {MONGO_DASHBOARD_MIN_VERSION}+, server is {version}')
+    user_id = insert_lecturer(storage)
+    storage.lectures.insert(Lecture.create('lec-old', user_id, 'Old Course', '2024-01-15', '2024-05-15', [], []))
+    storage.lectures.insert(Lecture.create('lec-new', user_id, 'New Course', '2024-09-01', '2024-12-15', [], []))
+    storage.questions.insert_many([
+        question('lec-new', 'first', 10, moment(0)),
+        question('lec-new', 'second', 30, moment(1)),
+        question('lec-new', 'third', 20, moment(2))
+    ])
+    storage.questions.claim('lec-new', moment(10))
+    answered = storage.questions.claim('lec-new', moment(11))
+    storage.questions.mark_answered(answered['_id'], moment(12))
+
+    dashboard = storage.lectures.dashboard(user_id)
+    assert [lecture['key'] for lecture in dashboard] == ['lec-new', 'lec-old']
+    stats = dashboard[0]['questionStats']
+    assert (stats['total'], stats['unanswered'], stats['delivered'], stats['lastQuestionAt']) == (3, 2, 2, moment(2))
+    assert dashboard[1].get('questionStats') is None
+
+
+def test_sessions(storage):
+    sessions = storage.sessions
+    sessions.ensure_indexes()
+    sessions.ensure_schedule_indexes()
+    sessions.create(new_session('s1', '2025-01-16T10:00:00Z', '2025-01-16T11:00:00Z'))
+    # Any ISO 8601 form; the scheduler queries the parsed times
+    sessions.create(new_session('s2', '2025-01-16T13:00:00+01:00', '2025-01-16T13:00:00.000Z'))
+    sessions.create(new_session('s3', '2025-01-17T10:00:00Z', '2025-01-17T11:00:00Z'))
+    with pytest.raises(DuplicateKeyError):
+        sessions.create(new_session('s1', '2025-01-18T10:00:00Z', '2025-01-18T11:00:00Z'))
+    assert sessions.find_duplicate_session_ids() == []
+
+    assert sessions.find_by_session_id('s2')['name'] == 'Session s2'
+    assert sessions.update('s2', {'name': 'Renamed'}) == 1
+    assert sessions.update('missing', {'name': 'Renamed'}) == 0
+    # Listed by the parsed start: 09:30-02:00 is after 10:00Z, no start time goes last
+    sessions.create(new_session('s4', '2025-01-16T09:30:00-02:00', '2025-01-16T12:30:00Z'))
+    sessions.create(new_session('s5', None, None))
+    listed = []
+    before = None
+    while True:
+        page = sessions.find_by_user('1001', 2, before)
+        listed.extend(session['sessionId'] for session in page)
+        if len(page) < 2:
+            break
+        before = (page[-1]['expectedStartAt'], page[-1]['_id'])
+    assert listed == ['s3', 's2', 's4', 's1', 's5']
+
+
+def test_session_schedule(storage):
+    sessions = storage.sessions
+    sessions.ensure_indexes()
+    sessions.ensure_schedule_indexes()
+    sessions.create(new_session('s1', '2025-01-16T10:00:00Z', '2025-01-16T11:00:00Z'))
+    sessions.create(new_session('s2', '2025-01-16T13:00:00+01:00', '2025-01-16T13:00:00.000Z'))
+    sessions.create(new_session('s3', '2025-01-17T10:00:00Z', '2025-01-17T11:00:00Z'))
+
+    pending = sessions.find_pending_starts(moment(-36000), moment(50399))
+    assert sorted(session['sessionId'] for session in pending) == ['s1', 's2']
+    assert sessions.start_many(['s1', 's2'], moment(0)) == 2
+    assert sessions.start_many(['s1', 's2'], moment(1)) == 0
+    assert sessions.find_pending_starts(moment(-36000), moment(50399)) == []
+    assert sorted(session['sessionId'] for session in sessions.find_active()) == ['s1', 's2']
+    assert [session['sessionId'] for session in sessions.find_running_ends(moment(5400))] == ['s1']
+
+    assert sessions.end_many(['s1', 's3'], moment(2)) == 1
+    assert sessions.start_many(['s1'], moment(3)) == 0
+    assert [session['sessionId'] for session in sessions.find_active()] == ['s2']
+    assert sessions.delete('s2') == 1
+    assert sessions.delete('s2') == 0
+    assert sessions.find_active() == []
+
+
+def test_leases(storage):
+    leases = storage.leases
+    assert leases.acquire('contract', 'a', moment(0), moment(30)) is True
+    assert leases.acquire('contract', 'a', moment(10), moment(40)) is True
+    assert leases.acquire('contract', 'b', moment(20), moment(50)) is False
+    assert leases.acquire('contract', 'b', moment(41), moment(71)) is True
+
+    leases.release('contract', 'a')
+    assert leases.acquire('contract', 'a', moment(42), moment(72)) is False
+    leases.release('contract', 'b')
+    assert leases.acquire('contract', 'a', moment(43), moment(73)) is True
+
+
+def test_memory_log_reload(tmp_path):
+    """The memory backend rebuilds data and indexes from its append-only file"""
+    path = str(tmp_path / 'storage.aof')
+    storage = MemoryStorage(log_path=path)
+    user_id = insert_lecturer(storage)
+    storage.users.activate_session(user_id, 's-pending')
+    storage.lectures.insert(Lecture.create('lec-new', user_id, 'New Course', '2024-09-01', '2024-12-15', [], []))
+    storage.questions.insert(question('lec-new', 'first', 10, moment(0)))
+    expected = storage.stats()['documents']
+    storage.close()
+
+    reloaded = MemoryStorage(log_path=path)
+    assert reloaded.stats()['documents'] == expected
+    assert reloaded.users.find_by_active_session('s-pending')['_id'] == user_id
+    reloaded.compact()
+    reloaded.close()
+
+    compacted = MemoryStorage(log_path=path)
+    assert compacted.stats()['documents'] == expected
+    assert compacted.stats()['log']['records'] == sum(expected.values())
+    assert compacted.questions.count_undelivered('lec-new') == 1
+    compacted.close()
@@ -0,0 +1,44 @@
+"""
+Upvotes: one vote per client and question
+"""
+import pytest
+from bson import ObjectId
+
+
+@pytest.fixture
+def question_url(client, lecturer):
+    _, lecture_key = lecturer
+    response = client.post(f'/api/lectures/{lecture_key}/questions', json={
+        'studentName': 'Ada',
+        'question': 'What is recursion?'
+    })
+    assert response.status_code == 201, response.get_json()
+    return f"/api/lectures/{lecture_key}/questions/{response.get_json()['question']['id']}/upvote"
+
+
+def vote(client, url, address):
+    return client.post(url, environ_base={'REMOTE_ADDR': address})
+
+
+def test_each_client_votes_once(client, question_url):
+    first = vote(client, question_url, '10.0.0.1')
+    assert (first.status_code, first.get_json()['upvotes']) == (200, 1)
+
+    assert vote(client, question_url, '10.0.0.1').status_code == 409
+    assert vote(client, question_url, '10.0.0.2').get_json()['upvotes'] == 2
+
+
+def test_voters_are_not_listed(client, lecturer, question_url):
+    session_id, lecture_key = lecturer
+    vote(client, question_url, '10.0.0.1')
+
+    questions = client.get(f'/api/lectures/{session_id}/{lecture_key}/questions').get_json()['questions']
+    assert questions[0]['upvotes'] == 1
+    assert 'voters' not in questions[0]
+
+
+def test_upvote_rejects_unknown_and_malformed_ids(client, lecturer):
+    _, lecture_key = lecturer
+
+    assert client.post(f'/api/lectures/{lecture_key}/questions/not-an-id/upvote').status_code == 400
+    assert client.post(f'/api/lectures/{lecture_key}/questions/{ObjectId()}/upvote').status_code == 404
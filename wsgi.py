@@ -0,0 +1,50 @@
+"""
+RoomSense WSGI entry point for gunicorn
+
+    gunicorn wsgi:app
+
+Importing this module loads the code but builds nothing: the Flask app, and
+with it the MongoClient, indexes and background threads, is created in each
+worker process by the post_worker_init hook of gunicorn.conf.py. With
+preload_app the master shares the imported modules with its workers without
+handing them a Mongo client or threads across fork().
+"""
+import os
+import threading
+
+from app import create_app
+
+
+class WorkerApp:
+    """WSGI callable building the Flask app inside the worker process"""
+
+    def __init__(self, config_name):
+        """
+        Initialize worker app
+
+        Args:
+            config_name: Configuration environment passed to create_app
+        """
+        self.config_name = config_name
+        self.flask_app = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        """Create the Flask app (once per process)"""
+        with self._lock:
+            if self.flask_app is None:
+                self.flask_app = create_app(self.config_name)
+        return self.flask_app
+
+    def shutdown(self):
+        """Stop the background work of the Flask app, if it was built"""
+        if self.flask_app is not None:
+            self.flask_app.extensions['roomsense_shutdown']()
+
+    def __call__(self, environ, start_response):
+        # Built by post_worker_init; the fallback covers other WSGI servers
+        flask_app = self.flask_app or self.build()
+        return flask_app(environ, start_response)
+
+
+app = WorkerApp(os.getenv('FLASK_ENV', 'production'))